@@ -25,11 +25,22 @@ from time import sleep
 from smsoccer.players.demo.democoach import DemoCoach
 from smsoccer.players.demo.demogoalie import DemoGoalie
 from smsoccer.players.demo.demoplayer import DemoPlayer
+from smsoccer.players.runtime import spawn_shards
 
 
 PORT_PLAYERS = 6000
 PORT_COACH = 6002
 
+HOST = "localhost"
+
+
+def new_player():
+    """
+    Agent factory for the multi-agent runtime.  Only one display can be
+    opened per process, so hosted players don't get any.
+    """
+    return DemoPlayer(visualization=False)
+
 
 def spawn_coach(team_name):
     """
@@ -67,7 +78,9 @@ def spawn_agent(team_name, goalie):
 
 
 """
-Run N players in different threads.
+Run N players.  They're spread over num_workers processes (1 by default),
+each hosting its share of the agents.  With num_workers = 0, every agent gets
+its own process instead.
 """
 if __name__ == "__main__":
     import sys
@@ -75,35 +88,48 @@ if __name__ == "__main__":
 
     # enforce current number of arguments, print help otherwise
     if len(sys.argv) < 3:
-        print "args: ./run_team.py <team_name> <num_players>"
+        print "args: ./run_team.py <team_name> <num_players> [num_workers]"
         sys.exit()
 
-    # spawn all agents as separate processes for maximum processing efficiency
+    num_workers = int(sys.argv[3]) if len(sys.argv) > 3 else 1
+
     agent_threads = []
 
-    # Goalie
-    # print "  Spawning goalie"
-    # ag = mp.Process(target=spawn_agent, args=(sys.argv[1], True))
-    # ag.daemon = True
-    # ag.start()
-    # agent_threads.append(ag)
-    # sleep(0.1)
-
-    # # Spawn players
-    for agent in xrange(min(10, int(sys.argv[2]) - 1)):
-        print "  Spawning agent %d..." % agent
-        at = mp.Process(target=spawn_agent, args=(sys.argv[1], False))
-        at.daemon = True
-        at.start()
-        agent_threads.append(at)
-
-    sleep(0.3)
-    # Coach
-    print "  Spawning coach"
-    ac = mp.Process(target=spawn_coach, args=(sys.argv[1],))
-    ac.daemon = True
-    ac.start()
-    agent_threads.append(ac)
+    if num_workers > 0:
+        # the coach goes last, after the players of its process
+        specs = [(new_player, HOST, PORT_PLAYERS, sys.argv[1])
+                 for agent in xrange(min(10, int(sys.argv[2]) - 1))]
+        specs.append((DemoCoach, HOST, PORT_COACH, sys.argv[1]))
+
+        print "  Spawning %d agents in %d processes..." % (len(specs), num_workers)
+        agent_threads = spawn_shards(specs, num_workers)
+
+    else:
+        # spawn all agents as separate processes
+
+        # Goalie
+        # print "  Spawning goalie"
+        # ag = mp.Process(target=spawn_agent, args=(sys.argv[1], True))
+        # ag.daemon = True
+        # ag.start()
+        # agent_threads.append(ag)
+        # sleep(0.1)
+
+        # # Spawn players
+        for agent in xrange(min(10, int(sys.argv[2]) - 1)):
+            print "  Spawning agent %d..." % agent
+            at = mp.Process(target=spawn_agent, args=(sys.argv[1], False))
+            at.daemon = True
+            at.start()
+            agent_threads.append(at)
+
+        sleep(0.3)
+        # Coach
+        print "  Spawning coach"
+        ac = mp.Process(target=spawn_coach, args=(sys.argv[1],))
+        ac.daemon = True
+        ac.start()
+        agent_threads.append(ac)
 
     print "RUN SUPER MARIO!!"
 
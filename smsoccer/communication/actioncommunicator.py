@@ -5,6 +5,10 @@ LOOK_MESSAGE = '(look)'
 
 EYE_MESSAGE = '(eye %s)'
 
+DONE_MESSAGE = '(done)'
+
+COMPRESSION_MESSAGE = '(compression %d)'
+
 VIEW_QUALITY_LOW = "low"
 VIEW_QUALITY_HIGH = "high"
 VIEW_WIDTH_NARROW = "narrow"
@@ -26,7 +30,6 @@ TACKlE_MESSAGE = "(tackle)"
 POINT_TO_MESSAGE = "(pointto off)"
 ATTENTION_MESSSAGE = "(attentionto off)"
 EAR_MESSAGE = "(ear "
-COMPRESSION = "(compression"
 
 # should we print commands sent to the server?
 PRINT_SENT_COMMANDS = False
@@ -57,6 +60,7 @@ class ActionCommunicator(object):
         MOVE = "move"
         SAY = "say"
         SENSE_BODY = "sense_body"
+        THINK = "think"
         TURN = "turn"
         TURN_NECK = "turn_neck"
 
@@ -78,15 +82,26 @@ class ActionCommunicator(object):
         # this contains all requested actions for the current and future cycles
         self.q = queue.Queue()
 
+        # bytes and packets sent since the current cycle started (see
+        # new_cycle), and in total
+        self.cycle_bytes = 0
+        self.cycle_packets = 0
+        self.bytes_sent = 0
+        self.packets_sent = 0
+
     def send_commands(self):
         """
-        Sends all the enqueued commands.
+        Sends all the enqueued commands.  The server takes several commands
+        in a single message, so they all go out together in one packet.
         """
 
         # we only send the most recent primary command
         primary_cmd = None
 
-        # dequeue all enqueued commands and send them
+        # the text of the commands to send, in order
+        texts = []
+
+        # dequeue all enqueued commands
         while 1:
             try:
                 cmd = self.q.get_nowait()
@@ -96,22 +111,44 @@ class ActionCommunicator(object):
             # save the most recent primary command and send it at the very end
             if cmd.cmd_type == ActionCommunicator.CommandType.TYPE_PRIMARY:
                 primary_cmd = cmd
-            # send other commands immediately
+            # other commands go in the order they were requested
             else:
-                if PRINT_SENT_COMMANDS:
-                    print "sent:", cmd.text, "\n"
-
-                self.sock.send(cmd.text)
+                texts.append(cmd.text)
 
             # indicate that we finished processing a command
             self.q.task_done()
 
-        # send the saved primary command, if there was one
+        # add the saved primary command, if there was one
         if primary_cmd is not None:
-            if PRINT_SENT_COMMANDS:
-                print "sent:", primary_cmd.text, "\n"
+            texts.append(primary_cmd.text)
+
+        if texts:
+            self._send("".join(texts))
 
-            self.sock.send(primary_cmd.text)
+    def new_cycle(self):
+        """
+        Starts counting what is sent in a new server cycle, whatever sends
+        it: the commands, done, compression...
+        """
+
+        self.cycle_bytes = 0
+        self.cycle_packets = 0
+
+    def _send(self, text):
+        """
+        Sends text to the server, keeping count of what was sent.
+        """
+
+        if PRINT_SENT_COMMANDS:
+            print "sent:", text, "\n"
+
+        self.sock.send(text)
+
+        # the socket appends a null terminator to every message
+        self.cycle_bytes += len(text) + 1
+        self.cycle_packets += 1
+        self.bytes_sent += len(text) + 1
+        self.packets_sent += 1
 
     def move(self, x, y):
         """
@@ -223,7 +260,9 @@ class ActionCommunicator(object):
     def change_view_quality(self, width, quality):
         """
         Change view quality. View frequency depends on these parameters,
-        look at equation (4.13) of the manual.
+        look at equation (4.13) of the manual.  Low quality sees twice as
+        often, but only the directions of what is seen, which localization
+        makes do with.
         :param width: narrow or normal
         :param quality: high or low
         """
@@ -236,6 +275,25 @@ class ActionCommunicator(object):
 
 
 
+    def done(self):
+        """
+        Tells the server we're done with the current cycle.  In synch mode the
+        server waits for this from every client before moving on, so it gets
+        sent directly, after the cycle's commands.
+        """
+
+        self._send(DONE_MESSAGE)
+
+    def compression(self, level):
+        """
+        Asks the server to compress its messages with zlib at the given level
+        (1 to 9, 0 turns it off).  Sent directly.  The socket starts inflating
+        messages once the server agrees.
+        """
+
+        self.sock.compression_pending = True
+        self._send(COMPRESSION_MESSAGE % level)
+
     ############# COACH ############
     def eye_on(self, enable):
         on_off = "on" if enable else "off"
@@ -245,7 +303,7 @@ class ActionCommunicator(object):
         cmd_type = ActionCommunicator.CommandType.TYPE_PRIMARY
         cmd = ActionCommunicator.Command(cmd_type, msg)
         # Send the message directly.
-        self.sock.send(cmd.text)
+        self._send(cmd.text)
 
     def look(self):
         # create the command object for insertion into the queue
@@ -253,6 +311,6 @@ class ActionCommunicator(object):
         cmd = ActionCommunicator.Command(cmd_type, LOOK_MESSAGE)
         self.q.put(cmd)
 
-        self.sock.send(cmd.text)
+        self._send(cmd.text)
 
 
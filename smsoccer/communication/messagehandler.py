@@ -1,18 +1,49 @@
 import collections
+import re
 
 import messageparser
 
 
 # should we print messages received from the server?
+from smsoccer.communication.seedecoder import SeeDecoder
 from smsoccer.communication.teammessage import TeamMessage
-from smsoccer.communication.worldparser import parse_message_see
 from smsoccer.util import sp_exceptions
-from smsoccer.world import game_object
+from smsoccer.world import game_object, landmarks
 from smsoccer.world.world_model import WorldModel, RefereeMessages
 
 PRINT_SERVER_MESSAGES = False
 TEAM_QUEUE_MSG_CAPACITY = 5
 
+# message types that only matter until a newer one of the same type arrives.
+# not sense_body: every one of them moves the world model a cycle forward
+# (the particles, the ball and the players), which a newer one doesn't redo.
+SUPERSEDED_TYPES = ("see", "see_global")
+
+# how much parsing a handler needs before being called
+PARSE_NONE = 0  # the handler takes the raw message text
+PARSE_PARTIAL = 1  # the raw text too, the handler parses what it needs itself
+PARSE_FULL = 2  # the handler takes the message parsed into nested lists
+
+# the message type, read from the first bytes of a message
+pattern_type = re.compile(r"\((\w+)")
+
+# the cycle, sender and first word of the content of a hear message.  Ex:
+# '(hear 12 30 our 5 "hi")' gives ('12', '30', 'our').
+pattern_hear = re.compile(r"\(hear (\d+) ([^ )]+)(?: ([^ )]+))?")
+
+
+def parse_mode(mode):
+    """
+    Decorator declaring how much parsing a '_handle_*' function needs.
+    Handlers without it get a full parse.
+    """
+
+    def decorate(func):
+        func.parse_mode = mode
+        return func
+
+    return decorate
+
 
 class MessageHandler:
     """
@@ -21,77 +52,143 @@ class MessageHandler:
 
     All '_handle_*' functions deal with their appropriate message types
     as received from a server.  This allows adding a message handler to be as
-    simple as adding a new '_handle_*' function to this object.
+    simple as adding a new '_handle_*' function to this object.  Handlers get
+    the message fully parsed, unless they say otherwise with 'parse_mode'.
     """
 
     # an inner class used for creating named tuple 'hear' messages
     Message = collections.namedtuple("Message", "time sender message")
 
-    def __init__(self, world_model):
+    def __init__(self, world_model, pooled_objects=False):
         self.wm = world_model
 
+        # decodes see messages straight into arrays.  with pooled_objects,
+        # the game objects of old see messages get reused, see SeeDecoder.
+        self.see_decoder = SeeDecoder(pooled_objects)
+
+        # number of messages skipped by handle_messages for being out of date,
+        # and the largest number of messages it was given at once.
+        self.coalesced_count = 0
+        self.max_backlog = 0
+
+    def handle_messages(self, msgs):
+        """
+        Handles a batch of raw messages, all those received since the last
+        batch.  They're handled in order, except that only the newest of each
+        of the SUPERSEDED_TYPES is handled, the older ones are out of date.
+        Returns the list of types of the messages handled.
+        """
+
+        self.max_backlog = max(self.max_backlog, len(msgs))
+
+        types = [self._read_type(msg) for msg in msgs]
+
+        # where the newest message of each superseded type is
+        newest = {}
+        for i, msg_type in enumerate(types):
+            if msg_type in SUPERSEDED_TYPES:
+                newest[msg_type] = i
+
+        handled = []
+        for i, msg in enumerate(msgs):
+            msg_type = types[i]
+
+            if newest.get(msg_type, i) != i:
+                self.coalesced_count += 1
+                continue
+
+            self._dispatch(msg, msg_type)
+            handled.append(msg_type)
+
+        return handled
+
     def handle_message(self, msg):
         """
-        Takes a raw message direct from the server, parses it, and stores its
-        data in the world and body model objects given at init.  Returns the
-        type of message received.
+        Takes a raw message direct from the server, parses it as much as its
+        handler needs, and stores its data in the world and body model objects
+        given at init.  Returns the type of message received.
+        """
+
+        msg_type = self._read_type(msg)
+        self._dispatch(msg, msg_type)
+
+        # return the type of message received
+        return msg_type
+
+    def _read_type(self, msg):
+        """
+        Reads the type of a message without parsing anything.  If it's not
+        there the message is malformed, so let the parser complain about it.
         """
+        m = pattern_type.match(msg)
+        return m.group(1) if m is not None else messageparser.parse(msg)[0]
 
-        # get all the expressions contained in the given message
-        parsed = messageparser.parse(msg)
+    def _dispatch(self, msg, msg_type):
+        """
+        Calls the handler of the given message type, parsing the message as
+        much as the handler asks for.
+        """
 
         if PRINT_SERVER_MESSAGES:
             print msg
-            # print parsed[0] + ":", parsed[1:], "\n"
 
         # this is the name of the function that should be used to handle
         # this message type.  we pull it from this object dynamically to
         # avoid having a huge if/elif/.../else statement.
-        msg_func = "_handle_%s" % parsed[0]
+        msg_func = "_handle_%s" % msg_type
 
-        if hasattr(self, msg_func):
-            # call the appropriate function with this message
-            getattr(self, msg_func).__call__(parsed)
+        handler = getattr(self, msg_func, None)
 
         # throw an exception if we don't know about the given message type
-        else:
+        if handler is None:
             m = "Can't handle message type '%s', function '%s' not found."
             # FIXME raising will kill the agent.
-            raise sp_exceptions.MessageTypeError(m % (parsed[0], msg_func))
-            # print sp_exceptions.MessageTypeError(m % (parsed[0], msg_func))
+            raise sp_exceptions.MessageTypeError(m % (msg_type, msg_func))
+            # print sp_exceptions.MessageTypeError(m % (msg_type, msg_func))
 
-        # return the type of message received
-        return parsed[0]
+        # only parse the message if the handler asks for it
+        if getattr(handler, "parse_mode", PARSE_FULL) == PARSE_FULL:
+            handler(messageparser.parse(msg))
+        else:
+            handler(msg)
 
+    @parse_mode(PARSE_NONE)
     def _handle_see(self, msg):
         """
         Parses visual information in a message and turns it into useful data.
 
-        This comes to us as a list of lists.  Each list contains another list as
-        its first element, the contents of which describe a particular object.
-        The other items of the list are data pertaining to the object.  We parse
-        each list into its own game object, then insert those game objects into
-        the world model.
+        This comes to us as the raw message text.  The see decoder fills the
+        arrays of a VisualFrame with every object seen in a single pass, and
+        the world model takes its information from there.
         """
 
-        # the simulation cycle of the soccer server
-        self.wm.last_message = msg
-
-        new_ball, new_flags, new_goals, new_players, new_lines, sim_time = parse_message_see(msg, self.wm)
+        # the raw message may be a buffer that the socket will reuse, so keep
+        # a copy of it.
+        self.wm.last_message = str(msg)
 
+        frame = self.see_decoder.decode(msg, self.wm)
 
         # tell the WorldModel to update any internal variables based on the
         # newly gleaned information.
-        self.wm.process_new_info(new_ball, new_flags, new_goals, new_players,
-                                 new_lines, sim_time)
+        self.wm.process_new_frame(frame)
 
+    @parse_mode(PARSE_PARTIAL)
     def _handle_hear(self, msg):
         """
         Parses audible information and turns it into useful information.
+
+        Who sent the message is read from its first bytes, so messages we
+        ignore are never parsed.  Only team messages get a full parse.
         """
-        time_recvd = msg[1]  # server cycle when message was heard
-        sender = msg[2]  # name (or direction) of who sent the message
-        message = msg[3]  # message string
+        header = pattern_hear.match(msg)
+
+        # nothing we could make sense of
+        if header is None:
+            return
+
+        time_recvd = int(header.group(1))  # server cycle when message was heard
+        sender = header.group(2)  # name (or direction) of who sent the message
+        message = header.group(3)  # message string, or its first word
 
         # ignore messages sent by self (NOTE: would anybody really want these?)
         if sender == "self":
@@ -102,6 +199,9 @@ class MessageHandler:
             # change the name for convenience's sake
             mode = message
 
+            # whatever was worked out from the game state may be out of date
+            self.wm.new_generation()
+
             # deal first with messages that shouldn't be passed on to the agent
 
             # keep track of scores by setting them to the value reported.  this
@@ -139,10 +239,12 @@ class MessageHandler:
                 return
         else:
             # Opponents message
-            if msg[3] == 'opp':
+            if message == 'opp':
                 # Opponents messages are not of interest
                 return
 
+            msg = messageparser.parse(msg)
+
             time = msg[1]
             # ## For player
             if len(msg) > 4:
@@ -172,6 +274,8 @@ class MessageHandler:
         Deals with the agent's body model information.
         """
 
+        self.wm.sense_body_time = msg[1]
+
         # update the body model information when received. each piece of info is
         # a list with the first item as the name of the data, and the rest as
         # the values.
@@ -213,16 +317,30 @@ class MessageHandler:
             else:
                 pass
 
+        self.wm.process_new_body()
+
+    @parse_mode(PARSE_NONE)
+    def _handle_think(self, msg):
+        """
+        Sent by the server in synch mode once it sent all the information of
+        the cycle.  It then waits for our (done) to go on.
+        """
+
+        self.wm.think_count += 1
+
+    @parse_mode(PARSE_NONE)
     def _handle_change_player_type(self, msg):
         """
         Handle player change messages.
         """
 
+    @parse_mode(PARSE_NONE)
     def _handle_player_param(self, msg):
         """
         Deals with player parameter information.
         """
 
+    @parse_mode(PARSE_NONE)
     def _handle_player_type(self, msg):
         """
         Handles player type information.
@@ -252,6 +370,14 @@ class MessageHandler:
                 raise AttributeError("Couldn't find a matching parameter in "
                                      "ServerParameters class: '%s'" % key)
 
+        # the goal post flags are where the goal width puts them
+        landmarks.REGISTRY.set_goal_width(self.wm.server_parameters.goal_width)
+        # and the ball and players move as they say
+        self.wm.ball_tracker.decay = self.wm.server_parameters.ball_decay
+        self.wm.ball_tracker.rand = self.wm.server_parameters.ball_rand
+        self.wm.player_tracker.decay = self.wm.server_parameters.player_decay
+        self.wm.new_generation()
+
     def _handle_init(self, msg):
         """
         Deals with initialization messages sent by the server.
@@ -270,6 +396,7 @@ class MessageHandler:
         self.wm.side = side
         self.wm.uniform_number = uniform_number
         self.wm.play_mode = play_mode
+        self.wm.new_generation()
 
 
     def _handle_error(self, msg):
@@ -291,18 +418,22 @@ class MessageHandler:
     # ####### Coach
     def _handle_ok(self, msg):
         """
-        Response of (look)
+        Response of (look), and of (compression N)
         :param msg:
         """
+        if msg[1] == "compression":
+            self.wm.compression = msg[2]
+            return
+
         print msg
 
+    @parse_mode(PARSE_NONE)
     def _handle_see_global(self, msg):
         """
         Automatic message after (eye on)
-        :param msg: (see_global 0 ((g r) 52.5 0) ((g l) -52.5 0) ((b) 0 0 0 0) ((p "default" 1) -50 0 0 0 0 0)) 
+        :param msg: (see_global 0 ((g r) 52.5 0) ((g l) -52.5 0) ((b) 0 0 0 0) ((p "default" 1) -50 0 0 0 0 0))
         """
-        new_ball, new_flags, new_goals, new_players, new_lines, sim_time = parse_message_see(msg, self.wm)
+        frame = self.see_decoder.decode(msg, self.wm)
         # tell the WorldModel to update any internal variables based on the
         # newly gleaned information.
-        self.wm.process_new_info(new_ball, new_flags, new_goals, new_players,
-                                 new_lines, sim_time)
\ No newline at end of file
+        self.wm.process_new_frame(frame)
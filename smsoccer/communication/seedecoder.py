@@ -0,0 +1,448 @@
+import re
+
+import numpy as np
+
+from smsoccer.util import sp_exceptions
+from smsoccer.world import game_object, landmarks
+from smsoccer.world.seenobjects import MAX_FLAGS, MAX_PLAYERS, \
+    TEAM_UNKNOWN, TEAM_OURS, TEAM_THEIRS
+from smsoccer.world.world_model import WorldModel
+
+
+# capacity of the per-type buffers.  a see message never holds more than the
+# 55 flags, 2 goals, 4 lines and 22 players on the field (see seenobjects for
+# the flags and players).
+MAX_GOALS = 4
+MAX_LINES = 8
+
+# goal and line ids, indexed by the codes stored in the buffers
+GOAL_IDS = game_object.Goal.GOAL_IDS
+LINE_IDS = ("l", "r", "t", "b")
+
+# the header of a see message: its type and the simulation cycle
+pattern_header = re.compile(r"\((see|see_global) (\d+)")
+
+# every object in a see message, split into its name and its values.  Ex:
+# "((f r t 10) 66 24)" gives ('f r t 10', ' 66 24').
+pattern_object = re.compile(r"\(\(([^()]*)\)([^()]*)\)")
+
+
+def _flag_name(flag_id):
+    """
+    Returns the name the server gives to a flag id.  Ex: 'lt30' is sent as
+    'f l t 30'.
+    """
+    return "f " + " ".join(re.findall(r"[a-z]|\d+", flag_id))
+
+# maps the raw object names of the flags to their flag index
+FLAG_NAME_INDEX = dict((_flag_name(flag_id), i)
+                       for i, flag_id in enumerate(game_object.Flag.FLAG_IDS))
+
+GOAL_NAME_INDEX = dict(("g " + g, i) for i, g in enumerate(GOAL_IDS))
+LINE_NAME_INDEX = dict(("l " + l, i) for i, l in enumerate(LINE_IDS))
+
+# where the flags and goals are, and the lines lie (see Line.LINE_COORDS),
+# indexed by the codes stored in the buffers.  the flag and goal codes are
+# their landmark ids, so these are views on the landmark registry, which
+# moves the goal post flags with goal_width.
+FLAG_XY = landmarks.REGISTRY.coords[:landmarks.N_FLAGS]
+GOAL_XY = landmarks.REGISTRY.coords[landmarks.N_FLAGS:]
+LINE_COORDS = np.array([game_object.Line.LINE_COORDS[l] for l in LINE_IDS],
+                       dtype=float)
+
+NAN = float("nan")
+
+
+def _value(x):
+    """
+    Converts a numpy value into a python one, None if it's not available.
+    """
+    return None if x != x else float(x)
+
+
+class VisualFrame(object):
+    """
+    Holds everything seen in a single see message, one preallocated array per
+    type of object and property.  Missing values are stored as NaN, and
+    objects without an id (eg. an out-of-view flag) get index -1.
+
+    The arrays are reused from message to message.  Game objects are only
+    built when they are asked for, through the 'flags', 'goals', 'lines' and
+    'players' views and the 'ball' method.  If pooled, they come from the
+    frame's own ObjectPool, and get reused once the frame is filled again.
+    """
+
+    def __init__(self, pooled=False):
+        self.sim_time = None
+
+        # whether this came from a 'see_global' message, where distance and
+        # direction hold the absolute x and y coordinates instead.
+        self.is_global = False
+
+        # the side and team names needed to describe the seen players
+        self.side = None
+        self.team_name = None
+        self.their_team_name = None
+
+        self.n_flags = 0
+        self.flag_index = np.zeros(MAX_FLAGS, dtype=np.int32)
+        self.flag_distance = np.zeros(MAX_FLAGS)
+        self.flag_direction = np.zeros(MAX_FLAGS)
+        self.flag_dist_change = np.zeros(MAX_FLAGS)
+        self.flag_dir_change = np.zeros(MAX_FLAGS)
+
+        self.n_goals = 0
+        self.goal_index = np.zeros(MAX_GOALS, dtype=np.int32)
+        self.goal_distance = np.zeros(MAX_GOALS)
+        self.goal_direction = np.zeros(MAX_GOALS)
+
+        self.n_lines = 0
+        self.line_index = np.zeros(MAX_LINES, dtype=np.int32)
+        self.line_distance = np.zeros(MAX_LINES)
+        self.line_direction = np.zeros(MAX_LINES)
+
+        # the ball is the only object with a single instance
+        self.has_ball = False
+        self.ball_distance = NAN
+        self.ball_direction = NAN
+        self.ball_dist_change = NAN
+        self.ball_dir_change = NAN
+
+        self.n_players = 0
+        self.player_team = np.zeros(MAX_PLAYERS, dtype=np.int8)
+        self.player_number = np.zeros(MAX_PLAYERS, dtype=np.int8)
+        self.player_goalie = np.zeros(MAX_PLAYERS, dtype=np.bool_)
+        self.player_distance = np.zeros(MAX_PLAYERS)
+        self.player_direction = np.zeros(MAX_PLAYERS)
+        self.player_dist_change = np.zeros(MAX_PLAYERS)
+        self.player_dir_change = np.zeros(MAX_PLAYERS)
+        self.player_body_dir = np.zeros(MAX_PLAYERS)
+        self.player_neck_dir = np.zeros(MAX_PLAYERS)
+
+        # lazily built game objects, made by _new
+        self.pool = game_object.ObjectPool() if pooled else None
+        self._new = self.pool.new if pooled else game_object.allocate
+        self.flags = ObjectView(self._flag_object)
+        self.goals = ObjectView(self._goal_object)
+        self.lines = ObjectView(self._line_object)
+        self.players = ObjectView(self._player_object)
+        self._ball = None
+
+    def clear(self):
+        """
+        Empties the frame so it can be filled by a new message.
+        """
+        self.n_flags = 0
+        self.n_goals = 0
+        self.n_lines = 0
+        self.n_players = 0
+        self.has_ball = False
+        self.their_team_name = None
+
+        self.flags.reset(0)
+        self.goals.reset(0)
+        self.lines.reset(0)
+        self.players.reset(0)
+        self._ball = None
+
+    def landmarks(self):
+        """
+        Returns an array with a row (x, y, distance, direction) for every
+        flag and goal with a known id and direction, as taken by
+        ParticleFilter.update.  Unknown distances are NaN.
+        """
+        ok = (self.flag_index[:self.n_flags] >= 0) & \
+             np.isfinite(self.flag_direction[:self.n_flags])
+        flags = np.column_stack((FLAG_XY[self.flag_index[:self.n_flags][ok]],
+                                 self.flag_distance[:self.n_flags][ok],
+                                 self.flag_direction[:self.n_flags][ok]))
+
+        ok = (self.goal_index[:self.n_goals] >= 0) & \
+             np.isfinite(self.goal_direction[:self.n_goals])
+        goals = np.column_stack((GOAL_XY[self.goal_index[:self.n_goals][ok]],
+                                 self.goal_distance[:self.n_goals][ok],
+                                 self.goal_direction[:self.n_goals][ok]))
+
+        return np.vstack((flags, goals))
+
+    def field_lines(self):
+        """
+        Returns an array with a row (coordinate, vertical, distance,
+        direction) for every line with a known id and direction, as taken by
+        ParticleFilter.update.
+        """
+        ok = (self.line_index[:self.n_lines] >= 0) & \
+             np.isfinite(self.line_direction[:self.n_lines])
+        return np.column_stack((LINE_COORDS[self.line_index[:self.n_lines][ok]],
+                                self.line_distance[:self.n_lines][ok],
+                                self.line_direction[:self.n_lines][ok]))
+
+    def ball(self):
+        """
+        Returns the seen ball as a game object, None if it wasn't seen.
+        """
+        if self.has_ball and self._ball is None:
+            self._ball = self._new(game_object.Ball, _value(self.ball_distance),
+                                   _value(self.ball_direction),
+                                   _value(self.ball_dist_change),
+                                   _value(self.ball_dir_change), None)
+        return self._ball
+
+    def _flag_object(self, i):
+        idx = self.flag_index[i]
+        flag_id = game_object.Flag.FLAG_IDS[idx] if idx >= 0 else None
+        return self._new(game_object.Flag, _value(self.flag_distance[i]),
+                         _value(self.flag_direction[i]), flag_id)
+
+    def _goal_object(self, i):
+        idx = self.goal_index[i]
+        return self._new(game_object.Goal, _value(self.goal_distance[i]),
+                         _value(self.goal_direction[i]),
+                         GOAL_IDS[idx] if idx >= 0 else None)
+
+    def _line_object(self, i):
+        idx = self.line_index[i]
+        return self._new(game_object.Line, _value(self.line_distance[i]),
+                         _value(self.line_direction[i]),
+                         LINE_IDS[idx] if idx >= 0 else None)
+
+    def _player_object(self, i):
+        team = self.player_team[i]
+        if team == TEAM_OURS:
+            team_name, side = self.team_name, self.side
+        elif team == TEAM_THEIRS:
+            team_name = self.their_team_name
+            side = WorldModel.SIDE_R if self.side == WorldModel.SIDE_L else WorldModel.SIDE_L
+        else:
+            team_name, side = None, None
+
+        number = int(self.player_number[i]) or None
+
+        return self._new(game_object.Player, _value(self.player_distance[i]),
+                         _value(self.player_direction[i]),
+                         _value(self.player_dist_change[i]),
+                         _value(self.player_dir_change[i]), None,
+                         team_name, side, number,
+                         _value(self.player_body_dir[i]),
+                         _value(self.player_neck_dir[i]))
+
+
+class ObjectView(object):
+    """
+    A read only sequence of game objects, built one by one from the buffers of
+    a VisualFrame the first time each of them is accessed.
+    """
+
+    def __init__(self, build):
+        self._build = build
+        self._objects = []
+
+    def reset(self, n):
+        self._objects = [None] * n
+
+    def __len__(self):
+        return len(self._objects)
+
+    def __getitem__(self, i):
+        obj = self._objects[i]
+        if obj is None:
+            if i < 0:
+                i += len(self._objects)
+            obj = self._objects[i] = self._build(i)
+        return obj
+
+    def __iter__(self):
+        for i in xrange(len(self._objects)):
+            yield self[i]
+
+    def index(self, obj):
+        """
+        Position of a game object built by this view, without building the
+        others.  Raises ValueError if it isn't one of ours.
+        """
+        return self._objects.index(obj)
+
+
+class SeeDecoder(object):
+    """
+    Decodes '(see ...)' and '(see_global ...)' messages straight from the raw
+    text into a VisualFrame, without going through the generic parser.
+
+    Two frames are used in turn, so the frame handed out by the previous call
+    is left untouched while the next message is being decoded.
+
+    If pooled, the game objects of a frame are reused for the message after
+    next, but for those the world model keeps (see WorldModel.kept_objects):
+    the objects of a see message must not be held on to any longer.
+    """
+
+    def __init__(self, pooled=False):
+        self._frames = (VisualFrame(pooled), VisualFrame(pooled))
+        self._current = 0
+
+    def decode(self, text, wm):
+        """
+        Fills a frame with the objects of the given see message and returns
+        it.  The world model is used to tell our players from theirs.
+        """
+
+        self._current ^= 1
+        frame = self._frames[self._current]
+        if frame.pool is not None:
+            frame.pool.recycle(wm.kept_objects())
+        frame.clear()
+
+        header = pattern_header.match(text)
+        if header is None:
+            raise ValueError("Not a see message: '%s'" % text[:32])
+
+        frame.is_global = header.group(1) == "see_global"
+        frame.sim_time = int(header.group(2))
+        frame.side = wm.side
+        frame.team_name = wm.team_name
+
+        n_flags = n_goals = n_lines = n_players = 0
+
+        for name, values in pattern_object.findall(text, header.end()):
+            # a single value means only direction, more values follow a
+            # regular pattern.  see parse_message_see for the details.
+            vals = values.split()
+            n = len(vals)
+
+            distance = direction = NAN
+            if n == 1:
+                direction = float(vals[0])
+            elif n >= 2:
+                distance = float(vals[0])
+                direction = float(vals[1])
+
+            kind = name[0]
+
+            # flags, the most common object by far
+            if kind == "f":
+                # extra objects past the capacity are dropped
+                if n_flags == MAX_FLAGS:
+                    continue
+                frame.flag_index[n_flags] = FLAG_NAME_INDEX.get(name, -1)
+                frame.flag_distance[n_flags] = distance
+                frame.flag_direction[n_flags] = direction
+                if n >= 4:
+                    frame.flag_dist_change[n_flags] = float(vals[2])
+                    frame.flag_dir_change[n_flags] = float(vals[3])
+                else:
+                    frame.flag_dist_change[n_flags] = NAN
+                    frame.flag_dir_change[n_flags] = NAN
+                n_flags += 1
+
+            elif kind == "p":
+                if n_players == MAX_PLAYERS:
+                    continue
+
+                # 'p', 'p "team"', 'p "team" 5' or 'p "team" 5 goalie'
+                parts = name.split(" ")
+                team = TEAM_UNKNOWN
+                number = 0
+                if len(parts) >= 2:
+                    team_name = parts[1].strip('"')
+                    if team_name == wm.team_name:
+                        team = TEAM_OURS
+                    else:
+                        team = TEAM_THEIRS
+                        frame.their_team_name = team_name
+                if len(parts) >= 3:
+                    number = int(parts[2])
+
+                frame.player_team[n_players] = team
+                frame.player_number[n_players] = number
+                frame.player_goalie[n_players] = len(parts) >= 4
+                frame.player_distance[n_players] = distance
+                frame.player_direction[n_players] = direction
+                if n >= 4:
+                    frame.player_dist_change[n_players] = float(vals[2])
+                    frame.player_dir_change[n_players] = float(vals[3])
+                else:
+                    frame.player_dist_change[n_players] = NAN
+                    frame.player_dir_change[n_players] = NAN
+                if n >= 6:
+                    frame.player_body_dir[n_players] = float(vals[4])
+                    frame.player_neck_dir[n_players] = float(vals[5])
+                else:
+                    frame.player_body_dir[n_players] = NAN
+                    frame.player_neck_dir[n_players] = NAN
+                n_players += 1
+
+            elif kind == "l":
+                if n_lines == MAX_LINES:
+                    continue
+                frame.line_index[n_lines] = LINE_NAME_INDEX.get(name, -1)
+                frame.line_distance[n_lines] = distance
+                frame.line_direction[n_lines] = direction
+                n_lines += 1
+
+            elif kind == "g":
+                if n_goals == MAX_GOALS:
+                    continue
+                frame.goal_index[n_goals] = GOAL_NAME_INDEX.get(name, -1)
+                frame.goal_distance[n_goals] = distance
+                frame.goal_direction[n_goals] = direction
+                n_goals += 1
+
+            elif kind == "b":
+                frame.has_ball = True
+                frame.ball_distance = distance
+                frame.ball_direction = direction
+                if n >= 4:
+                    frame.ball_dist_change = float(vals[2])
+                    frame.ball_dir_change = float(vals[3])
+                else:
+                    frame.ball_dist_change = NAN
+                    frame.ball_dir_change = NAN
+
+            # objects very near to but not viewable by the player are 'blank',
+            # we know they're there but nothing else about them.
+            elif kind == "B":
+                frame.has_ball = True
+                frame.ball_distance = frame.ball_direction = NAN
+                frame.ball_dist_change = frame.ball_dir_change = NAN
+
+            elif kind == "F":
+                if n_flags == MAX_FLAGS:
+                    continue
+                frame.flag_index[n_flags] = -1
+                frame.flag_distance[n_flags] = frame.flag_direction[n_flags] = NAN
+                frame.flag_dist_change[n_flags] = frame.flag_dir_change[n_flags] = NAN
+                n_flags += 1
+
+            elif kind == "G":
+                if n_goals == MAX_GOALS:
+                    continue
+                frame.goal_index[n_goals] = -1
+                frame.goal_distance[n_goals] = frame.goal_direction[n_goals] = NAN
+                n_goals += 1
+
+            elif kind == "P":
+                if n_players == MAX_PLAYERS:
+                    continue
+                frame.player_team[n_players] = TEAM_UNKNOWN
+                frame.player_number[n_players] = 0
+                frame.player_goalie[n_players] = False
+                frame.player_distance[n_players] = frame.player_direction[n_players] = NAN
+                frame.player_dist_change[n_players] = frame.player_dir_change[n_players] = NAN
+                frame.player_body_dir[n_players] = frame.player_neck_dir[n_players] = NAN
+                n_players += 1
+
+            # an unhandled object type
+            else:
+                raise sp_exceptions.ObjectTypeError("Unknown object: '%s'" % name)
+
+        frame.n_flags = n_flags
+        frame.n_goals = n_goals
+        frame.n_lines = n_lines
+        frame.n_players = n_players
+
+        frame.flags.reset(n_flags)
+        frame.goals.reset(n_goals)
+        frame.lines.reset(n_lines)
+        frame.players.reset(n_players)
+
+        return frame
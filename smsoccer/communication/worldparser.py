@@ -2,7 +2,16 @@ from smsoccer.world import game_object
 from smsoccer.world.world_model import WorldModel
 
 
-def parse_message_see(msg, wm):
+def parse_message_see(msg, wm, pool=None):
+    # objects come from the pool if one is given: those it handed out for the
+    # previous see message are recycled first, but for the ones the world
+    # model keeps.
+    if pool is None:
+        new = game_object.allocate
+    else:
+        pool.recycle(wm.kept_objects())
+        new = pool.new
+
     # store new values before changing those in the world model.  all new
     # values replace those in the world model at the end of parsing.
     new_ball = None
@@ -59,7 +68,7 @@ def parse_message_see(msg, wm):
             # the flag's id is its name's members following the f as a string
             flag_id = ''.join(name[1:])
 
-            new_flags.append(game_object.Flag(distance, direction, flag_id))
+            new_flags.append(new(game_object.Flag, distance, direction, flag_id))
 
         # parse players
         elif name[0] == 'p':
@@ -91,9 +100,9 @@ def parse_message_see(msg, wm):
             speed = None
             # TODO: calculate player's speed!
 
-            new_players.append(game_object.Player(distance, direction,
-                                                  dist_change, dir_change, speed, team_name, side,
-                                                  uniform_number, body_dir, neck_dir))
+            new_players.append(new(game_object.Player, distance, direction,
+                                   dist_change, dir_change, speed, team_name, side,
+                                   uniform_number, body_dir, neck_dir))
 
         # parse goals
         elif name[0] == 'g':
@@ -102,7 +111,7 @@ def parse_message_see(msg, wm):
             if len(name) > 1:
                 goal_id = name[1]
 
-            new_goals.append(game_object.Goal(distance, direction, goal_id))
+            new_goals.append(new(game_object.Goal, distance, direction, goal_id))
 
         # parse lines
         elif name[0] == 'l':
@@ -111,36 +120,102 @@ def parse_message_see(msg, wm):
             if len(name) > 1:
                 line_id = name[1]
 
-            new_lines.append(game_object.Line(distance, direction, line_id))
+            new_lines.append(new(game_object.Line, distance, direction, line_id))
 
         # parse the ball
         elif name[0] == 'b':
-            # TODO: handle speed!
-            new_ball = game_object.Ball(distance, direction, dist_change,
-                                        dir_change, None)
+            # its velocity is worked out by WorldModel.ball_tracker
+            new_ball = new(game_object.Ball, distance, direction, dist_change,
+                           dir_change, None)
 
         # object very near to but not viewable by the player are 'blank'
 
         # the out-of-view ball
         elif name[0] == 'B':
-            new_ball = game_object.Ball(None, None, None, None, None)
+            new_ball = new(game_object.Ball, None, None, None, None, None)
 
         # an out-of-view flag
         elif name[0] == 'F':
-            new_flags.append(game_object.Flag(None, None, None))
+            new_flags.append(new(game_object.Flag, None, None, None))
 
         # an out-of-view goal
         elif name[0] == 'G':
-            new_goals.append(game_object.Goal(None, None, None))
+            new_goals.append(new(game_object.Goal, None, None, None))
 
         # an out-of-view player
         elif name[0] == 'P':
-            new_players.append(game_object.Player(None, None, None, None,
-                                                  None, None, None, None, None, None))
+            new_players.append(new(game_object.Player, None, None, None, None,
+                                   None, None, None, None, None, None))
 
         # an unhandled object type
         else:
             raise Exception("Unknown object: '" + str(obj) + "'")
 
 
-    return new_ball, new_flags, new_goals, new_players, new_lines, sim_time
\ No newline at end of file
+    return new_ball, new_flags, new_goals, new_players, new_lines, sim_time
+
+if __name__ == "__main__":
+    import sys
+    import timeit
+
+    from smsoccer.communication.messageparser import parse
+    from smsoccer.communication.seedecoder import SeeDecoder
+
+    # the game objects made for every see message of a file, and the memory
+    # they take, with __dict__ as they had and with __slots__.  then what a
+    # pool saves, once warm.
+    with open(sys.argv[1], 'r') as f:
+        lines = [line.strip() for line in f if line.startswith("(see ")]
+    msgs = [parse(line) for line in lines]
+
+    wm = WorldModel(None, filter_robot_loc=False)
+    wm.team_name = "default"
+    wm.side = WorldModel.SIDE_L
+
+    class Plain(object):
+        pass
+
+    def dict_size(obj):
+        """
+        Size of the same object with a __dict__.
+        """
+        plain = Plain()
+        for cls in type(obj).__mro__:
+            for name in getattr(cls, "__slots__", ()):
+                setattr(plain, name, getattr(obj, name))
+        return sys.getsizeof(plain) + sys.getsizeof(plain.__dict__)
+
+    objects = []
+    for msg in msgs:
+        ball, flags, goals, players, lines_seen, sim_time = parse_message_see(msg, wm)
+        objects.append(flags + goals + players + lines_seen + ([ball] if ball else []))
+
+    n = float(len(msgs))
+    count = sum(len(o) for o in objects)
+    print "%d see messages, %.1f game objects each" % (len(msgs), count / n)
+    print "with __dict__:  %6.0f bytes/see" % (sum(dict_size(x) for o in objects for x in o) / n)
+    print "with __slots__: %6.0f bytes/see" % (sum(sys.getsizeof(x) for o in objects for x in o) / n)
+
+    pool = game_object.ObjectPool()
+    for msg in msgs:
+        parse_message_see(msg, wm, pool)
+    allocated = pool.allocated
+    for msg in msgs:
+        parse_message_see(msg, wm, pool)
+    print "pooled:         %6.2f objects allocated/see once warm" % ((pool.allocated - allocated) / n)
+
+    repeat = 10
+    for name, see in (("parse_message_see", lambda m: parse_message_see(m, wm)),
+                      ("  pooled", lambda m: parse_message_see(m, wm, pool))):
+        t = timeit.timeit(lambda: [see(m) for m in msgs], number=repeat) / (repeat * n)
+        print "%-18s: %6.1f us/see" % (name, t * 1e6)
+
+    # the decoder, every object asked for
+    for name, decoder in (("SeeDecoder", SeeDecoder()), ("  pooled", SeeDecoder(True))):
+        def see(line):
+            frame = decoder.decode(line, wm)
+            return frame.ball(), list(frame.flags), list(frame.goals), \
+                list(frame.players), list(frame.lines)
+
+        t = timeit.timeit(lambda: [see(line) for line in lines], number=repeat) / (repeat * n)
+        print "%-18s: %6.1f us/see" % (name, t * 1e6)
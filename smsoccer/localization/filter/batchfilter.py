@@ -0,0 +1,498 @@
+import time
+
+import numpy as np
+
+from smsoccer.localization.filter import resampling
+from smsoccer.localization.filter.particlefilter import ParticleFilter, N, PLAYER_DECAY, \
+    KAPPA, STD_DISTANCE, move, set_velocity, lines_log_likelihood
+
+# the deferred steps of a cycle, in the order the engine runs them
+MOVE, VELOCITY, UPDATE = range(3)
+
+
+class BatchParticleFilter(object):
+    """
+    The particle filters of many agents in one process, run together.  The
+    particles of K agents live in one (K, N, 5) array, and those of each
+    agent are a view into it, a SharedParticleFilter.  So are its estimates:
+    e_position and abs_coords are views into the (K, 5) array of estimates.
+
+    The agents' filters don't move or weight their particles right away, but
+    queue the work until step is called, which then moves, weights and
+    resamples the particles of all agents with a single NumPy call each.
+    With N = 100, most of the time of a lone filter goes to the overhead of
+    its many small calls, which batching pays once for all the agents.
+
+    The number of particles is the same for all agents and stays fixed, there
+    is no KLD-sampling here.
+    """
+
+    def __init__(self, num_particles=N):
+        self.n = num_particles
+
+        # room for the filters of this many agents, doubled when full, and
+        # the rows of the filters there are
+        self._particles = np.zeros((1, self.n, 5))
+        self._weights = np.zeros((1, self.n))
+        self._estimates = np.zeros((1, 5))
+        self.particles = self._particles[:0]
+        self.weights = self._weights[:0]
+        self.estimates = self._estimates[:0]
+
+        # scratch arrays for the flags and goals seen, with a row per point
+        # seen and a column per particle, kept from step to step
+        self._scratch = np.zeros((6, 0, self.n))
+
+        # the agents' filters, the k-th one holds particles[k]
+        self.filters = []
+
+        # time the last step took, in seconds, and the number of filters it
+        # updated
+        self.step_time = 0.0
+        self.step_size = 0
+
+    def add(self, pf=None):
+        """
+        Adds the filter of a new agent.
+        :param pf: a ParticleFilter whose belief the new filter starts from,
+        resampled to our number of particles.  A lost filter otherwise.
+        :return: the SharedParticleFilter of the agent.
+        """
+        k = len(self.filters)
+
+        # out of room: the arrays double, and the filters there are point to
+        # the new ones
+        if k == len(self._particles):
+            self._particles = np.concatenate((self._particles, np.zeros_like(self._particles)))
+            self._weights = np.concatenate((self._weights, np.zeros_like(self._weights)))
+            self._estimates = np.concatenate((self._estimates, np.zeros_like(self._estimates)))
+            for f in self.filters:
+                f._share()
+
+        self.particles = self._particles[:k + 1]
+        self.weights = self._weights[:k + 1]
+        self.estimates = self._estimates[:k + 1]
+
+        shared = SharedParticleFilter(self, k)
+        if pf is not None:
+            ids = resampling.systematic(pf.weights, self.n)
+            shared.particles[:] = pf.particles[ids]
+            shared.started = pf.started
+            shared._update_estimated_position()
+        self.filters.append(shared)
+
+        return shared
+
+    @staticmethod
+    def _rows(filters):
+        """
+        What selects the rows of the given filters: a slice if they are
+        contiguous, as they are when every agent has work queued, which
+        gives views instead of copies.
+        """
+        first, last = filters[0].k, filters[-1].k
+        if last - first + 1 == len(filters):
+            return slice(first, last + 1)
+        return [f.k for f in filters]
+
+    def step(self):
+        """
+        Runs the work queued by all the filters since the last step: first
+        the moves, then the velocities sensed, then the weighting and
+        resampling of what was seen.
+        """
+        pending = [f for f in self.filters if f._pending]
+        if not pending:
+            return
+
+        start = time.time()
+
+        moving = [f for f in pending if MOVE in f._pending]
+        if moving:
+            self._move(moving)
+
+        sensing = [f for f in pending if VELOCITY in f._pending]
+        if sensing:
+            self._sense_velocity(sensing)
+
+        seeing = [f for f in pending if UPDATE in f._pending]
+        if seeing:
+            self._update(seeing)
+
+        # the estimates of every filter that changed, at once
+        ks = self._rows(pending)
+        self.estimates[ks] = np.einsum('kn,knd->kd', self.weights[ks], self.particles[ks])
+
+        self.step_time = time.time() - start
+        self.step_size = len(pending)
+
+        update_time = self.step_time / len(pending)
+        for f in pending:
+            f._pending = {}
+            f._update_estimated_position(f.estimate)
+            f.update_time = update_time
+
+    def _move(self, filters):
+        ks = self._rows(filters)
+        decay = np.array([f._pending[MOVE] for f in filters])
+
+        # a slice gives a view, worked on in place, a list a copy
+        p = self.particles[ks]
+        move(p, decay[:, np.newaxis, np.newaxis])
+        if not isinstance(ks, slice):
+            self.particles[ks] = p
+
+    def _sense_velocity(self, filters):
+        ks = self._rows(filters)
+        amount, direction = np.array([f._pending[VELOCITY] for f in filters]).T
+
+        p = self.particles[ks]
+        set_velocity(p, amount[:, np.newaxis], direction[:, np.newaxis])
+        if not isinstance(ks, slice):
+            self.particles[ks] = p
+
+    def _update(self, filters):
+        ks = self._rows(filters)
+        seen = [f._pending[UPDATE] for f in filters]
+        k = len(filters)
+
+        p = self.particles[ks]
+
+        # direction each particle looks at
+        view = p[..., 2] + np.array([s[2] for s in seen])[:, np.newaxis]
+
+        log_w = np.zeros((k, self.n))
+
+        points = [s[0] if s[0] is not None else () for s in seen]
+        counts = np.array([len(o) for o in points])
+        has = counts > 0
+        if has.all():
+            log_w += self._points_log_likelihood(p, np.concatenate(points), counts, view)
+        elif has.any():
+            log_w[has] += self._points_log_likelihood(
+                p[has], np.concatenate([o for o in points if len(o)]), counts[has], view[has])
+
+        # the filters saw different numbers of lines: they are padded to the
+        # most seen, and the padding left out of the likelihood
+        lines, valid = _pad([s[1] for s in seen])
+        if lines is not None:
+            log_w += lines_log_likelihood(p, lines, view, valid)
+
+        # weights left from the updates that didn't resample
+        with np.errstate(divide='ignore'):
+            log_w += np.log(self.weights[ks])
+
+        # Normalize weights, shifted by the largest so exp doesn't underflow
+        w = np.exp(log_w - log_w.max(axis=1)[:, np.newaxis])
+        w /= w.sum(axis=1)[:, np.newaxis]
+
+        # Resample the filters whose weights got too concentrated, with the
+        # scheme each of them asked for
+        ess = 1.0 / (w * w).sum(axis=1)
+        thresholds = np.array([s[4] for s in seen])
+        resampled = ess < thresholds * self.n
+
+        for scheme in set(s[3] for s, r in zip(seen, resampled) if r):
+            rows = [j for j, s in enumerate(seen) if resampled[j] and s[3] is scheme]
+            ids = scheme(w[rows])
+            p[rows] = p[np.array(rows)[:, np.newaxis], ids]
+            w[rows] = 1.0 / self.n
+
+        if not isinstance(ks, slice):
+            self.particles[ks] = p
+        self.weights[ks] = w
+
+    def _points_log_likelihood(self, particles, points, counts, view):
+        """
+        points_log_likelihood for the particles of several filters, each
+        with the flags and goals it saw.  These aren't padded to the most
+        any filter saw, which would be about half the work: the points of
+        all the filters come one after the other, each with the particles of
+        its filter, in T x N arrays.  Those are worked on in place, in the
+        scratch arrays: allocated anew every step, arrays that big cost more
+        in page faults than the arithmetic on them.  The same operations as
+        points_log_likelihood, in the same order, give the same numbers but
+        for the order of the sums.
+        :param particles: (K, N, 5) array.
+        :param points: (T, 4) array, the points seen by the first filter,
+        then those seen by the second...
+        :param counts: number of points seen by each filter, none 0.
+        :param view: (K, N) array, as for points_log_likelihood.
+        :return: (K, N) array.
+        """
+        t = len(points)
+        if len(self._scratch[0]) < t:
+            self._scratch = np.zeros((6, 2 * t, self.n))
+        dx, dy, dist, cv, sv, cos_err = self._scratch[:, :t]
+
+        # the filter of each point, and where those of each filter start
+        owner = np.repeat(np.arange(len(counts)), counts)
+        starts = np.cumsum(counts) - counts
+
+        # vector from every particle to every point of its filter
+        np.take(particles[..., 0], owner, axis=0, out=dx)
+        np.subtract(points[:, 0, np.newaxis], dx, out=dx)
+        np.take(particles[..., 1], owner, axis=0, out=dy)
+        np.subtract(points[:, 1, np.newaxis], dy, out=dy)
+
+        np.multiply(dx, dx, out=dist)
+        np.multiply(dy, dy, out=cos_err)
+        dist += cos_err
+        np.sqrt(dist, out=dist)
+
+        # the same vectors, turned so the view direction is the x axis: cv
+        # ends up as vy, cos_err as vx
+        vrad = np.radians(view)
+        np.take(np.cos(vrad), owner, axis=0, out=cv)
+        np.take(np.sin(vrad), owner, axis=0, out=sv)
+        np.multiply(dx, cv, out=cos_err)
+        cv *= dy
+        dy *= sv
+        cos_err += dy
+        sv *= dx
+        cv -= sv
+
+        # cosine of the angle between them and the directions seen
+        dist += 1e-9
+        rad = np.radians(points[:, 3, np.newaxis])
+        cos_err *= np.cos(rad)
+        cv *= np.sin(rad)
+        cos_err += cv
+        cos_err /= dist
+
+        log_l = KAPPA * (np.add.reduceat(cos_err, starts) - counts[:, np.newaxis])
+
+        # far landmarks can be seen without a distance
+        ranged = np.isfinite(points[:, 2])
+        if not ranged.any():
+            return log_l
+
+        dist -= np.where(ranged, points[:, 2], 0)[:, np.newaxis]
+        dist *= dist
+        if not ranged.all():
+            dist *= ranged[:, np.newaxis]
+        log_l -= np.add.reduceat(dist, starts) / (2.0 * STD_DISTANCE ** 2)
+
+        return log_l
+
+
+def _pad(observed):
+    """
+    Stacks the (M, 4) observations of K filters in a (K, M, 4) array, M being
+    the most any of them has, and tells which rows are not padding.
+    :param observed: arrays of observations, or None for no observation.
+    :return: (padded, valid), None twice if there is no observation at all.
+    """
+    observed = [o if o is not None else () for o in observed]
+
+    m = max(len(o) for o in observed)
+    if m == 0:
+        return None, None
+
+    # padding has no distance
+    padded = np.zeros((len(observed), m, 4))
+    padded[..., 2] = np.nan
+    valid = np.zeros((len(observed), m))
+
+    for j, o in enumerate(observed):
+        if len(o):
+            padded[j, :len(o)] = o
+            valid[j, :len(o)] = 1
+
+    return padded, valid
+
+
+class SharedParticleFilter(ParticleFilter):
+    """
+    The particle filter of one agent in a BatchParticleFilter.  Its particles,
+    weights and estimate are views into the arrays of the batch.
+
+    Moving the particles, sensing their velocity and updating them only get
+    queued, and the estimate changes once the batch steps.  Anything else
+    done to the particles first runs whatever is queued, as do queued steps
+    coming out of order (say, a second update before the batch stepped).
+    """
+
+    def __init__(self, batch, k):
+        self.batch = batch
+        self.k = k
+        self.estimate = None
+
+        # the particles start where ParticleFilter puts them, in our rows of
+        # the batch's arrays
+        super(SharedParticleFilter, self).__init__(batch.n)
+
+        # the queued steps, and what they were given
+        self._pending = {}
+
+    def _share(self):
+        """
+        Moves the particles, weights and estimate to our rows of the batch's
+        arrays, and points to them.
+        """
+        particles, weights = self.particles, self.weights
+        self.particles = self.batch._particles[self.k]
+        self.weights = self.batch._weights[self.k]
+        self.estimate = self.batch._estimates[self.k]
+        self.particles[:] = particles
+        self.weights[:] = weights
+        self._update_estimated_position()
+
+    def _update_estimated_position(self, e_position=None):
+        """
+        Puts the estimate in our row of the batch's estimates, which
+        e_position and abs_coords are views into.
+        """
+        if self.estimate is None:
+            # from ParticleFilter.__init__: not in the batch yet
+            self._share()
+            return
+
+        if e_position is None:
+            e_position = np.dot(self.weights, self.particles)
+        if e_position is not self.estimate:
+            self.estimate[:] = e_position
+        super(SharedParticleFilter, self)._update_estimated_position(self.estimate)
+
+    def _queue(self, step, args):
+        # a step can't go before one already queued
+        if self._pending and max(self._pending) >= step:
+            self.batch.step()
+
+        self._pending[step] = args
+
+    def _settle(self):
+        if self._pending:
+            self.batch.step()
+
+    def start_position(self, initial_position):
+        self._settle()
+        super(SharedParticleFilter, self).start_position(initial_position)
+
+    def dash_particles(self, *args, **kwargs):
+        self._settle()
+        super(SharedParticleFilter, self).dash_particles(*args, **kwargs)
+
+    def rotate_particles(self, angle):
+        self._settle()
+        super(SharedParticleFilter, self).rotate_particles(angle)
+
+    def move_particles(self, decay=PLAYER_DECAY):
+        self._queue(MOVE, decay)
+
+    def sense_velocity(self, amount, direction, neck_direction=0):
+        self._queue(VELOCITY, (amount, neck_direction + direction))
+
+    def update(self, points, lines=None, neck_direction=0,
+               resample=resampling.systematic,
+               ess_threshold=resampling.ESS_THRESHOLD):
+        """
+        Queues the update, see ParticleFilter.update.  resample must take the
+        weights of many filters at once, as resampling.systematic and
+        resampling.stratified do.
+        """
+        self._queue(UPDATE, (points, lines, neck_direction, resample, ess_threshold))
+
+
+if __name__ == "__main__":
+    import math
+
+    from smsoccer.world.game_object import Flag, Goal, Line
+    from smsoccer.util.geometric import wrap_angle
+
+    def simulate_see(x, y, view, width=90):
+        """
+        The flags, goals and lines seen from the given pose, without noise.
+        """
+        points = []
+        for fx, fy in Flag.FLAG_COORDS.values() + Goal.GOAL_COORDS.values():
+            direction = wrap_angle(math.degrees(math.atan2(fy - y, fx - x)) - view)
+            if abs(direction) < width / 2:
+                points.append((fx, fy, math.hypot(fx - x, fy - y), direction))
+
+        lines = []
+        for coord, vertical in Line.LINE_COORDS.values():
+            c = math.cos(math.radians(view)) if vertical else math.sin(math.radians(view))
+            along = (coord - (x if vertical else y)) / c if c else -1
+            if along > 0:
+                direction = ((90 if vertical else 0) - view + 90) % 180 - 90
+                lines.append((coord, vertical, along, direction))
+
+        return np.array(points), np.array(lines).reshape(-1, 4)
+
+    # a team of agents, each somewhere on the field, seeing what is there
+    def team(k):
+        poses = np.column_stack((np.random.uniform(-45, 45, k),
+                                 np.random.uniform(-30, 30, k),
+                                 np.random.uniform(-180, 180, k)))
+        return poses, [simulate_see(*pose) for pose in poses]
+
+    def cycle(filters, seen, step=None):
+        for pf, (points, lines) in zip(filters, seen):
+            pf.move_particles()
+            pf.update(points, lines)
+        if step is not None:
+            step()
+
+    # the same work as lone filters.  the weights of agents seeing different
+    # numbers of landmarks, without resampling, which draws nothing random
+    poses, seen = team(11)
+    lone = [ParticleFilter() for i in range(len(poses))]
+    batch = BatchParticleFilter()
+    shared = [batch.add() for pf in lone]
+    for pf, sh, (points, lines) in zip(lone, shared, seen):
+        sh.particles[:] = pf.particles
+        pf.update(points, lines, ess_threshold=0)
+        sh.update(points, lines, ess_threshold=0)
+    batch.step()
+    weights_off = max(np.abs(pf.weights - sh.weights).max() for pf, sh in zip(lone, shared))
+
+    # and a whole game for a single agent, from the same seed: the batch
+    # draws the same random numbers in the same order then
+    pose, (points, lines) = poses[0], seen[0]
+    runs = []
+    for make in (lambda: ParticleFilter(), lambda: BatchParticleFilter().add()):
+        np.random.seed(0)
+        pf = make()
+        pf.start_position(pose)
+        for i in range(50):
+            pf.move_particles()
+            pf.sense_velocity(0.3, 0)
+            pf.update(points, lines)
+        if isinstance(pf, SharedParticleFilter):
+            pf.batch.step()
+        runs.append(pf)
+    particles_off = np.abs(runs[0].particles - runs[1].particles).max()
+
+    print "batched against lone filters: weights %.1e off, particles after 50 cycles " \
+          "from one seed %.1e off" % (weights_off, particles_off)
+    assert weights_off < 1e-12 and particles_off < 1e-9
+
+    for k in (1, 2, 4, 11, 22):
+        poses, seen = team(k)
+
+        lone = [ParticleFilter() for i in range(k)]
+        batch = BatchParticleFilter()
+        shared = [batch.add() for i in range(k)]
+        for pf, pose in zip(lone + shared, np.vstack((poses, poses))):
+            pf.start_position(pose)
+            pf.particles[:, :3] += np.random.randn(N, 3) * [3, 3, 10]
+
+        # the best of several runs of each, taken in turns, the others being
+        # slowed down by whatever else the machine does
+        t_lone = t_batch = float("inf")
+        for run in range(10):
+            start = time.time()
+            for i in range(20):
+                cycle(lone, seen)
+            t_lone = min(t_lone, (time.time() - start) / 20)
+
+            start = time.time()
+            for i in range(20):
+                cycle(shared, seen, batch.step)
+            t_batch = min(t_batch, (time.time() - start) / 20)
+
+        error = max(np.hypot(*(pf.abs_coords - pose[:2])) for pf, pose in zip(shared, poses))
+        print "%2d agents, %d particles: %7.1f us/cycle apart, %7.1f us/cycle batched " \
+              "(%.2fx), %.2f m off at worst" % (k, N, t_lone * 1e6, t_batch * 1e6,
+                                                t_lone / t_batch, error)
@@ -1,20 +1,34 @@
-from numpy.random import random
 import numpy as np
 import math
+import time
 
-from smsoccer.localization.filter.distributions import multivariate_normal, normal
+from smsoccer.localization.filter import resampling
+from smsoccer.world.game_object import Line
 
 # Number of particles
-from smsoccer.util.geometric import euclidean_distance, angle_between_points
-
 N = 100
 
-# Motion variance, Linear and angular
-VAR_L = 0.5
-VAR_T = 5
+# Bounds of the number of particles, when it adapts to the uncertainty
+MIN_PARTICLES = 20
+MAX_PARTICLES = 2000
+
+# Size of the bins the state space is split in to measure how spread out the
+# particles are: x, y, theta.
+BIN_SIZE = np.array([2.0, 2.0, 20.0])
+
+# Motion noise: of the position, relative to the distance moved (as the
+# server's player_rand) plus a minimum, in meters, and of the body direction
+# in degrees, every cycle.
+MOVE_NOISE = 0.1
+MIN_MOVE_NOISE = 0.05
+HEADING_NOISE = 0.5
 # Variance in rotation
 VAR_TURN = 4.0
 
+# Server physics used when not given: ServerParameters defaults
+DASH_POWER_RATE = 0.006
+PLAYER_DECAY = 0.4
+
 # Update variance: x, y, theta.
 # sigma = np.array([[15.0, 0.0, 0.0], [0.0, 15.0, 0.0], [0.0, 0.0, 10.0]])
 sigma = np.array([[20.0, 0.0, 0.0], [0.0, 20.0, 0.0], [0.0, 0.0, 140.0]])
@@ -25,114 +39,349 @@ SHOW_PARTICLES = True
 STD_DISTANCE = 4
 STD_ANGLE = 2
 
+# concentration of the von Mises distribution of the seen directions, the
+# circular counterpart of a normal with STD_ANGLE.
+KAPPA = 1.0 / math.radians(STD_ANGLE) ** 2
+
+# distance expected to a seen line by a particle which doesn't look at it
+LINE_MISS_DISTANCE = 200.0
+
+
+# The functions below work in place on the particles of one filter, (N, 5),
+# or of many at once, (K, N, 5), with the other arguments given per filter.
+
+def move(particles, decay):
+    """
+    One simulation cycle: the particles move by their velocity, with some
+    noise, and the velocity decays.
+    :param decay: the player_decay server parameter, or an array of shape
+    (K, 1, 1).
+    """
+    p = particles
+
+    noise = MOVE_NOISE * np.hypot(p[..., 3], p[..., 4]) + MIN_MOVE_NOISE
+
+    p[..., :2] += p[..., 3:]
+    p[..., :2] += np.random.randn(*p.shape[:-1] + (2,)) * noise[..., np.newaxis]
+    p[..., 2] += np.random.randn(*p.shape[:-1]) * HEADING_NOISE
+    p[..., 3:] *= decay
+
+
+def set_velocity(particles, amount, direction):
+    """
+    Sets the velocity of the particles.
+    :param amount: speed, a number or an array of shape (K, 1).
+    :param direction: direction of the velocity relative to the body of the
+    particles, same shape as amount.
+    """
+    rad = np.radians(particles[..., 2] + direction)
+
+    particles[..., 3] = amount * np.cos(rad)
+    particles[..., 4] = amount * np.sin(rad)
+
+
+def points_log_likelihood(particles, points, view):
+    """
+    Log likelihood of every particle having seen the given flags and goals.
+    No trigonometry is done on the N x M arrays: the directions are compared
+    through the cosine of their difference, with a von Mises distribution,
+    which also takes care of wrapping the angles.
+    :param points: (M, 4) array, or (K, M, 4), see ParticleFilter.update.
+    :param view: direction each particle looks at, (N,) or (K, N).
+    """
+    px = points[..., np.newaxis, :, 0]
+    py = points[..., np.newaxis, :, 1]
+    rad = np.radians(points[..., np.newaxis, :, 3])
+
+    # vector from every particle to every landmark, N x M
+    dx = px - particles[..., :, 0, np.newaxis]
+    dy = py - particles[..., :, 1, np.newaxis]
+    dist = np.sqrt(dx * dx + dy * dy)
+
+    # the same vectors, turned so the view direction is the x axis
+    vrad = np.radians(view)
+    cv = np.cos(vrad)[..., np.newaxis]
+    sv = np.sin(vrad)[..., np.newaxis]
+    vx = dx * cv + dy * sv
+    vy = dy * cv - dx * sv
+
+    # cosine of the angle between them and the directions seen
+    dist += 1e-9  # a particle right on a landmark
+    cos_err = (vx * np.cos(rad) + vy * np.sin(rad)) / dist
+
+    log_l = KAPPA * (cos_err.sum(axis=-1) - points.shape[-2])
+
+    # far landmarks can be seen without a distance
+    ranged = np.isfinite(points[..., 2])
+    if not ranged.any():
+        return log_l
+
+    err = dist - np.where(ranged, points[..., 2], 0)[..., np.newaxis, :]
+    if ranged.all():
+        sq = np.einsum('...nm,...nm->...n', err, err)
+    else:
+        sq = np.einsum('...nm,...nm,...m->...n', err, err, ranged.astype(float))
+
+    log_l -= sq / (2.0 * STD_DISTANCE ** 2)
+
+    return log_l
+
+
+def lines_log_likelihood(particles, lines, view, valid=None):
+    """
+    Log likelihood of every particle having seen the given lines.  A line is
+    seen where the view direction crosses it, at the angle between the two,
+    in [-90, 90).  There are few lines, so this is N x L.
+    :param lines: (L, 4) array, or (K, L, 4), see ParticleFilter.update.
+    :param view: direction each particle looks at, (N,) or (K, N).
+    :param valid: 1 for the lines to use, 0 for the padding of filters that
+    saw fewer than L, same shape as lines[..., 0].  All are used if None.
+    """
+    coord = lines[..., np.newaxis, :, 0]
+    vertical = lines[..., np.newaxis, :, 1] > 0
+    distance = lines[..., np.newaxis, :, 2]
+    direction = lines[..., np.newaxis, :, 3]
+    view = view[..., np.newaxis]
+
+    # angle between the line and the view direction, error wrapped as lines
+    # have no direction: 89 and -89 are close
+    err = (direction - 90.0 * vertical + view + 90) % 180 - 90
+    l = err * err / (2.0 * STD_ANGLE ** 2)
+
+    ranged = distance == distance  # not NaN
+    if ranged.any():
+        # distance along the view direction to the line
+        rad = np.radians(view)
+        c = np.where(vertical, np.cos(rad), np.sin(rad))
+        p = np.where(vertical, particles[..., :, 0, np.newaxis],
+                     particles[..., :, 1, np.newaxis])
+
+        # dividing by 0 gives inf, which is fine
+        errstate = np.seterr(divide='ignore', invalid='ignore')
+        along = (coord - p) / c
+        np.seterr(**errstate)
+
+        along[~(along > 0)] = LINE_MISS_DISTANCE
+
+        err = along - np.where(ranged, distance, 0)
+        err *= ranged
+        l += err * err / (2.0 * STD_DISTANCE ** 2)
+
+    if valid is not None:
+        l *= valid[..., np.newaxis, :]
+
+    return -l.sum(axis=-1)
+
 
 class ParticleFilter(object):
-    def __init__(self):
+    def __init__(self, num_particles=N, adaptive=False,
+                 min_particles=MIN_PARTICLES, max_particles=MAX_PARTICLES):
+        """
+        :param num_particles: initial number of particles.
+        :param adaptive: whether to adapt the number of particles to how
+        uncertain the position is with KLD-sampling, between min_particles
+        and max_particles.  The number of particles stays fixed otherwise.
+        """
         self.started = False
 
-        x = -55 + np.random.randn(N) * 110
-        # y = -35 + np.random.randn(N) * 70
-        y = np.array([-40] * N)
-        th = -180 + np.random.randn(N) * 180
+        # Number of particles
+        self.n = num_particles
+
+        self.adaptive = adaptive
+        self.min_particles = min_particles
+        self.max_particles = max_particles
+
+        # time the last update took, in seconds
+        self.update_time = 0.0
+
+        # the state of every particle: x, y, body direction, and velocity
+        # in x and y.
+        self.particles = np.zeros((self.n, 5))
+        self.particles[:, 0] = -55 + np.random.randn(self.n) * 110
+        # self.particles[:, 1] = -35 + np.random.randn(self.n) * 70
+        self.particles[:, 1] = -40
+        self.particles[:, 2] = -180 + np.random.randn(self.n) * 180
+
+        # normalized weights, carried over the updates that don't resample
+        self.weights = np.ones(self.n) / self.n
 
-        xy = np.vstack((x, y))
-        self.particles = np.vstack((xy, th)).T
         self._update_estimated_position()
 
 
     def start_position(self, initial_position):
         """
-
+        Puts all the particles at the given position, standing still.
         :param initial_position: [x, y, theta]
         """
-        self.particles = np.array([initial_position[:] for i in range(N)])
+        self.particles[:, :3] = initial_position[:3]
+        self.particles[:, 3:] = 0
+        self.weights[:] = 1.0 / self.n
 
         # Estimated position
-        self.e_position = initial_position[:]
+        self._update_estimated_position()
 
         self.started = True
 
-    def dash_particles(self, dash):
+    def dash_particles(self, dash, dash_power_rate=DASH_POWER_RATE, effort=1.0):
         """
-        Move the particles forward
-        :param dash: (vel_lin, vel_ang)
+        Accelerates the particles as a dash does: their velocity gains
+        dash * dash_power_rate * effort along their body direction.  They
+        move with it on the next cycle, see move_particles.
+        :param dash: dash power.
         """
-        if dash > 100:
-            dash = 100
-
-        theta = self.particles[:, 2]
-        # TODO compute c
-        # c = 3.0 / 100.0  # convert dash to velocity
-
-        # displacement
-        c = 1.0 / 100.0  # convert dash to velocity
-        dl = c * dash + np.random.randn(N) * VAR_L
+        dash = min(max(dash, -100), 100)
 
-        dtheta = np.random.randn(N) * VAR_L
+        accel = dash * dash_power_rate * effort
+        rad = np.radians(self.particles[:, 2])
 
-        dx = dl * np.cos(np.radians(theta))
-        dy = dl * np.sin(np.radians(theta))
+        self.particles[:, 3] += accel * np.cos(rad)
+        self.particles[:, 4] += accel * np.sin(rad)
 
-        # movement in x,y
-        mov = np.vstack((dx, dy))
-        # movement with theta=0
-        mov = np.vstack((mov, dtheta))
-
-        self.particles = self.particles + mov.T
+    def move_particles(self, decay=PLAYER_DECAY):
+        """
+        One simulation cycle: the particles move by their velocity, with some
+        noise, and the velocity decays.
+        :param decay: the player_decay server parameter.
+        """
+        move(self.particles, decay)
 
         self._update_estimated_position()
 
+    def sense_velocity(self, amount, direction, neck_direction=0):
+        """
+        Sets the velocity of the particles to the one reported by sense_body,
+        whose direction is relative to the neck.
+        :param amount: speed_amount.
+        :param direction: speed_direction.
+        :param neck_direction: neck direction relative to the body.
+        """
+        set_velocity(self.particles, amount, neck_direction + direction)
+
     def rotate_particles(self, angle):
         """
         Rotate all the particles, it does not have uncertainty.
         :param angle: rotation angle
         """
-        self.particles[:, 2] += angle + np.random.randn(N) * VAR_TURN
+        self.particles[:, 2] += angle + np.random.randn(self.n) * VAR_TURN
         self._update_estimated_position()
 
-    def _resample(self, weights):
-        indices = []
-        c = [0.] + [sum(weights[:i + 1]) for i in range(N)]
-        u0, j = random(), 0
-        for u in [(u0 + i) / N for i in range(N)]:
-            while u > c[j]:
-                j += 1
-            indices.append(j - 1)
-        return indices
-
-
-    def update_based_on_flags(self, flags):
+    @staticmethod
+    def observations(flags=(), goals=(), lines=()):
+        """
+        Packs seen game objects into the arrays taken by update.
+        :return: (points, lines)
         """
-        Update particles based on flags
+        points = [m.real_position() + (m.distance, m.direction)
+                  for m in list(flags) + list(goals)]
+        lines = [Line.LINE_COORDS[l.line_id] + (l.distance, l.direction)
+                 for l in lines]
+
+        # None distances become NaN
+        return (np.array(points, dtype=float).reshape(-1, 4),
+                np.array(lines, dtype=float).reshape(-1, 4))
+
+    def update_based_on_flags(self, flags, goals=(), lines=(), neck_direction=0,
+                              resample=resampling.systematic,
+                              ess_threshold=resampling.ESS_THRESHOLD):
+        """
+        Update particles based on every seen flag, goal and line.
         :param flags: seen flags by the robot.
+        :param goals: seen goals.
+        :param lines: seen lines.
+        See update for the other parameters.
         """
-        # Fist flag, nearest.
-        f = flags[0]
-        real_f = f.real_position()
+        points, lines = self.observations(flags, goals, lines)
+        self.update(points, lines, neck_direction, resample, ess_threshold)
 
-        # Weights.
-        w = [0] * N
+    def update(self, points, lines=None, neck_direction=0,
+               resample=resampling.systematic,
+               ess_threshold=resampling.ESS_THRESHOLD):
+        """
+        Update particles based on what was seen.  Every particle is scored
+        against every landmark at once, as N x M arrays.
+        :param points: array with a row (x, y, distance, direction) for each
+        seen flag or goal.  The distance is NaN if it wasn't seen.
+        :param lines: array with a row (coordinate, vertical, distance,
+        direction) for each seen line, see Line.LINE_COORDS.
+        :param neck_direction: neck direction relative to the body, what the
+        seen directions are relative to.
+        :param resample: resampling scheme, one of the functions of the
+        resampling module.
+        :param ess_threshold: resample only if the effective sample size drops
+        below this fraction of the particles, 1 to always resample.
+        """
+        start = time.time()
 
-        for idx, p in enumerate(self.particles):
-            dist_to_real = euclidean_distance(p[:2], real_f)
-            ang_to_real = angle_between_points(p[:2], real_f) - p[2]
-            # Normal error for distance
-            w_distance = normal(f.distance, dist_to_real, STD_DISTANCE)
+        # direction each particle looks at
+        view = self.particles[:, 2] + neck_direction
 
-            w_theta = normal(f.direction, ang_to_real, STD_ANGLE)
-
-            w[idx] = w_distance + w_theta
+        log_w = np.zeros(self.n)
+        if len(points):
+            log_w += points_log_likelihood(self.particles, points, view)
+        if lines is not None and len(lines):
+            log_w += lines_log_likelihood(self.particles, lines, view)
 
+        # weights left from the updates that didn't resample.  some may have
+        # underflowed to 0, those particles stay out until the next resampling
+        with np.errstate(divide='ignore'):
+            log_w += np.log(self.weights)
 
+        # Normalize weights, shifted by the largest so exp doesn't underflow
+        w = np.exp(log_w - log_w.max())
+        w /= w.sum()
 
-        # Normalize weights
-        w = np.array(w) / sum(w) if sum(w) > 0 else np.ones(N) / N
         # Resample
-        ids = self._resample(w)
-        self.particles = self.particles[ids]
+        if resampling.needs_resampling(w, ess_threshold):
+            if self.adaptive:
+                ids = self._kld_resample(w, resample)
+            else:
+                ids = resample(w)
+
+            self.particles = self.particles[ids]
+            self.n = len(self.particles)
+            self.weights = np.ones(self.n) / self.n
+        else:
+            self.weights = w
 
         self._update_estimated_position()
 
+        self.update_time = time.time() - start
+
+    def _kld_resample(self, weights, resample):
+        """
+        KLD-sampling: draws particles until there are enough for how many
+        bins of the state space they occupy.  Particles are drawn in batches,
+        twice as many as we have at first, and kept in random order only as
+        many as needed.
+        :return: indices of the chosen particles.
+        """
+        all_bins = self._bins(self.particles)
+
+        size = min(self.max_particles, max(2 * self.n, self.min_particles))
+        while True:
+            ids = resample(weights, size)
+            np.random.shuffle(ids)
+
+            needed = resampling.kld_size(all_bins[ids], self.min_particles)
+
+            # not enough particles for the bound, draw more
+            if needed < size or size == self.max_particles:
+                return ids[:needed]
+
+            size = min(self.max_particles, 4 * size)
+
+    def _bins(self, particles):
+        """
+        A number identifying the bin each particle falls in.
+        """
+        b = (particles[:, :3] // BIN_SIZE).astype(np.int64)
+
+        # directions 360 apart fall in the same bin
+        b[:, 2] %= int(360 / BIN_SIZE[2])
+
+        b += 2 ** 19
+        return (b[:, 0] << 40) + (b[:, 1] << 20) + b[:, 2]
+
 
     # def update_particles(self, perception):
     #
@@ -177,30 +426,178 @@ class ParticleFilter(object):
     #     self._update_estimated_position()
 
 
-    def _update_estimated_position(self):
-        self.e_position = np.mean(self.particles, axis=0)
-        self.abs_coords = self.e_position[:2]
-        self.abs_body_dir = self.e_position[2]
+    def _update_estimated_position(self, e_position=None):
+        """
+        :param e_position: the weighted mean of the particles, if already
+        known.
+        """
+        if e_position is None:
+            e_position = np.dot(self.weights, self.particles)
+
+        self.e_position = e_position
+        self.abs_coords = e_position[:2]
+        self.abs_body_dir = e_position[2]
+        self.abs_velocity = e_position[3:]
 
 
 if __name__ == "__main__":
-    pf = ParticleFilter([5, 10, 0])
-    # print pf.particles
+    import timeit
 
-    # # dash
-    pf.dash_particles(10)
-    print pf.particles, pf.e_position
-    #
-    # #rotate
-    # pf.rotate_particles(30)
-    # print pf.particles, pf.e_position
+    from numpy.random import random
 
-    pf.update_particles([5, 10, 0])
+    from smsoccer.localization.filter.distributions import normal
+    from smsoccer.util.geometric import euclidean_distance, angle_between_points, wrap_angle
+    from smsoccer.world.game_object import Flag, Goal
 
-    print pf.particles, pf.e_position
+    def reference_update(pf, flags):
+        """
+        The measurement update as it was, one particle at a time.
+        """
+        f = flags[0]
+        real_f = f.real_position()
+
+        w = [0] * pf.n
+        for idx, p in enumerate(pf.particles):
+            dist_to_real = euclidean_distance(p[:2], real_f)
+            ang_to_real = angle_between_points(p[:2], real_f) - p[2]
+            w_distance = normal(f.distance, dist_to_real, STD_DISTANCE)
+            w_theta = normal(f.direction, ang_to_real, STD_ANGLE)
+            w[idx] = w_distance + w_theta
 
+        w = np.array(w) / sum(w) if sum(w) > 0 else np.ones(pf.n) / pf.n
 
+        indices = []
+        c = [0.] + [sum(w[:i + 1]) for i in range(pf.n)]
+        u0, j = random(), 0
+        for u in [(u0 + i) / pf.n for i in range(pf.n)]:
+            while u > c[j]:
+                j += 1
+            indices.append(j - 1)
+        pf.particles = pf.particles[indices]
+        pf._update_estimated_position()
+
+    # seen from (-20, 10) with body direction 30
+    flags = [Flag(34.0, 167.1, "gl")]
 
+    def run(update, n, repeat):
+        pf = ParticleFilter(n)
+        pf.start_position([-20, 10, 30])
+        pf.particles[:, :3] += np.random.randn(n, 3) * [5, 5, 10]
+        return timeit.timeit(lambda: update(pf, flags), number=repeat) / repeat, pf
 
+    t_ref, _ = run(reference_update, N, 20)
+    print "reference, %5d particles: %8.1f us/update" % (N, t_ref * 1e6)
 
+    for n in (N, 10 * N, 100 * N):
+        t, pf = run(ParticleFilter.update_based_on_flags, n, 200)
+        print "vectorized, %4d particles: %8.1f us/update (%.1fx the reference) -> %s" % \
+              (n, t * 1e6, t_ref / t, np.round(pf.e_position, 1))
 
+    def simulate_see(x, y, view, width=90):
+        """
+        The flags, goals and lines seen from the given pose, as taken by
+        update, without noise.
+        """
+        points = []
+        for fx, fy in Flag.FLAG_COORDS.values() + Goal.GOAL_COORDS.values():
+            direction = wrap_angle(math.degrees(math.atan2(fy - y, fx - x)) - view)
+            if abs(direction) < width / 2:
+                points.append((fx, fy, math.hypot(fx - x, fy - y), direction))
+
+        lines = []
+        for coord, vertical in Line.LINE_COORDS.values():
+            c = math.cos(math.radians(view)) if vertical else math.sin(math.radians(view))
+            along = (coord - (x if vertical else y)) / c if c else -1
+            if along > 0:
+                direction = ((90 if vertical else 0) - view + 90) % 180 - 90
+                lines.append((coord, vertical, along, direction))
+
+        return np.array(points), np.array(lines).reshape(-1, 4)
+
+    points, lines = simulate_see(-20, 10, 30)
+    nearest = points[np.argsort(points[:, 2])[:1]]
+
+    # in low view quality nothing comes with a distance
+    bearings, bearing_lines = points.copy(), lines.copy()
+    bearings[:, 2] = bearing_lines[:, 2] = np.nan
+    print "seen: %d flags and goals, %d lines" % (len(points), len(lines))
+
+    for n in (N, 10 * N):
+        for name, p, l in (("nearest flag", nearest, None), ("everything", points, lines),
+                           ("bearings", bearings, bearing_lines)):
+            pf = ParticleFilter(n)
+            t = timeit.timeit(lambda: pf.update(p, l, ess_threshold=1), number=200) / 200
+
+            # from a rough guess, how far off the estimate is after a few
+            # updates
+            pf = ParticleFilter(n)
+            pf.start_position([-20, 10, 30])
+            pf.particles[:, :3] += np.random.randn(n, 3) * [5, 5, 20]
+            for i in range(5):
+                pf.move_particles()
+                pf.update(p, l)
+            error = np.hypot(pf.e_position[0] + 20, pf.e_position[1] - 10)
+
+            print "%-12s, %4d particles: %6.1f us/update, %5.1f m off after 5 updates" % \
+                  (name, n, t * 1e6, error)
+
+    # a player dashing across the field, seeing every third cycle, tracked
+    # with and without the velocity reported by sense_body.  in low view
+    # quality, it sees twice as often, without distances.
+    def track(n, odometry, low_quality=False, cycles=60):
+        x, y, body, vx, vy = -40.0, -10.0, 20.0, 0.0, 0.0
+        pf = ParticleFilter(n)
+        pf.start_position([x, y, body])
+
+        errors = []
+        for cycle in range(cycles):
+            # the server moves the player, the filter hears of it with the
+            # next sense_body
+            power = 100 if cycle % 20 < 12 else 0
+            vx += power * DASH_POWER_RATE * math.cos(math.radians(body))
+            vy += power * DASH_POWER_RATE * math.sin(math.radians(body))
+            x, y = x + vx * (1 + 0.1 * np.random.randn()), y + vy * (1 + 0.1 * np.random.randn())
+            vx, vy = vx * PLAYER_DECAY, vy * PLAYER_DECAY
+
+            pf.move_particles()
+            if odometry:
+                pf.sense_velocity(math.hypot(vx, vy),
+                                  math.degrees(math.atan2(vy, vx)) - body)
+            if low_quality and cycle % 3 != 1:
+                points, lines = simulate_see(x, y, body)
+                points[:, 2] = lines[:, 2] = np.nan
+                points[:, 3] += np.random.randn(len(points))
+                pf.update(points, lines)
+            elif not low_quality and cycle % 3 == 0:
+                points, lines = simulate_see(x, y, body)
+                points[:, 2:] += np.random.randn(len(points), 2) * [1, 1]
+                pf.update(points, lines)
+
+            pf.dash_particles(power)
+            errors.append(math.hypot(pf.e_position[0] - x, pf.e_position[1] - y))
+
+        return np.mean(errors)
+
+    for n in (20, 50, 100):
+        print "tracking, %3d particles: %.2f m off on average, %.2f m with sense_body speed, " \
+              "%.2f m in low view quality" % \
+              (n, np.mean([track(n, False) for i in range(5)]),
+               np.mean([track(n, True) for i in range(5)]),
+               np.mean([track(n, True, True) for i in range(5)]))
+
+    # adaptive filter, lost at first, then told where it is
+    pf = ParticleFilter(MAX_PARTICLES, adaptive=True)
+    for i in range(10):
+        if i == 5:
+            pf.start_position([-20, 10, 30])
+        pf.move_particles()
+        pf.update_based_on_flags(flags, ess_threshold=1)
+        print "adaptive, update %d: %4d particles, %6.1f us -> %s" % \
+              (i, pf.n, pf.update_time * 1e6, np.round(pf.e_position, 1))
+
+    # the resampling schemes alone, on the same weights
+    w = np.random.random(10 * N) ** 8
+    w /= w.sum()
+    for scheme in (resampling.systematic, resampling.stratified, resampling.residual):
+        t = timeit.timeit(lambda: scheme(w), number=1000) / 1000
+        print "%-10s resampling, %d particles: %6.1f us" % (scheme.__name__, len(w), t * 1e6)
@@ -0,0 +1,140 @@
+from numpy.random import random
+import numpy as np
+
+# resample only when the effective sample size drops below this fraction of
+# the number of particles.
+ESS_THRESHOLD = 0.5
+
+# KLD-sampling: largest KL divergence allowed between the particles and the
+# posterior, and the normal quantile of the probability of staying under it
+# (2.326 for 0.99).
+KLD_EPSILON = 0.1
+KLD_Z = 2.326
+
+# kld_bound for 0, 1, 2... bins, for each (epsilon, z) used
+_kld_tables = {}
+
+
+def effective_sample_size(weights):
+    """
+    Number of particles that effectively carry the weight: N when the weights
+    are uniform, 1 when a single particle has them all.
+    :param weights: normalized weights.
+    """
+    return 1.0 / np.dot(weights, weights)
+
+
+def needs_resampling(weights, threshold=ESS_THRESHOLD):
+    """
+    Whether the weights are concentrated enough to be worth resampling.
+    :param weights: normalized weights.
+    :param threshold: fraction of the particles the effective sample size
+    must stay above.
+    """
+    return effective_sample_size(weights) < threshold * len(weights)
+
+
+def _search(weights, u):
+    """
+    Indices of the particles the sorted points u, in [0, 1), fall on.  With
+    a row of weights and of points per filter, each row is searched on its
+    own.
+    """
+    c = np.cumsum(weights, axis=-1)
+    c[..., -1] = 1.0  # guard against round-off
+
+    if c.ndim == 1:
+        return np.searchsorted(c, u, side='right')
+
+    # row k is shifted to [k, k + 1], so a single search does all of them
+    shift = np.arange(len(c))[:, np.newaxis]
+    ids = np.searchsorted((c + shift).ravel(), (u + shift).ravel(), side='right')
+
+    return ids.reshape(u.shape) - shift * c.shape[1]
+
+
+def systematic(weights, n=None):
+    """
+    One random offset, then n evenly spaced points.
+    :param weights: normalized weights, or a (K, N) array with the weights
+    of K filters, resampled each with its own offset.
+    :param n: number of particles to draw, as many as there are by default.
+    :return: indices of the chosen particles, (K, n) for K filters.
+    """
+    n = n or weights.shape[-1]
+    return _search(weights, (random(weights.shape[:-1] + (1,)) + np.arange(n)) / n)
+
+
+def stratified(weights, n=None):
+    """
+    One random point in each of n equal strata.
+    :param weights: normalized weights, or a (K, N) array as for systematic.
+    :param n: number of particles to draw, as many as there are by default.
+    :return: indices of the chosen particles, (K, n) for K filters.
+    """
+    n = n or weights.shape[-1]
+    return _search(weights, (random(weights.shape[:-1] + (n,)) + np.arange(n)) / n)
+
+
+def residual(weights, n=None):
+    """
+    Each particle is copied floor(n w) times, the rest are drawn at random
+    from what is left of the weights.
+    :param weights: normalized weights.
+    :param n: number of particles to draw, as many as there are by default.
+    :return: indices of the chosen particles.
+    """
+    n = n or len(weights)
+
+    counts = np.floor(n * weights).astype(int)
+    indices = np.repeat(np.arange(len(weights)), counts)
+
+    left = n - len(indices)
+    if left == 0:
+        return indices
+
+    residuals = n * weights - counts
+    residuals /= residuals.sum()
+
+    drawn = _search(residuals, np.sort(random(left)))
+
+    return np.concatenate((indices, drawn))
+
+
+def kld_bound(k, epsilon=KLD_EPSILON, z=KLD_Z):
+    """
+    Number of particles needed for the KL divergence between them and the
+    posterior to stay under epsilon, when they occupy k bins of the state
+    space (Fox, 2003).  k can be an array.
+    """
+    k1 = np.maximum(k - 1, 1)
+    a = 2.0 / (9.0 * k1)
+    bound = k1 / (2.0 * epsilon) * (1 - a + np.sqrt(a) * z) ** 3
+
+    # a single bin needs no more than one particle
+    return np.where(k > 1, bound, 1)
+
+
+def kld_size(bins, min_size=1, epsilon=KLD_EPSILON, z=KLD_Z):
+    """
+    How many of the given particles to keep: the fewest, in order, that
+    satisfy the KLD bound for the number of bins they occupy.  All of them if
+    none do.
+    :param bins: bin of each particle, in the random order they were drawn.
+    :param min_size: never keep fewer than this.
+    """
+    # number of bins occupied by the first i + 1 particles
+    _, first = np.unique(bins, return_index=True)
+    occupied = np.zeros(len(bins), dtype=int)
+    occupied[first] = 1
+    k = np.cumsum(occupied)
+
+    table = _kld_tables.get((epsilon, z))
+    if table is None or len(table) <= len(bins):
+        table = kld_bound(np.arange(max(len(bins) + 1, 1024)), epsilon, z)
+        _kld_tables[(epsilon, z)] = table
+
+    needed = np.maximum(table[k], min_size)
+    enough = np.nonzero(np.arange(1, len(bins) + 1) >= needed)[0]
+
+    return enough[0] + 1 if len(enough) else len(bins)
@@ -1,5 +1,28 @@
+import cmath
 import math
 
+import numpy as np
+
+from smsoccer.world.landmarks import REGISTRY
+
+# Noise of the position of a seen landmark, relative to the player: the
+# server quantizes the distances of flags in 1% steps (quantize_step_l) and
+# rounds them to 0.1 m, and rounds directions to a degree, about 0.5% of the
+# distance sideways.  Its std is RELATIVE_NOISE times the distance plus
+# MIN_NOISE, in meters.
+RELATIVE_NOISE = 0.005
+MIN_NOISE = 0.03
+
+# std of the error of a seen direction, in degrees: the server rounds them
+# to a degree, whatever the view quality.
+BEARING_NOISE = 0.3
+
+# std of the position from the two nearest landmarks, in meters, past which
+# estimate_pose_from_nearest uses all of them
+NEAREST_MAX_STD = 1.5
+
+# degrees to radians, times i
+_I_RAD = 1j * math.pi / 180
 
 vDiff = lambda (bx, by), (ax, ay): (bx - ax, by - ay)
 normV = lambda (x, y), n: (x / (1.0 * n), y / (1.0 * n))
@@ -12,13 +35,11 @@ def compute_colinear(f1, f2, mid=1):
 
     da, db = f1.distance, f2.distance
     # Real position of the flags
-    rf1 = f1.real_position()
-    rf2 = f2.real_position()
+    rf1 = REGISTRY.position(f1.landmark_id)
+    rf2 = REGISTRY.position(f2.landmark_id)
 
-    b_a = vDiff(rf2, rf1)  # difference vector
-
-    lb_a = math.hypot(*b_a)
-    nb_a = normV(b_a, lb_a)
+    # normalized difference vector, precomputed
+    lb_a, nb_a = REGISTRY.pair(f1.landmark_id, f2.landmark_id)
 
     va = (mid * nb_a[0] * da, mid * nb_a[1] * da)
     vb = (nb_a[0] * db, nb_a[1] * db)
@@ -39,13 +60,11 @@ def compute_non_colinear(f1, f2):
     if f1.direction < f2.direction:
         f1, f2 = f2, f1
 
-    # Real position of the flags
-    rf1 = f1.real_position()
-    rf2 = f2.real_position()
+    # Real position of the flag
+    rf1 = REGISTRY.position(f1.landmark_id)
 
-    b_a = vDiff(rf2, rf1)  # difference vector
-    lb_a = math.hypot(*b_a)  # norm of difference
-    nb_a = normV(b_a, lb_a)  # normalized difference
+    # norm of difference and normalized difference, precomputed
+    lb_a, nb_a = REGISTRY.pair(f1.landmark_id, f2.landmark_id)
     rndiff = Rot90R(nb_a)  # normalized -90o rotation
     lpcomp = (lb_a ** 2 + f1.distance ** 2 - f2.distance ** 2) / (2 * lb_a)  # norm of parallel component
 
@@ -80,7 +99,7 @@ def triangulate_direction(abs_coords, flags):
             # f2 = f1
             f1 = f
 
-    b = f1.real_position()
+    b = REGISTRY.position(f1.landmark_id)
 
     v = (b[0] - abs_coords[0], b[1] - abs_coords[1])  #v =b - a
     theta = math.degrees(math.atan2(v[1], v[0]))  #direction of v
@@ -111,4 +130,320 @@ def triangulate_position(flags):
     elif f1.distance != f2.distance:
         return compute_colinear(f1, f2)
     else:
-        return None
\ No newline at end of file
+        return None
+
+
+def estimate_pose(landmarks):
+    """
+    Estimates position and neck direction from all the landmarks seen with a
+    distance at once, by weighted least squares: the pose that best moves
+    what was seen, relative to the neck, onto where the landmarks are.  This
+    has a closed form (a weighted Procrustes problem), so there is no
+    iteration and no special case for colinear landmarks.  Far landmarks are
+    seen less precisely, and weigh less.
+    :param landmarks: array with a row (x, y, distance, direction) for each
+    seen flag or goal, as taken by ParticleFilter.update.  Rows with a NaN
+    distance are left out.
+    :return: (x, y, direction, covariance), where covariance is the 3 x 3
+    covariance of x, y (m) and direction (degrees), as nested tuples, or None
+    if fewer than two landmarks have a distance.
+    """
+    m = len(landmarks)
+    if m < 2:
+        return None
+
+    # points as complex numbers, so a rotation is a product: where the
+    # landmarks are, b = x + iy, and where they were seen relative to the
+    # neck, a.  each row is read as two numbers, x + iy and
+    # distance + i direction.
+    z = np.ascontiguousarray(landmarks, dtype=float).view(complex)
+    d = z[:, 1].real
+
+    x = np.empty((3, m), dtype=complex)
+    x[0] = 1
+    np.exp(z[:, 1].imag * _I_RAD, out=x[1])
+    x[1] *= d
+    x[2] = z[:, 0]
+
+    # weighted by 1 / sigma^2, each point divided by sigma.  sigma is taken
+    # in units of RELATIVE_NOISE, which the covariance is scaled back by.
+    x /= d + MIN_NOISE / RELATIVE_NOISE
+
+    # all the weighted sums at once: of w, a, b, |a|^2, conj(a) b and |b|^2.
+    # with so few landmarks numpy calls cost more than the sums, so the rest
+    # is done on python numbers.  a NaN distance turns up in every sum, and
+    # only then are the landmarks without one left out.
+    (sw, sa, sb), (_, saa, sab), (_, _, sbb) = np.dot(x.conj(), x.T).tolist()
+    sw = sw.real
+    if sw != sw:
+        known = d == d
+        return estimate_pose(landmarks[known]) if not known.all() else None
+    ma, mb = sa / sw, sb / sw
+
+    # about the weighted means: sum of conj(a) b, and spread of a and b
+    h = sab - sw * ma.conjugate() * mb
+    spread_a = saa.real - sw * abs(ma) ** 2
+    spread_b = sbb.real - sw * abs(mb) ** 2
+    return _solve(m, sw, ma, mb, h, spread_a, spread_b)
+
+
+def estimate_pose_from_nearest(landmarks, max_std=NEAREST_MAX_STD):
+    """
+    Estimates position and neck direction as estimate_pose does, from the two
+    nearest landmarks alone as long as they pin the position down to max_std,
+    and only otherwise from all of them.  The two nearest are seen the most
+    precisely, and unless they are close to each other they are enough, at a
+    cost that doesn't grow with how many landmarks are seen.
+    :param landmarks: as taken by estimate_pose.
+    :param max_std: std of the position, in meters, past which all the
+    landmarks are used.
+    :return: as estimate_pose.
+    """
+    nearest = landmarks
+    if len(nearest) > 2:
+        # NaN distances come last
+        nearest = nearest.take(nearest[:, 2].argsort()[:2], 0)
+    elif len(nearest) < 2:
+        return None
+
+    # the weighted sums of estimate_pose, for two points: taken about their
+    # weighted means, they are the differences of the points times
+    # w1 w2 / (w1 + w2)
+    (x1, y1, d1, t1), (x2, y2, d2, t2) = nearest.tolist()
+    w1 = (d1 + MIN_NOISE / RELATIVE_NOISE) ** -2
+    w2 = (d2 + MIN_NOISE / RELATIVE_NOISE) ** -2
+    a1, a2 = cmath.rect(d1, math.radians(t1)), cmath.rect(d2, math.radians(t2))
+    b1, b2 = complex(x1, y1), complex(x2, y2)
+    sw = w1 + w2
+    k = w1 * w2 / sw
+    da, db = a2 - a1, b2 - b1
+
+    pose = None
+    if sw == sw:
+        pose = _solve(2, sw, (w1 * a1 + w2 * a2) / sw, (w1 * b1 + w2 * b2) / sw,
+                      k * da.conjugate() * db, k * abs(da) ** 2, k * abs(db) ** 2)
+    if pose is None or pose[3][0][0] + pose[3][1][1] > max_std ** 2:
+        return estimate_pose(landmarks)
+    return pose
+
+
+def _solve(m, sw, ma, mb, h, spread_a, spread_b):
+    """
+    The pose from the weighted sums of estimate_pose, taken about the
+    weighted means.
+    """
+    abs_h = abs(h)
+    if spread_a <= 0 or abs_h == 0:
+        return None
+
+    # rotation taking the seen points onto the real ones, and the position
+    # they are seen from
+    q = h / abs_h * ma
+    position = mb - q
+
+    # the residuals tell whether the noise was underestimated
+    scale = RELATIVE_NOISE ** 2
+    if m > 2:
+        scale = max(scale, (spread_a + spread_b - 2 * abs_h) / (2 * m - 3))
+
+    # covariance: inverse of the information matrix [[sw I, g], [g', h]],
+    # with g the weighted sum of the seen points turned and then turned 90
+    # degrees, done block wise.  direction in degrees.
+    gx, gy = -q.imag, q.real
+    var_phi = scale / spread_a
+    var_p = scale / sw
+    deg = math.degrees(1)
+    cxy = gx * gy * var_phi
+    cxd, cyd = -gx * var_phi * deg, -gy * var_phi * deg
+
+    cov = ((var_p + gx * gx * var_phi, cxy, cxd),
+           (cxy, var_p + gy * gy * var_phi, cyd),
+           (cxd, cyd, var_phi * deg * deg))
+
+    return position.real, position.imag, math.degrees(math.atan2(h.imag, h.real)), cov
+
+
+def estimate_pose_from_bearings(landmarks, iterations=1):
+    """
+    Estimates position and neck direction from the directions of the seen
+    landmarks alone, as seen in low view quality, where distances are not
+    sent.  Needs at least three landmarks.
+
+    The differences between the directions of the landmarks don't depend on
+    the neck direction, which leaves the position, as the intersection of the
+    circles the pairs of landmarks are seen under a given angle from.  Rather
+    than intersecting circles, the directions are solved for at once by least
+    squares: seen from the right pose, each landmark lies on the ray of its
+    direction, which written in the frame of the neck is an equation linear
+    in the neck direction's cosine and sine and the position turned by it.
+    Each equation measures how far its landmark is off its ray, which grows
+    with the unknown distance, so the estimate is redone weighting each by
+    the distance the previous one gives.
+    :param landmarks: as taken by estimate_pose.  Distances are ignored, rows
+    with a NaN direction are left out.
+    :param iterations: number of times the weights are refined.
+    :return: (x, y, direction, covariance) as estimate_pose, or None.
+    """
+    directions = landmarks[:, 3]
+    if math.isnan(np.dot(directions, directions)):
+        landmarks = landmarks[directions == directions]
+    m = len(landmarks)
+    if m < 3:
+        return None
+
+    # as complex numbers: where the landmarks are, l, and the directions they
+    # were seen in, v.  with r the inverse of the neck rotation and t the
+    # position turned by r, seeing landmark l in direction v means
+    # im(conj(v) (r l - t)) = 0, a row of a, times (r, t) read as 4 numbers.
+    z = np.ascontiguousarray(landmarks, dtype=float).view(complex)
+    l = z[:, 0]
+    v = np.exp(z[:, 1].imag * _I_RAD)
+
+    y = np.empty((m, 2), dtype=complex)
+    y[:, 0] = v * l.conj() * 1j
+    y[:, 1] = v * -1j
+    a = y.view(float)
+
+    w = np.ones(m)
+    for i in range(iterations + 1):
+        g = np.dot(a.T * w, a).tolist()
+
+        # t is solved for in terms of r, t = -k r, which leaves a 2 x 2
+        # problem for r
+        det = g[2][2] * g[3][3] - g[2][3] * g[3][2]
+        if det <= 0:
+            return None
+        k = [[(g[3][3] * g[2][j] - g[2][3] * g[3][j]) / det for j in (0, 1)],
+             [(g[2][2] * g[3][j] - g[3][2] * g[2][j]) / det for j in (0, 1)]]
+
+        # r is the eigenvector of the smallest eigenvalue of what is left
+        p = g[0][0] - g[0][2] * k[0][0] - g[0][3] * k[1][0]
+        q = g[0][1] - g[0][2] * k[0][1] - g[0][3] * k[1][1]
+        s = g[1][1] - g[1][2] * k[0][1] - g[1][3] * k[1][1]
+        lowest = (p + s) / 2.0 - math.hypot((p - s) / 2.0, q)
+        if abs(p - lowest) > abs(s - lowest):
+            r = complex(q, lowest - p)
+        else:
+            r = complex(lowest - s, q)
+        if r == 0:
+            return None
+        r /= abs(r)
+        t = -complex(k[0][0] * r.real + k[0][1] * r.imag,
+                     k[1][0] * r.real + k[1][1] * r.imag)
+
+        # both signs solve it, the landmarks must be in front of us
+        if (r * np.dot(v.conj(), l) - t * v.sum().conjugate()).real < 0:
+            r, t = -r, -t
+
+        position = t / r
+
+        # the distances the landmarks are at, from the position found
+        inv = 1.0 / (l - position)
+        w = inv.real ** 2 + inv.imag ** 2
+
+    # the residuals tell whether the noise was underestimated: lowest is the
+    # weighted sum of the squared residuals, in radians
+    var = math.radians(BEARING_NOISE) ** 2
+    if m > 3:
+        var *= max(1.0, lowest / var / (m - 3))
+
+    # information matrix of x, y and the neck direction: the direction of a
+    # landmark changes with them by -im(1 / u), -re(1 / u) and -1, u being
+    # the landmark relative to the position
+    s1 = inv.sum()
+    s2 = np.dot(inv, inv)
+    sw = w.sum()
+    hxx, hyy, hxy = (sw - s2.real) / 2, (sw + s2.real) / 2, s2.imag / 2
+    hxp, hyp, hpp = s1.imag, s1.real, m
+
+    cxx = hyy * hpp - hyp * hyp
+    cxy = hxp * hyp - hxy * hpp
+    cxp = hxy * hyp - hyy * hxp
+    det = hxx * cxx + hxy * cxy + hxp * cxp
+    if det <= 0:
+        return None
+    deg = math.degrees(1)
+    var /= det
+
+    cyp = (hxp * hxy - hxx * hyp) * var * deg
+    cov = ((cxx * var, cxy * var, cxp * var * deg),
+           (cxy * var, (hxx * hpp - hxp * hxp) * var, cyp),
+           (cxp * var * deg, cyp, (hxx * hyy - hxy * hxy) * var * deg * deg))
+
+    return position.real, position.imag, math.degrees(-math.atan2(r.imag, r.real)), cov
+
+
+if __name__ == "__main__":
+    import time
+
+    from smsoccer.world.game_object import Flag
+
+    def see(x, y, view, width):
+        """
+        The flags seen from the given pose, quantized as the server does.
+        """
+        flags = []
+        for flag_id, (fx, fy) in Flag.FLAG_COORDS.items():
+            direction = (math.degrees(math.atan2(fy - y, fx - x)) - view + 180) % 360 - 180
+            if abs(direction) < width / 2.0:
+                d = math.hypot(fx - x, fy - y)
+                d = round(math.exp(round(math.log(d + 1e-10) / 0.01) * 0.01), 1)
+                flags.append(Flag(d, round(direction), flag_id))
+        return flags
+
+    def two_flags(flags):
+        """
+        The path it replaces: the two nearest flags, from the seen flags.
+        """
+        gflags = [f for f in flags if f.distance is not None and f.direction is not None]
+        gflags.sort(key=lambda f: f.distance)
+        if len(gflags) < 2:
+            return None
+        position = triangulate_position(gflags)
+        if position is None:
+            return None
+        return position + (triangulate_direction(position, gflags),)
+
+    def landmarks(flags):
+        return np.array([f.real_position() + (f.distance, f.direction) for f in flags])
+
+    estimates = (("two nearest", two_flags, list),
+                 ("nearest, wls", estimate_pose_from_nearest, landmarks),
+                 ("all, wls", estimate_pose, landmarks),
+                 ("bearings", estimate_pose_from_bearings, landmarks))
+
+    # what is seen from random poses with each view width, by how many flags
+    np.random.seed(0)
+    seen = {}
+    for x, y, view in zip(np.random.uniform(-45, 45, 1000), np.random.uniform(-30, 30, 1000),
+                          np.random.uniform(-180, 180, 1000)):
+        for width in (45, 90, 180):
+            flags = see(x, y, view, width)
+            if len(flags) >= 2:
+                seen.setdefault(len(flags), []).append(((x, y, view), flags))
+
+    for low, high in ((2, 5), (5, 10), (10, 15), (15, 20), (20, 30), (30, 60)):
+        poses = sum((seen.get(m, []) for m in range(low, high)), [])
+        inputs = [[convert(flags) for pose, flags in poses] for name, estimate, convert in estimates]
+
+        # the estimates take turns, and the best of several runs is kept,
+        # the others being slowed down by whatever else the machine does
+        times = [float("inf")] * len(estimates)
+        for run in range(20):
+            for j, (name, estimate, convert) in enumerate(estimates):
+                start = time.clock()
+                for flags in inputs[j]:
+                    estimate(flags)
+                times[j] = min(times[j], (time.clock() - start) / len(poses))
+
+        print "%2d to %2d flags, %4d poses:" % (low, high - 1, len(poses))
+        for (name, estimate, convert), flags, t in zip(estimates, inputs, times):
+            errors = []
+            for ((x, y, view), _), f in zip(poses, flags):
+                e = estimate(f)
+                if e is not None:
+                    errors.append((math.hypot(e[0] - x, e[1] - y), abs((e[2] - view + 180) % 360 - 180)))
+            errors = np.array(errors)
+            print "    %-12s: %5.1f us, %4.2fx, %.3f m and %.2f deg off on average, " \
+                  "%.2f m at worst" % (name, t * 1e6, times[0] / t, errors[:, 0].mean(),
+                                       errors[:, 1].mean(), errors[:, 0].max())
@@ -6,6 +6,7 @@ import time
 from smsoccer.communication.actioncommunicator import ActionCommunicator
 from smsoccer.communication import sock
 from smsoccer.communication.messagehandler import MessageHandler
+from smsoccer.players.scheduler import CycleScheduler
 from smsoccer.util import sp_exceptions
 from smsoccer.world.world_model import WorldModel
 
@@ -34,6 +35,9 @@ class AbstractAgent(object):
         self.wm = None
         self.msg_handler = None
 
+        # whether we run our own threads, or get driven by a runtime
+        self.__threaded = True
+
         # parse thread and control variable
         self.__parsing = False
         self._msg_thread = None
@@ -41,8 +45,8 @@ class AbstractAgent(object):
         self.__thinking = False  # think thread and control variable
         self._think_thread = None
 
-        # whether we should run the think method
-        self.__should_think_on_data = False
+        # decides when to think and when a new cycle begins
+        self.scheduler = None
 
         # whether we should send commands
         self.__send_commands = False
@@ -52,18 +56,33 @@ class AbstractAgent(object):
         # Goal position depends on the side
         self.goal_pos = None
 
-        # Local time to identify new cycles
-        self.current_time=0
+        # whether the current think step is the first one of a new cycle
+        self.new_cycle = False
+        # wall clock time the current cycle started at
+        self.current_time = 0
         # count the number of cycles
         self.local_time = 0
 
-
-
-    def connect(self, host, port, teamname, version=15.1):
+    def connect(self, host, port, teamname, version=15.1, threaded=True,
+                think_deadline=None, compression=0):
         """
         Gives us a connection to the server as one player on a team.  This
         immediately connects the agent to the server and starts receiving and
         parsing the information it sends.
+
+        act_in_new_cycle runs once per server cycle, as soon as a message of
+        that cycle arrives.  If think_deadline is given (in seconds), it waits
+        for the see message of the cycle instead, but no longer than the
+        deadline after the cycle started.  If the server runs in synch mode,
+        it runs once per think message instead, and answers it with (done).
+
+        If compression is given (1 to 9), the server is asked to send its
+        messages compressed with zlib at that level.
+
+        If threaded is False, the agent doesn't start any thread.  Whoever
+        runs it (see runtime.AgentRuntime) must call receive_messages when its
+        socket has data, and think_step after that and by the time given by
+        scheduler.next_wakeup.
         """
 
         # if already connected, raise an error since user may have wanted to
@@ -84,15 +103,20 @@ class AbstractAgent(object):
         # handles all messages received from the server
         self.msg_handler = MessageHandler(self.wm)
 
-        # set up our threaded message receiving system
+        self.scheduler = CycleScheduler(think_deadline)
+
+        self.__threaded = threaded
         self.__parsing = True  # tell thread that we're currently running
-        self._msg_thread = threading.Thread(target=self.__message_loop,
-                                             name="message_loop")
-        self._msg_thread.daemon = True  # dies when parent thread dies
 
-        # start processing received messages. this will catch the initial server
-        # response and all subsequent communication.
-        self._msg_thread.start()
+        # set up our threaded message receiving system
+        if threaded:
+            self._msg_thread = threading.Thread(target=self.__message_loop,
+                                                 name="message_loop")
+            self._msg_thread.daemon = True  # dies when parent thread dies
+
+            # start processing received messages. this will catch the initial
+            # server response and all subsequent communication.
+            self._msg_thread.start()
 
         # send the init message and allow the message handler to handle further
         # responses.
@@ -105,14 +129,22 @@ class AbstractAgent(object):
         # wait until the socket receives a response from the server and gets its
         # assigned port.
         while self.__sock.address == init_address:
-            time.sleep(0.0001)
+            if threaded:
+                time.sleep(0.0001)
+            else:
+                self.__handle_messages([self.__sock.recv_buffer()])
+
+        # everything but the init messages can go compressed
+        if compression:
+            self.wm.ah.compression(compression)
 
         # create our thinking thread.  this will perform the actions necessary
         # to play a game of robo-soccer.
         self.__thinking = False
-        self._think_thread = threading.Thread(target=self.__think_loop,
-                                               name="think_loop")
-        self._think_thread.daemon = True
+        if threaded:
+            self._think_thread = threading.Thread(target=self.__think_loop,
+                                                   name="think_loop")
+            self._think_thread.daemon = True
 
         # set connected state.  done last to prevent state inconsistency if
         # something goes wrong beforehand.
@@ -142,15 +174,21 @@ class AbstractAgent(object):
 
         # tell the thread that it should be running, then start it
         self.__thinking = True
-        self.__should_think_on_data = True
 
         # initialization
         self.initialization()
         # start thinking
-        self._think_thread.start()
+        if self.__threaded:
+            self._think_thread.start()
 
         return self
 
+    def fileno(self):
+        """
+        The file descriptor of the socket connected to the server.
+        """
+        return self.__sock.fileno()
+
     def disconnect(self):
         """
         Tell the loop threads to stop and signal the server that we're
@@ -173,6 +211,7 @@ class AbstractAgent(object):
         # tell the loops to terminate
         self.__parsing = False
         self.__thinking = False
+        self.scheduler.stop()
 
         # tell the server that we're quitting
         self.__sock.send(BYE_MESSAGE)
@@ -180,10 +219,10 @@ class AbstractAgent(object):
         # tell our threads to join, but only wait briefly for them to do so.
         # don't join them if they haven't been started (this can happen if
         # disconnect is called very quickly after connect).
-        if self._msg_thread.is_alive():
+        if self._msg_thread is not None and self._msg_thread.is_alive():
             self._msg_thread.join(0.01)
 
-        if self._think_thread.is_alive():
+        if self._think_thread is not None and self._think_thread.is_alive():
             self._think_thread.join(0.01)
 
         # reset all standard variables in this object.  self.__connected gets
@@ -204,17 +243,56 @@ class AbstractAgent(object):
         while self.__parsing:
             # receive message data from the server and pass it along to the
             # world model as-is.  the world model parses it and stores it within
-            # itself for perusal at our leisure.
-            raw_msg = self.__sock.recv()
-            msg_type = self.msg_handler.handle_message(raw_msg)
+            # itself for perusal at our leisure.  the data is never copied, the
+            # message handler reads it straight from the socket's buffers.
+            self.__handle_messages([self.__sock.recv_buffer()])
+
+    def receive_messages(self):
+        """
+        Handles the messages waiting on the socket, without blocking.  Used
+        instead of the message loop when the agent isn't threaded.  Returns
+        whether there was anything to handle.
+        """
+        raw_msg = self.__sock.recv_buffer(block=False)
+        if raw_msg is None:
+            return False
+
+        self.__handle_messages([raw_msg])
+        return True
+
+    def __handle_messages(self, raw_msgs):
+        """
+        Handles the given messages, and all the others already waiting.
+        """
+
+        # if we fell behind, more messages are already waiting.  take them
+        # all, as many as the socket's buffers can hold at once, so the
+        # handler can skip those made out of date by newer ones.
+        while len(raw_msgs) < self.__sock.ring_size:
+            raw_msg = self.__sock.recv_buffer(block=False)
+            if raw_msg is None:
+                break
+            raw_msgs.append(raw_msg)
+
+        for msg_type in self.msg_handler.handle_messages(raw_msgs):
+            sim_time = None
 
             # we send commands all at once every cycle, ie. whenever a
             # 'sense_body' command is received
             if msg_type == ActionCommunicator.CommandType.SENSE_BODY:
                 self.__send_commands = True
-
-            # flag new data as needing the think loop's attention
-            self.__should_think_on_data = True
+                sim_time = self.wm.sense_body_time
+            elif msg_type in ("see", "see_global"):
+                sim_time = self.wm.sim_time
+            elif msg_type == ActionCommunicator.CommandType.THINK:
+                sim_time = self.wm.sense_body_time
+            elif msg_type == "server_param":
+                # know we're in synch mode before the first think arrives
+                if self.wm.server_parameters.synch_mode:
+                    self.scheduler.synch = True
+
+            # wake up the think loop, telling it which cycle this belongs to
+            self.scheduler.on_message(msg_type, sim_time)
 
     def __think_loop(self):
         """
@@ -226,50 +304,59 @@ class AbstractAgent(object):
         """
 
         while self.__thinking:
-            # tell the ActionHandler to send its enqueue messages if it is time
-            if self.__send_commands:
-                self.__send_commands = False
-                self.wm.ah.send_commands()
+            # sleep until there is new data or a new cycle to act in
+            new_data, new_cycle = self.scheduler.wait()
+            if self.__thinking:
+                self.__step(new_data, new_cycle)
+
+    def think_step(self):
+        """
+        A single iteration of the think loop.  Used instead of the think loop
+        when the agent isn't threaded.  Does nothing if there is neither new
+        data nor a new cycle.
+        """
 
-            # DEPRECATED
+        new_data, new_cycle = self.scheduler.poll()
+        self.__step(new_data, new_cycle)
+
+    def __step(self, new_data, new_cycle):
+        """
+        Thinks about new data, and acts if a new cycle began.
+        """
+
+        # DEPRECATED
+        if new_data:
             self.think()
 
-            new_time = time.time()
-            self.new_cycle = new_time - self.current_time > 0.09
-            if self.new_cycle:
-                self.current_time = new_time
-                self.local_time += 1
-
-                self.act_in_new_cycle()
-
-
-
-
-            time.sleep(0.001)
-            # # only think if new data has arrived
-            # if self.__should_think_on_data:
-            #     # flag that data has been processed.  this shouldn't be a race
-            #     # condition, since the only change would be to make it True
-            #     # before changing it to False again, and we're already going to
-            #     # process data, so it doesn't make any difference.
-            #     self.__should_think_on_data = False
-            #
-            #
-            #     # DEBUG:  tells us if a thread dies
-            #     if not self._think_thread.is_alive() or not self._msg_thread.is_alive():
-            #         raise Exception("A thread died.")
-            #
-            #     # performs the actions necessary for the agent to play soccer
-            #     self.think()
-            # else:
-            #     # prevent from burning up all the cpu time while waiting for data
-            #     time.sleep(0.0001)
+        self.new_cycle = new_cycle
+        if new_cycle:
+            self.current_time = time.time()
+            self.local_time += 1
+            self.wm.ah.new_cycle()
+
+            self.act_in_new_cycle()
+
+            # send what we decided right away, rather than a cycle late
+            self.__send_commands = True
+
+        # tell the ActionHandler to send its enqueue messages if it is time
+        if self.__send_commands:
+            self.__send_commands = False
+            self.wm.ah.send_commands()
+
+        # in synch mode, the server waits for us to finish the cycle
+        if new_cycle and self.scheduler.synch:
+            self.wm.ah.done()
 
     def think(self):
         """
         DEPRECATED
         This method must be overwritten by the Player
 
+        It must not block (no sleeping, no waiting on input): an agent driven
+        by a runtime.AgentRuntime shares its thread with every other agent of
+        the process, and all of them would wait.  The same goes for
+        act_in_new_cycle.
         """
         pass
 
@@ -282,6 +369,6 @@ class AbstractAgent(object):
 
     def act_in_new_cycle(self):
         """
-        This method is called each new cycle
+        This method is called each new cycle.  Must not block, see think.
         """
         pass
\ No newline at end of file
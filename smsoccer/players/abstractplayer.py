@@ -1,5 +1,8 @@
+import numpy as np
+
 from smsoccer.players.abstractagent import AbstractAgent
 from smsoccer.util.geometric import euclidean_distance, angle_between_points
+from smsoccer.util.memo import per_generation
 from smsoccer.world.world_model import PlayModes, WorldModel
 
 
@@ -23,7 +26,8 @@ class AbstractPlayer(AbstractAgent):
     def dash(self, val):
         self.wm.ah.dash(val)
         if self.wm.filter_robot_loc:
-            self.wm.pf.dash_particles(val)
+            self.wm.pf.dash_particles(val, self.wm.server_parameters.dash_power_rate,
+                                      self.wm.effort or 1.0)
             self.wm.moved = True
 
 
@@ -44,26 +48,25 @@ class AbstractPlayer(AbstractAgent):
         if self.wm.neck_direction is not None:
             self.wm.ah.turn_neck(self.neck_direction * -1)
 
+    @per_generation
     def get_nearest_teammate_to_point(self, point):
         """
-        Returns the uniform number of the fastest teammate to some point.
+        Returns the seen teammate nearest to some point, None if we see no
+        teammate at a known distance or don't know where we are.
         """
 
-        # holds tuples of (player dist to point, player)
-        distances = []
-        for p in self.wm.players:
-            # skip enemy and unknown players
-            if self.wm.p.side != self.wm.side:
-                continue
-
-            # find their absolute position
-            p_coords = self.wm.get_object_absolute_coords(p)
+        # where every teammate seen is, NaN for everyone else
+        coords = self.wm.get_seen_absolute_coords("players", team=True)
+        if coords is None or len(coords) == 0:
+            return None
 
-            distances.append((euclidean_distance(point, p_coords), p))
+        distances = np.hypot(coords[:, 0] - point[0], coords[:, 1] - point[1])
+        distances[np.isnan(distances)] = np.inf
 
-        # return the nearest known teammate to the given point
-        nearest = min(distances)[1]
-        return nearest
+        nearest = distances.argmin()
+        if np.isinf(distances[nearest]):
+            return None
+        return self.wm.players[nearest]
 
     def get_stamina(self):
         """
@@ -1,5 +1,4 @@
 import sys
-import time
 from smsoccer.players.abstractagent import AbstractAgent
 from smsoccer.players.abstractplayer import AbstractPlayer
 from smsoccer.strategy.formation import player_position
@@ -60,8 +59,6 @@ class DemoSquare(AbstractPlayer):
         if not self.in_kick_off_formation:
             position_point = player_position(self.wm.uniform_number)
             # Teleport to right position
-
-            time.sleep(0.1)
             self.teleport_to_point(position_point)
 
             # turns to attack field
@@ -0,0 +1,213 @@
+import errno
+import multiprocessing as mp
+import os
+import resource
+import select
+import signal
+import time
+
+from smsoccer.localization.filter.batchfilter import BatchParticleFilter
+
+# longest time the loop waits, in seconds, when no agent needs to act, so
+# that it notices it was stopped.
+IDLE_TIMEOUT = 1.0
+
+
+class AgentRuntime(object):
+    """
+    Hosts many agents in a single process and thread.  Instead of two threads
+    per agent polling with sleeps, one loop waits on all the agents' sockets
+    at once (with epoll where available, select otherwise), hands each agent
+    the messages it got, and runs their think steps.  Between cycles the loop
+    sleeps until some agent gets data or reaches its think deadline.
+
+    With batch_localization, the agents' particle filters are replaced by
+    views into a single BatchParticleFilter, which runs the particle filters
+    of all the agents that got data at once, before they think.
+
+    Agents must be connected with threaded=False before being added.
+    """
+
+    def __init__(self, idle_timeout=IDLE_TIMEOUT, batch_localization=False):
+        self.idle_timeout = idle_timeout
+
+        # the particle filters of all the agents, if run together
+        self.localization = BatchParticleFilter() if batch_localization else None
+
+        self.agents = []
+
+        # the agent owning each socket we wait on
+        self._agents_by_fd = {}
+        self._epoll = select.epoll() if hasattr(select, "epoll") else None
+
+        self.running = False
+
+        # number of loop iterations, and process cpu time and wall time spent
+        # in run.
+        self.loop_count = 0
+        self.cpu_time = 0.0
+        self.wall_time = 0.0
+
+    def add(self, agent):
+        """
+        Adds a connected agent, which will be driven by this runtime.
+        """
+
+        fd = agent.fileno()
+
+        self.agents.append(agent)
+        self._agents_by_fd[fd] = agent
+
+        # the agent goes on from what its own filter knew so far
+        if self.localization is not None and agent.wm.filter_robot_loc:
+            agent.wm.pf = self.localization.add(agent.wm.pf)
+
+        if self._epoll is not None:
+            self._epoll.register(fd, select.EPOLLIN)
+
+    def _wait(self, timeout):
+        """
+        Waits until some sockets have data or the timeout (in seconds) runs
+        out.  Returns the agents that got data.
+        """
+
+        try:
+            if self._epoll is not None:
+                events = self._epoll.poll(timeout)
+                return [self._agents_by_fd[fd] for fd, event in events]
+
+            ready, _, _ = select.select(list(self._agents_by_fd), [], [],
+                                        timeout)
+            return [self._agents_by_fd[fd] for fd in ready]
+        except (IOError, select.error) as e:
+            # a signal (eg. the one stopping us) interrupted the wait
+            if e.args[0] == errno.EINTR:
+                return []
+            raise
+
+    def _next_wakeup(self):
+        """
+        The earliest time some agent must act without waiting for data, or
+        None.
+        """
+
+        wakeups = [agent.scheduler.next_wakeup() for agent in self.agents]
+        wakeups = [t for t in wakeups if t is not None]
+
+        return min(wakeups) if wakeups else None
+
+    def run(self):
+        """
+        Runs all the agents until stop is called.
+        """
+
+        self.running = True
+
+        start_cpu = sum(os.times()[:2])
+        start_wall = time.time()
+
+        while self.running:
+            timeout = self.idle_timeout
+            wakeup = self._next_wakeup()
+            if wakeup is not None:
+                timeout = min(timeout, max(0.0, wakeup - time.time()))
+
+            # new data gets handled right away
+            ready = [agent for agent in self._wait(timeout)
+                     if agent.receive_messages()]
+
+            # the particle filters of everyone who got data go at once
+            if self.localization is not None:
+                self.localization.step()
+
+            # then thought about
+            for agent in ready:
+                agent.think_step()
+
+            # agents which reached their deadline act without their see
+            now = time.time()
+            for agent in self.agents:
+                wakeup = agent.scheduler.next_wakeup()
+                if wakeup is not None and wakeup <= now:
+                    agent.think_step()
+
+            self.loop_count += 1
+
+        self.cpu_time += sum(os.times()[:2]) - start_cpu
+        self.wall_time += time.time() - start_wall
+
+    def stop(self):
+        """
+        Makes run return after the current iteration.
+        """
+        self.running = False
+
+    def report(self):
+        """
+        Returns a summary of the resources used by this process.  The cpu time
+        per cycle is measured against the number of server cycles the agents
+        went through.
+        """
+
+        cycles = max([agent.local_time for agent in self.agents] or [0])
+
+        return {
+            "agents": len(self.agents),
+            "cycles": cycles,
+            "cpu_time": self.cpu_time,
+            "wall_time": self.wall_time,
+            "cpu_per_cycle": self.cpu_time / cycles if cycles else None,
+            # in kilobytes on linux
+            "max_rss": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        }
+
+
+def run_shard(agent_specs):
+    """
+    Connects and runs the given agents in the current process until it gets
+    terminated.  Each spec is a tuple (factory, host, port, team_name), where
+    factory is a callable returning a new agent.  The particle filters of
+    the agents run as one batch, unless there is a single agent, which a
+    batch only slows down (see the benchmark in batchfilter).
+    """
+
+    runtime = AgentRuntime(batch_localization=len(agent_specs) > 1)
+
+    for factory, host, port, team_name in agent_specs:
+        agent = factory()
+        agent.connect(host, port, team_name, threaded=False)
+        runtime.add(agent)
+
+    for agent in runtime.agents:
+        agent.play()
+
+    # terminating the process stops the loop, so we can report what it used
+    signal.signal(signal.SIGTERM, lambda signum, frame: runtime.stop())
+
+    try:
+        runtime.run()
+    except KeyboardInterrupt:
+        pass
+
+    print "pid %d: %s" % (os.getpid(), runtime.report())
+
+
+def spawn_shards(agent_specs, num_workers):
+    """
+    Spreads the agents over num_workers processes, each of them running its
+    share with an AgentRuntime.  Returns the started processes.
+    """
+
+    shards = [agent_specs[i::num_workers] for i in xrange(num_workers)]
+
+    processes = []
+    for shard in shards:
+        if not shard:
+            continue
+
+        p = mp.Process(target=run_shard, args=(shard,))
+        p.daemon = True
+        p.start()
+        processes.append(p)
+
+    return processes
@@ -0,0 +1,156 @@
+import threading
+import time
+
+# message types that carry the simulation cycle they were sent in
+SENSE_BODY = "sense_body"
+SEE_TYPES = ("see", "see_global")
+
+# sent by the server in synch mode, once all the cycle's sensor messages went
+THINK = "think"
+
+
+class CycleScheduler(object):
+    """
+    Decides when an agent thinks, based on the messages it receives instead of
+    the wall clock.
+
+    The agent thinks whenever new data arrives, and acts exactly once per
+    server cycle.  A cycle starts with the first message carrying its
+    simulation time, or with a sense_body of the same time as the last one:
+    the server's clock stands still before kick off and in some stoppages,
+    but it keeps sending a sense_body every cycle.  Without a deadline the
+    agent acts right away; with a deadline, it waits for the see message of
+    that cycle, but no longer than 'deadline' seconds after the cycle
+    started.
+
+    Once a think message arrives the server is in synch mode: the agent then
+    acts once per think message, and nothing else starts a cycle.
+
+    The message side calls on_message, the think side either blocks in wait
+    (threaded agents) or calls poll (agents driven by a runtime).
+    """
+
+    def __init__(self, deadline=None):
+        self.deadline = deadline
+
+        self._cond = threading.Condition()
+        self.running = True
+
+        # whether data arrived since the last wait/poll
+        self._new_data = False
+
+        # the newest cycle, as (simulation time, number of cycles before it
+        # with that same time), when it started, and whether its sense_body
+        # and see arrived
+        self._cycle = (-1, 0)
+        self._cycle_start = None
+        self._body = False
+        self._seen = False
+
+        # the last cycle the agent acted in
+        self._acted = self._cycle
+
+        # whether the server runs in synch mode, the number of think messages
+        # received, and the number of them the agent acted on.
+        self.synch = False
+        self._think_count = 0
+        self._acted_think_count = 0
+
+    def on_message(self, msg_type, sim_time=None):
+        """
+        Tells the scheduler a message of the given type was handled.  sim_time
+        is the simulation cycle it carried, if any.
+        """
+        with self._cond:
+            self._new_data = True
+
+            if sim_time is not None:
+                cycle_time, stopped = self._cycle
+                if sim_time > cycle_time:
+                    self._start_cycle((sim_time, 0))
+                elif sim_time == cycle_time and msg_type == SENSE_BODY and self._body:
+                    # a second sense_body at the same time: the clock stands
+                    # still, yet this is a new cycle
+                    self._start_cycle((sim_time, stopped + 1))
+
+                if sim_time == self._cycle[0]:
+                    if msg_type == SENSE_BODY:
+                        self._body = True
+                    elif msg_type in SEE_TYPES:
+                        self._seen = True
+
+            if msg_type == THINK:
+                self.synch = True
+                self._think_count += 1
+
+            self._cond.notify()
+
+    def _start_cycle(self, cycle):
+        self._cycle = cycle
+        self._cycle_start = time.time()
+        self._body = False
+        self._seen = False
+
+    def stop(self):
+        """
+        Wakes up and releases anyone waiting.
+        """
+        with self._cond:
+            self.running = False
+            self._cond.notify_all()
+
+    def next_wakeup(self):
+        """
+        The time at which the agent must act even without any new message, or
+        None if there isn't one.
+        """
+        if self.synch or self._cycle == self._acted or self.deadline is None:
+            return None
+        return self._cycle_start + self.deadline
+
+    def _act_due(self, now):
+        if self.synch:
+            return self._think_count > self._acted_think_count
+        if self._cycle == self._acted:
+            return False
+        if self.deadline is None or self._seen:
+            return True
+        return now - self._cycle_start >= self.deadline
+
+    def poll(self):
+        """
+        Returns a tuple (new_data, new_cycle) telling whether new data arrived
+        since the last call, and whether the agent should act for a new cycle
+        now.  Never blocks.
+        """
+        with self._cond:
+            return self._take(time.time())
+
+    def wait(self):
+        """
+        Like poll, but blocks until there is something to do or stop is
+        called.
+        """
+        with self._cond:
+            while self.running:
+                now = time.time()
+                if self._new_data or self._act_due(now):
+                    break
+
+                # only use a timeout when we must: timed waits poll in
+                # python 2, untimed ones just block.
+                wakeup = self.next_wakeup()
+                self._cond.wait(None if wakeup is None else wakeup - now)
+
+            return self._take(time.time())
+
+    def _take(self, now):
+        new_data = self._new_data
+        self._new_data = False
+
+        new_cycle = self._act_due(now)
+        if new_cycle:
+            self._acted = self._cycle
+            self._acted_think_count = self._think_count
+
+        return new_data, new_cycle
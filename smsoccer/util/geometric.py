@@ -6,6 +6,14 @@ _cuts = lambda angle1: angle1 + 360 if angle1 < -180 else angle1
 cut_angle = lambda angle1: angle1 - 360 if angle1 > 180 else _cuts(angle1)
 
 
+def wrap_angle(angle):
+    """
+    Wraps an angle in degrees, however far off, into [-180, 180).  Works on
+    numpy arrays of angles as well.
+    """
+    return (angle + 180) % 360 - 180
+
+
 def euclidean_distance(point1, point2):
     """
     Returns the Euclidean distance between two points on a plane.
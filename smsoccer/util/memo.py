@@ -0,0 +1,142 @@
+import functools
+
+_MISSING = object()
+
+
+class GenerationCache(object):
+    """
+    Results of queries on a world model, valid for one generation of it: the
+    world model starts a new generation whenever what it knows changes (a see
+    or sense_body message, a referee call...), which forgets them all.
+
+    Counts hits and misses for every method cached, see per_generation.
+    """
+
+    def __init__(self):
+        self.generation = 0
+
+        # results of the current generation, by (method, args).  a new dict
+        # each generation, so a result computed from the previous one while
+        # it ended lands in a dict that is already forgotten.
+        self.results = {}
+
+        # method name -> [hits, misses]
+        self.stats = {}
+
+    def bump(self):
+        """
+        Starts a new generation, forgetting every result.
+        """
+        self.generation += 1
+        self.results = {}
+
+    def hit_rate(self):
+        """
+        Fraction of the calls answered from the cache, over all methods.
+        """
+        hits = sum(h for h, m in self.stats.values())
+        calls = sum(h + m for h, m in self.stats.values())
+        return float(hits) / calls if calls else 0.0
+
+    def report(self):
+        """
+        The hits and misses of every method, a line each, most called first.
+        """
+        lines = []
+        for name, (hits, misses) in sorted(self.stats.items(), key=lambda s: -sum(s[1])):
+            lines.append("%-32s %8d hits %8d misses (%.0f%%)" %
+                         (name, hits, misses, 100.0 * hits / (hits + misses)))
+        return "\n".join(lines)
+
+
+def per_generation(method):
+    """
+    Decorates a method of a world model, or of an agent whose world model is
+    'wm', to compute its result once per generation of the world model (see
+    GenerationCache) and answer any later call with the same arguments from
+    the cache.
+
+    Only for methods whose result depends on nothing but the world model and
+    their arguments, which must be hashable; calls with unhashable or keyword
+    arguments aren't cached.  The cached result is shared by every caller, so
+    it must not be modified.
+    """
+    name = method.__name__
+
+    @functools.wraps(method)
+    def cached(self, *args, **kwargs):
+        cache = getattr(self, "wm", self).cache
+        if kwargs:
+            return method(self, *args, **kwargs)
+
+        results = cache.results
+        key = (method, args)
+        try:
+            value = results.get(key, _MISSING)
+        except TypeError:
+            return method(self, *args)
+
+        stats = cache.stats.get(name)
+        if stats is None:
+            stats = cache.stats[name] = [0, 0]
+
+        if value is _MISSING:
+            stats[1] += 1
+            value = results[key] = method(self, *args)
+        else:
+            stats[0] += 1
+
+        return value
+
+    # for whoever needs it computed regardless
+    cached.uncached = method
+
+    return cached
+
+
+if __name__ == "__main__":
+    import timeit
+
+    import numpy as np
+
+    from smsoccer.players.abstractplayer import AbstractPlayer
+    from smsoccer.world import game_object
+    from smsoccer.world.world_model import WorldModel
+
+    # an agent thinking many times between two messages, asking the same
+    # things each time: every cached method, computed and from the cache
+    wm = WorldModel(None, filter_robot_loc=False)
+    wm.side = WorldModel.SIDE_L
+
+    np.random.seed(0)
+    players = [game_object.Player(np.random.uniform(1, 50), np.random.uniform(-45, 45),
+                                  0, 0, None, "team", WorldModel.SIDE_L if i % 2 else
+                                  WorldModel.SIDE_R, i // 2 + 1, 0, 0) for i in range(22)]
+    ball = game_object.Ball(0.5, 10.0, 0, 0, None)
+    wm.process_new_info(ball, [], [], players, [], 0)
+    wm.abs_coords, wm.abs_neck_dir = (-10.0, 5.0), 30.0
+
+    player = AbstractPlayer()
+    player.wm = wm
+
+    # the cheap predicates are best left alone: the cache costs about a
+    # microsecond a call
+    calls = [(wm, WorldModel.is_ball_in_defense, ()),
+             (wm, WorldModel.is_dead_ball_them, ()),
+             (wm, WorldModel.is_ball_kickable, ()),
+             (wm, WorldModel.is_kick_off_us, ()),
+             (player, AbstractPlayer.get_nearest_teammate_to_point, ((20.0, -10.0),))]
+
+    for obj, method, args in calls:
+        # those that didn't opt in are wrapped here, to see what they'd gain
+        opted_in = hasattr(method, "uncached")
+        plain = method.uncached if opted_in else method.__func__
+        cached = method if opted_in else per_generation(plain)
+
+        t_plain = timeit.timeit(lambda: plain(obj, *args), number=10000) / 10000
+        t_cached = timeit.timeit(lambda: cached(obj, *args), number=10000) / 10000
+        print "%-30s computed %5.2f us, cached %5.2f us%s" % (
+            plain.__name__, t_plain * 1e6, t_cached * 1e6, "" if opted_in else " (not cached)")
+
+    print
+    print wm.cache.report()
@@ -0,0 +1,314 @@
+import math
+
+from smsoccer.world.parameters import ServerParameters
+
+# std of the ball's position as seen, relative to its distance and at the
+# least, in meters: the server quantizes distances in steps of 10% of their
+# log, and directions to a degree
+RELATIVE_POSITION_NOISE = 0.025
+MIN_POSITION_NOISE = 0.05
+
+# std of its velocity as seen, from dist_change and dir_change, likewise
+RELATIVE_VELOCITY_NOISE = 0.01
+MIN_VELOCITY_NOISE = 0.02
+
+# std of the changes of velocity the server's noise doesn't account for
+# (bounces, tackles), per cycle
+PROCESS_NOISE = 0.02
+
+# an observation this far off the estimate (squared Mahalanobis distance, 2
+# degrees of freedom) means the ball was kicked or moved by the referee: the
+# filter starts over from it
+GATE = 16.0
+
+
+def seen_ball(ball, position, neck_direction, velocity=None, pose_cov=None):
+    """
+    What a see message tells about the ball, in field coordinates.
+    :param ball: the Ball seen, with a distance.
+    :param position: where we are, (x, y).
+    :param neck_direction: our absolute neck direction, in degrees.
+    :param velocity: our own velocity, (vx, vy), if known.  The ball's
+    velocity is only seen relative to ours.
+    :param pose_cov: covariance of our position and neck direction, see
+    WorldModel.abs_pose_cov, added to the noise of the ball's position.
+    :return: (position, variance, velocity, velocity variance) as taken by
+    BallTracker.observe, the velocity and its variance None unless the
+    ball's dist_change and dir_change were seen.
+    """
+    d = ball.distance
+    rad = math.radians(neck_direction + ball.direction)
+    ex, ey = math.cos(rad), math.sin(rad)
+
+    ball_position = (position[0] + d * ex, position[1] + d * ey)
+    variance = (RELATIVE_POSITION_NOISE * d + MIN_POSITION_NOISE) ** 2
+    if pose_cov is not None:
+        # our own position, and our neck direction turning the ball about
+        # us, spread over both axes
+        variance += float(pose_cov[0][0] + pose_cov[1][1] +
+                          pose_cov[2][2] * math.radians(d) ** 2) / 2
+
+    if ball.dist_change is None or ball.dir_change is None or velocity is None:
+        return ball_position, variance, None, None
+
+    # the relative velocity, along the line to the ball and across it, as
+    # the server works out dist_change and dir_change
+    across = math.radians(ball.dir_change) * d
+    ball_velocity = (velocity[0] + ball.dist_change * ex - across * ey,
+                     velocity[1] + ball.dist_change * ey + across * ex)
+    velocity_variance = (RELATIVE_VELOCITY_NOISE * d + MIN_VELOCITY_NOISE) ** 2
+
+    return ball_position, variance, ball_velocity, velocity_variance
+
+
+class BallTracker(object):
+    """
+    Follows the ball in field coordinates with a Kalman filter, moving it as
+    the server does: every cycle the ball moves by its velocity, which then
+    decays by ball_decay.  Keeps going while the ball is out of view.
+
+    The noise is taken to be the same along x and y, so both axes share one
+    covariance of (position, velocity), and everything is done on python
+    numbers.
+    """
+
+    def __init__(self, decay=ServerParameters().ball_decay, rand=ServerParameters().ball_rand):
+        # the server's ball_decay and ball_rand
+        self.decay = decay
+        self.rand = rand
+
+        # the estimate at cycle 'time', None until the ball is first seen
+        self.time = None
+        self.position = None
+        self.velocity = None
+
+        # variance of the position and of the velocity along each axis, and
+        # their covariance
+        self.position_var = 0.0
+        self.velocity_var = 0.0
+        self.cov = 0.0
+
+        # cycle the ball was last seen at
+        self.last_seen = None
+
+    def reset(self, time, position, variance, velocity=None, velocity_variance=None):
+        """
+        Starts over from an observation, standing still with the largest
+        speed's uncertainty if no velocity was seen.
+        """
+        self.time = time
+        self.position = position
+        self.position_var = variance
+        self.cov = 0.0
+        if velocity is None:
+            self.velocity = (0.0, 0.0)
+            self.velocity_var = ServerParameters().ball_speed_max ** 2
+        else:
+            self.velocity = velocity
+            self.velocity_var = velocity_variance
+
+    def predict_to(self, time):
+        """
+        Moves the estimate forward to the given cycle.
+        """
+        if self.time is None or time <= self.time:
+            return
+
+        d = self.decay
+        (x, y), (vx, vy) = self.position, self.velocity
+        pp, pv, vv = self.position_var, self.cov, self.velocity_var
+
+        for i in xrange(time - self.time):
+            # the server's noise on the velocity is uniform, up to ball_rand
+            # times the speed on each axis
+            q = self.rand ** 2 * (vx * vx + vy * vy) / 3 + PROCESS_NOISE ** 2
+
+            x, y = x + vx, y + vy
+            vx, vy = vx * d, vy * d
+            pp, pv, vv = pp + 2 * pv + vv, d * (pv + vv), d * d * vv + q
+
+        self.position, self.velocity = (x, y), (vx, vy)
+        self.position_var, self.cov, self.velocity_var = pp, pv, vv
+        self.time = time
+
+    def observe(self, time, position, variance, velocity=None, velocity_variance=None):
+        """
+        Corrects the estimate with what was seen at the given cycle, see
+        seen_ball.  Starts over if it's too far off what was expected.
+        """
+        if self.time is None:
+            self.reset(time, position, variance, velocity, velocity_variance)
+            self.last_seen = time
+            return
+
+        self.predict_to(time)
+        self.last_seen = time
+
+        (x, y), (vx, vy) = self.position, self.velocity
+        pp, pv, vv = self.position_var, self.cov, self.velocity_var
+
+        # the position: the innovation, and its variance
+        ix, iy = position[0] - x, position[1] - y
+        s = pp + variance
+        if (ix * ix + iy * iy) / s > GATE:
+            self.reset(time, position, variance, velocity, velocity_variance)
+            return
+
+        kp, kv = pp / s, pv / s
+        x, y = x + kp * ix, y + kp * iy
+        vx, vy = vx + kv * ix, vy + kv * iy
+        pp, pv, vv = pp - kp * pp, pv - kp * pv, vv - kv * pv
+
+        # then the velocity, the noise of both being independent
+        if velocity is not None:
+            ix, iy = velocity[0] - vx, velocity[1] - vy
+            s = vv + velocity_variance
+            if (ix * ix + iy * iy) / s > GATE:
+                # kicked: where it is holds, how it moves starts over
+                vx, vy = velocity
+                pv, vv = 0.0, velocity_variance
+            else:
+                kp, kv = pv / s, vv / s
+                x, y = x + kp * ix, y + kp * iy
+                vx, vy = vx + kv * ix, vy + kv * iy
+                pp, pv, vv = pp - kp * pv, pv - kv * pv, vv - kv * vv
+
+        self.position, self.velocity = (x, y), (vx, vy)
+        self.position_var, self.cov, self.velocity_var = pp, pv, vv
+
+    def predict(self, k):
+        """
+        Where the ball will be k cycles after the estimate, and its velocity
+        then, in O(1): the velocity decays geometrically.
+        :return: ((x, y), (vx, vy)), None if the ball was never seen.
+        """
+        if self.position is None:
+            return None
+
+        d = self.decay
+        dk = d ** k
+        moved = (1 - dk) / (1 - d) if d != 1 else k
+        (x, y), (vx, vy) = self.position, self.velocity
+
+        return (x + vx * moved, y + vy * moved), (vx * dk, vy * dk)
+
+    def trajectory(self, k):
+        """
+        Where the ball will be each of the next k cycles, nearest first.
+        """
+        if self.position is None:
+            return []
+
+        (x, y), (vx, vy) = self.position, self.velocity
+        d = self.decay
+
+        positions = []
+        for i in xrange(k):
+            x, y = x + vx, y + vy
+            vx, vy = vx * d, vy * d
+            positions.append((x, y))
+        return positions
+
+    def stop_position(self):
+        """
+        Where the ball will stop if nothing touches it.
+        """
+        if self.position is None:
+            return None
+
+        (x, y), (vx, vy) = self.position, self.velocity
+        moved = 1 / (1 - self.decay)
+        return x + vx * moved, y + vy * moved
+
+    def cycles_unseen(self, time):
+        """
+        Cycles since the ball was last seen, None if it never was.
+        """
+        return None if self.last_seen is None else time - self.last_seen
+
+
+if __name__ == "__main__":
+    import random
+    import timeit
+
+    from smsoccer.world.game_object import Ball
+
+    # a ball kicked now and then across the field, seen by a player standing
+    # still at the center as the server would show it, two cycles out of
+    # three.  how far off the estimate is, against taking the last ball seen
+    # as it is, and how far off its prediction 10 cycles ahead is.
+    sp = ServerParameters()
+    random.seed(0)
+
+    def quantize(value, step):
+        return round(value / step) * step
+
+    def see(x, y, vx, vy):
+        d = math.hypot(x, y)
+        direction = math.degrees(math.atan2(y, x))
+        ex, ey = x / d, y / d
+        dist_change = vx * ex + vy * ey
+        dir_change = math.degrees((vy * ex - vx * ey) / d)
+
+        d_seen = quantize(math.exp(quantize(math.log(d), sp.quantize_step)), 0.1)
+        return Ball(d_seen, round(direction), quantize(dist_change, 0.02 * d_seen),
+                    quantize(dir_change, 0.1), None)
+
+    tracker = BallTracker(sp.ball_decay, sp.ball_rand)
+    x, y, vx, vy = 5.0, 5.0, 0.0, 0.0
+    last_seen = None
+
+    # where the ball was said to be 10 cycles ahead, by the cycle it's for,
+    # and how many times it was kicked or moved then
+    predicted, guessed = {}, {}
+    moves = 0
+    errors, naive, ahead, naive_ahead = [], [], [], []
+    t_update = 0.0
+
+    for time in xrange(3000):
+        if time % 50 == 0:
+            angle = random.uniform(0, 2 * math.pi)
+            speed = random.uniform(0.5, sp.ball_speed_max)
+            vx, vy = speed * math.cos(angle), speed * math.sin(angle)
+            moves += 1
+
+        # the server moves the ball, which the referee brings back in
+        r = sp.ball_rand * math.hypot(vx, vy)
+        x, y = x + vx, y + vy
+        vx = (vx + random.uniform(-r, r)) * sp.ball_decay
+        vy = (vy + random.uniform(-r, r)) * sp.ball_decay
+        if abs(x) > 50 or abs(y) > 30 or math.hypot(x, y) < 1:
+            x, y, vx, vy = random.uniform(-20, 20), random.uniform(-20, 20), 0.0, 0.0
+            moves += 1
+
+        start = timeit.default_timer()
+        if time % 3 != 2:
+            ball = see(x, y, vx, vy)
+            tracker.observe(time, *seen_ball(ball, (0.0, 0.0), 0.0, (0.0, 0.0)))
+            last_seen = seen_ball(ball, (0.0, 0.0), 0.0)[0]
+        else:
+            tracker.predict_to(time)
+        t_update += timeit.default_timer() - start
+
+        errors.append(math.hypot(tracker.position[0] - x, tracker.position[1] - y))
+        naive.append(math.hypot(last_seen[0] - x, last_seen[1] - y))
+
+        # only predictions the ball wasn't kicked or moved since
+        if predicted.get(time, (None, -1))[1] == moves:
+            (px, py), m = predicted[time]
+            ahead.append(math.hypot(px - x, py - y))
+            naive_ahead.append(math.hypot(guessed[time][0] - x, guessed[time][1] - y))
+        predicted[time + 10] = tracker.predict(10)[0], moves
+        guessed[time + 10] = last_seen
+
+    def mean(values):
+        return sum(values) / len(values)
+
+    print "now:             tracked %.2f m off, last seen as is %.2f m off" % (
+        mean(errors), mean(naive))
+    print "10 cycles ahead: tracked %.2f m off, last seen as is %.2f m off" % (
+        mean(ahead), mean(naive_ahead))
+    print "tracking: %.1f us/cycle" % (t_update / len(errors) * 1e6)
+
+    t = timeit.timeit(lambda: tracker.predict(10), number=100000) / 100000
+    print "predicting 10 cycles ahead: %.2f us" % (t * 1e6)
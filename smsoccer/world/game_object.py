@@ -1,10 +1,16 @@
+import collections
 
 
 class GameObject(object):
     """
     Root class for all perceivable objects in the world model.
+
+    Every see message makes dozens of these, so they have no __dict__: each
+    class lists the attributes it adds in __slots__.
     """
 
+    __slots__ = ("distance", "direction")
+
     def __init__(self, distance, direction):
         """
         All objects have a distance and direction to the player, at a minimum.
@@ -19,6 +25,17 @@ class Line(GameObject):
     Represents a line on the soccer field.
     """
 
+    # the coordinate every line_id lies at, and whether it's vertical (all
+    # its points have that x) or horizontal (that y).
+    LINE_COORDS = {
+        "l": (-52.5, True),
+        "r": (52.5, True),
+        "t": (-34, False),
+        "b": (34, False)
+    }
+
+    __slots__ = ("line_id",)
+
     def __init__(self, distance, direction, line_id):
         self.line_id = line_id
 
@@ -30,11 +47,31 @@ class Goal(GameObject):
     Represents a goal object on the field.
     """
 
+    # the on-field (x, y) coordinates of the center of each goal
+    GOAL_COORDS = {
+        "l": (-52.5, 0),
+        "r": (52.5, 0)
+    }
+
+    # all goal_ids in a fixed order, see Flag.FLAG_IDS
+    GOAL_IDS = tuple(sorted(GOAL_COORDS))
+    GOAL_INDEX = dict((goal_id, i) for i, goal_id in enumerate(GOAL_IDS))
+
+    __slots__ = ("goal_id", "landmark_id")
+
     def __init__(self, distance, direction, goal_id):
         self.goal_id = goal_id
 
+        # its integer id among all the landmarks, after the flags (see
+        # landmarks.LandmarkRegistry)
+        i = self.GOAL_INDEX.get(goal_id)
+        self.landmark_id = None if i is None else len(Flag.FLAG_IDS) + i
+
         GameObject.__init__(self, distance, direction)
 
+    def real_position(self):
+        return self.GOAL_COORDS[self.goal_id]
+
 
 class Flag(GameObject):
     """
@@ -87,9 +124,8 @@ class Flag(GameObject):
         "lb20": (-60, 20),
         "lb30": (-60, 30),
 
-        # goal flags ('t' and 'b' flags can change based on server parameter
-        # 'goal_width', but we leave their coords as the default values.
-        # TODO: make goal flag coords dynamic based on server_params
+        # goal flags ('t' and 'b' flags move with the server parameter
+        # 'goal_width', see landmarks.LandmarkRegistry.set_goal_width)
         "glt": (-52.5, -7.01),
         "gl": (-52.5, 0),
         "glb": (-52.5, 7.01),
@@ -120,6 +156,13 @@ class Flag(GameObject):
         "c": (0, 0)
     }
 
+    # all flag_ids in a fixed order, so a flag can be referred to by an
+    # integer index instead of its string id.
+    FLAG_IDS = tuple(sorted(FLAG_COORDS))
+    FLAG_INDEX = dict((flag_id, i) for i, flag_id in enumerate(FLAG_IDS))
+
+    __slots__ = ("flag_id", "landmark_id")
+
     def __init__(self, distance, direction, flag_id):
         """
         Adds a flag id for this field object.  Every flag has a unique id.
@@ -127,6 +170,9 @@ class Flag(GameObject):
 
         self.flag_id = flag_id
 
+        # its integer id among all the landmarks, its index in FLAG_IDS
+        self.landmark_id = self.FLAG_INDEX.get(flag_id)
+
         GameObject.__init__(self, distance, direction)
 
     def real_position(self):
@@ -138,6 +184,8 @@ class MobileObject(GameObject):
     Represents objects that can move.
     """
 
+    __slots__ = ("dist_change", "dir_change", "speed")
+
     def __init__(self, distance, direction, dist_change, dir_change, speed):
         """
         Adds variables for distance and direction deltas.
@@ -155,6 +203,8 @@ class Ball(MobileObject):
     A special instance of a mobile object representing the soccer ball.
     """
 
+    __slots__ = ()
+
     def __init__(self, distance, direction, dist_change, dir_change, speed):
         MobileObject.__init__(self, distance, direction, dist_change,
                               dir_change, speed)
@@ -165,6 +215,8 @@ class Player(MobileObject):
     Represents a friendly or enemy player in the game.
     """
 
+    __slots__ = ("team", "side", "uniform_number", "body_direction", "neck_direction")
+
     def __init__(self, distance, direction, dist_change, dir_change, speed,
                  team, side, uniform_number, body_direction, neck_direction):
         """
@@ -180,3 +232,63 @@ class Player(MobileObject):
         MobileObject.__init__(self, distance, direction, dist_change,
                               dir_change, speed)
 
+
+def allocate(cls, *args):
+    """
+    Makes a new game object, what ObjectPool.new does without a pool.
+    """
+    return cls(*args)
+
+
+class ObjectPool(object):
+    """
+    Free lists of game objects, one per type, so the objects of a see message
+    can be reused for the next one instead of allocated anew.
+
+    An object taken from the pool stays valid until the pool recycles it, so
+    this is for whoever knows nothing holds on to the objects of an old see
+    message: recycle is told which objects are still kept.
+    """
+
+    def __init__(self):
+        # released objects, by type
+        self._free = collections.defaultdict(list)
+
+        # the objects handed out since the last recycle
+        self.taken = []
+
+        # number of objects made anew and reused so far
+        self.allocated = 0
+        self.reused = 0
+
+    def new(self, cls, *args):
+        """
+        A cls object initialized with args, reused if one is free.
+        """
+        free = self._free[cls]
+        if free:
+            obj = free.pop()
+            obj.__init__(*args)
+            self.reused += 1
+        else:
+            obj = cls(*args)
+            self.allocated += 1
+
+        self.taken.append(obj)
+        return obj
+
+    def recycle(self, keep=()):
+        """
+        Frees every object handed out since the last call, for new to reuse.
+        :param keep: objects still in use, which are not freed yet: they stay
+        taken, for a later call to free once they are no longer kept.
+        """
+        free = self._free
+        taken = []
+        for obj in self.taken:
+            if obj in keep:
+                taken.append(obj)
+            else:
+                free[type(obj)].append(obj)
+
+        self.taken = taken
@@ -0,0 +1,134 @@
+import numpy as np
+
+from smsoccer.world import game_object
+from smsoccer.world.parameters import ServerParameters
+
+# every landmark, in the order of its integer id: the flags, in the order of
+# Flag.FLAG_IDS, then the goals.  a flag's id is its Flag.FLAG_INDEX.
+FLAG_IDS = game_object.Flag.FLAG_IDS
+GOAL_IDS = game_object.Goal.GOAL_IDS
+N_FLAGS = len(FLAG_IDS)
+
+LANDMARK_IDS = tuple(("f", f) for f in FLAG_IDS) + tuple(("g", g) for g in GOAL_IDS)
+
+# the flags on the goal posts, which move with goal_width, and the sign of
+# their y coordinate
+GOAL_POST_FLAGS = {"glt": -1, "glb": 1, "grt": -1, "grb": 1}
+
+
+def flag_id(flag):
+    """
+    Landmark id of a flag given its flag_id.
+    """
+    return game_object.Flag.FLAG_INDEX[flag]
+
+
+def goal_id(goal):
+    """
+    Landmark id of a goal given its goal_id.
+    """
+    return N_FLAGS + game_object.Goal.GOAL_INDEX[goal]
+
+
+class LandmarkRegistry(object):
+    """
+    The geometry of the flags and goals, which never move, computed once:
+    their coordinates as an (L, 2) array indexed by landmark id, and the
+    baseline between every pair of them, its length and its direction.
+
+    The only thing that can change is the width of the goals, given by the
+    server in server_param: set_goal_width then moves the goal post flags and
+    updates everything, in place, so the arrays can be held on to.
+    """
+
+    def __init__(self, goal_width=ServerParameters().goal_width):
+        self.n = len(LANDMARK_IDS)
+
+        # coordinates of every landmark
+        self.coords = np.zeros((self.n, 2))
+
+        # baselines[i, j] goes from landmark i to landmark j, norms[i, j] is
+        # its length and units[i, j] the unit vector along it (0 for i == j)
+        self.baselines = np.zeros((self.n, self.n, 2))
+        self.norms = np.zeros((self.n, self.n))
+        self.units = np.zeros((self.n, self.n, 2))
+
+        self.goal_width = None
+        self.set_goal_width(goal_width)
+
+    def set_goal_width(self, goal_width):
+        """
+        Moves the goal post flags to where goal_width puts them.  The flag
+        coordinates of game_object.Flag follow.
+        """
+        if goal_width == self.goal_width:
+            return
+        self.goal_width = goal_width
+
+        for flag, sign in GOAL_POST_FLAGS.items():
+            x = game_object.Flag.FLAG_COORDS[flag][0]
+            game_object.Flag.FLAG_COORDS[flag] = (x, sign * goal_width / 2.0)
+
+        self.coords[:N_FLAGS] = [game_object.Flag.FLAG_COORDS[f] for f in FLAG_IDS]
+        self.coords[N_FLAGS:] = [game_object.Goal.GOAL_COORDS[g] for g in GOAL_IDS]
+
+        self.baselines[...] = self.coords[np.newaxis, :, :] - self.coords[:, np.newaxis, :]
+        self.norms[...] = np.hypot(self.baselines[..., 0], self.baselines[..., 1])
+
+        # pairs of the same landmark have no direction
+        with np.errstate(divide='ignore', invalid='ignore'):
+            np.divide(self.baselines, self.norms[..., np.newaxis], self.units)
+        self.units[self.norms == 0] = 0
+
+        # the same, as python numbers, for those working on a pair at a time
+        self._coords = [tuple(c) for c in self.coords.tolist()]
+        self._norms = self.norms.tolist()
+        self._units = [[tuple(u) for u in row] for row in self.units.tolist()]
+
+    def position(self, i):
+        """
+        Coordinates of landmark i, as a tuple.
+        """
+        return self._coords[i]
+
+    def pair(self, i, j):
+        """
+        The baseline from landmark i to landmark j: its length, and the unit
+        vector along it as a tuple.
+        """
+        return self._norms[i][j], self._units[i][j]
+
+
+# the landmarks of the server we play in, shared by every agent
+REGISTRY = LandmarkRegistry()
+
+
+if __name__ == "__main__":
+    import math
+    import timeit
+
+    from smsoccer.localization.localization import vDiff, normV
+
+    # the geometry of a pair of flags, as compute_non_colinear needed it
+    r = REGISTRY
+    i, j = flag_id("tl10"), flag_id("prc")
+    a, b = FLAG_IDS[i], FLAG_IDS[j]
+
+    def by_name():
+        rf1 = game_object.Flag.FLAG_COORDS[a]
+        rf2 = game_object.Flag.FLAG_COORDS[b]
+        b_a = vDiff(rf2, rf1)
+        lb_a = math.hypot(*b_a)
+        return lb_a, normV(b_a, lb_a)
+
+    def by_id():
+        return r.pair(i, j)
+
+    # the registry must give the same baseline as the names did
+    (length, unit), (r_length, r_unit) = by_name(), by_id()
+    assert abs(length - r_length) < 1e-9
+    assert abs(unit[0] - r_unit[0]) < 1e-9 and abs(unit[1] - r_unit[1]) < 1e-9
+
+    for name, f in (("dict lookups and hypot", by_name), ("registry", by_id)):
+        t = timeit.timeit(f, number=100000) / 100000
+        print "%-22s: %.2f us per pair" % (name, t * 1e6)
@@ -0,0 +1,422 @@
+import math
+
+import numpy as np
+
+from smsoccer.world.balltracker import RELATIVE_POSITION_NOISE, MIN_POSITION_NOISE, \
+    RELATIVE_VELOCITY_NOISE, MIN_VELOCITY_NOISE
+from smsoccer.world.parameters import ServerParameters
+from smsoccer.world.seenobjects import TEAM_UNKNOWN, TEAM_OURS, TEAM_THEIRS
+
+# players per team, each with a track of its own, and tracks for the players
+# seen without a uniform number that match none of those
+TEAM_SIZE = 11
+MAX_ANONYMOUS = 22
+N_TRACKS = 2 * TEAM_SIZE + MAX_ANONYMOUS
+ANONYMOUS_TRACKS = np.arange(2 * TEAM_SIZE, N_TRACKS)
+
+# std of the changes of a player's velocity per cycle: they dash and turn as
+# they please
+PROCESS_NOISE = 0.3
+
+# an observation is only taken for a track if it is this close (squared
+# Mahalanobis distance, 2 degrees of freedom)
+GATE = 16.0
+
+# a track loses this much confidence every cycle its player isn't seen, and
+# is dropped below MIN_CONFIDENCE
+CONFIDENCE_DECAY = 0.95
+MIN_CONFIDENCE = 0.1
+
+# degrees to radians, times i
+_I_RAD = 1j * math.pi / 180
+
+
+def slot(team, number):
+    """
+    The track of a player given its team (TEAM_OURS or TEAM_THEIRS) and
+    uniform number.
+    """
+    return (team - 1) * TEAM_SIZE + number - 1
+
+
+class PlayerTracker(object):
+    """
+    Follows every player seen in field coordinates, with one Kalman filter
+    per track like BallTracker, their velocity decaying by player_decay every
+    cycle.  All the tracks live in fixed size arrays, indexed by track, and
+    a see updates all of them at once.
+
+    The first 2 * TEAM_SIZE tracks are those of our players and theirs, by
+    uniform number (see slot).  Players seen without a number are taken for
+    the nearest track that could be them, numbered or not; those that match
+    none start an anonymous track, among the last MAX_ANONYMOUS.  A numbered
+    player seen near an anonymous track ends it, it was that player.
+
+    Tracks lose confidence while unseen (see CONFIDENCE_DECAY), and are
+    dropped once it is too low.
+    """
+
+    def __init__(self, decay=ServerParameters().player_decay):
+        # the server's player_decay
+        self.decay = decay
+
+        # cycle of the estimates, None until a player is first seen
+        self.time = None
+
+        self.position = np.zeros((N_TRACKS, 2))
+        self.velocity = np.zeros((N_TRACKS, 2))
+
+        # variance of the position and of the velocity along each axis, and
+        # their covariance, as in BallTracker
+        self.position_var = np.zeros(N_TRACKS)
+        self.velocity_var = np.zeros(N_TRACKS)
+        self.cov = np.zeros(N_TRACKS)
+
+        # team of each track (TEAM_UNKNOWN until seen), uniform number (0
+        # for anonymous tracks), cycle its player was last seen at (-1 if
+        # never) and confidence, 0 for tracks that aren't
+        self.team = np.zeros(N_TRACKS, np.int8)
+        self.number = np.zeros(N_TRACKS, np.int8)
+        self.last_seen = np.full(N_TRACKS, -1, np.int64)
+        self.confidence = np.zeros(N_TRACKS)
+
+        numbers = np.arange(1, TEAM_SIZE + 1)
+        self.team[:2 * TEAM_SIZE] = [TEAM_OURS] * TEAM_SIZE + [TEAM_THEIRS] * TEAM_SIZE
+        self.number[:2 * TEAM_SIZE] = np.concatenate((numbers, numbers))
+
+    def active(self):
+        """
+        Which tracks are followed, a boolean array.
+        """
+        return self.confidence >= MIN_CONFIDENCE
+
+    def tracked(self, team=None):
+        """
+        The tracks followed, as an array of their indices.
+        :param team: TEAM_OURS or TEAM_THEIRS for only theirs, anonymous
+        tracks included if they were seen on that team.
+        """
+        active = self.active()
+        if team is not None:
+            active &= self.team == team
+        return np.flatnonzero(active)
+
+    def get(self, team, number):
+        """
+        What is known of a player: ((x, y), (vx, vy), cycle last seen,
+        confidence), None if it isn't followed.
+        """
+        i = slot(team, number)
+        if self.confidence[i] < MIN_CONFIDENCE:
+            return None
+
+        return (tuple(self.position[i]), tuple(self.velocity[i]), int(self.last_seen[i]),
+                float(self.confidence[i]))
+
+    def predict(self, k):
+        """
+        Where every track will be k cycles after the estimates, if its
+        player stops dashing, as an (N_TRACKS, 2) array.
+        """
+        d = self.decay
+        return self.position + self.velocity * ((1 - d ** k) / (1 - d))
+
+    def predict_to(self, time):
+        """
+        Moves every track forward to the given cycle.
+        """
+        if self.time is None or time is None or time <= self.time:
+            return
+
+        steps = time - self.time
+        d = self.decay
+
+        self.position += self.velocity * ((1 - d ** steps) / (1 - d))
+        self.velocity *= d ** steps
+        self.confidence *= CONFIDENCE_DECAY ** steps
+
+        pp, pv, vv = self.position_var, self.cov, self.velocity_var
+        for i in xrange(steps):
+            pp, pv, vv = pp + 2 * pv + vv, d * (pv + vv), d * d * vv + PROCESS_NOISE ** 2
+        self.position_var, self.cov, self.velocity_var = pp, pv, vv
+
+        self.time = time
+
+    def observe(self, time, seen, located, neck_direction, velocity=None, pose_cov=None):
+        """
+        Corrects the tracks with the players of a see message, all at once.
+        Those of a see_global message come in field coordinates, velocity
+        included, and as precise as the nearest player seen: our pose and
+        velocity don't matter then.
+        :param seen: the SeenObjects of the see message.
+        :param located: absolute coordinates of its players, as in
+        SeenObjects.located.
+        :param neck_direction: our absolute neck direction, in degrees.
+        :param velocity: our own velocity, (vx, vy), if known.  The players'
+        velocities are only seen relative to ours.
+        :param pose_cov: covariance of our position and neck direction, see
+        WorldModel.abs_pose_cov.
+        """
+        if self.time is None:
+            self.time = time
+        self.predict_to(time)
+
+        # only the players seen with a distance can be placed
+        rows = seen.seen("players")
+        placed = ~np.isnan(located[:, 0])
+        if not placed.all():
+            rows, located = rows[placed], located[placed]
+        if not len(rows):
+            return
+
+        if seen.is_global:
+            variance = np.full(len(rows), MIN_POSITION_NOISE ** 2)
+            seen_velocity = np.column_stack((rows["dist_change"], rows["dir_change"]))
+            velocity_variance = np.full(len(rows), MIN_VELOCITY_NOISE ** 2)
+        else:
+            d = rows["distance"]
+            variance = (RELATIVE_POSITION_NOISE * d + MIN_POSITION_NOISE) ** 2
+            if pose_cov is not None:
+                variance += (pose_cov[0][0] + pose_cov[1][1] +
+                             pose_cov[2][2] * np.radians(d) ** 2) / 2
+
+            # velocities seen, as in balltracker.seen_ball, NaN without
+            # dist_change and dir_change
+            if velocity is None:
+                seen_velocity = None
+            else:
+                e = np.exp((rows["direction"] + neck_direction) * _I_RAD)
+                v = (rows["dist_change"] + 1j * np.radians(rows["dir_change"]) * d) * e
+                v += complex(velocity[0], velocity[1])
+                seen_velocity = v.view(float).reshape(-1, 2)
+            velocity_variance = (RELATIVE_VELOCITY_NOISE * d + MIN_VELOCITY_NOISE) ** 2
+
+        tracks = self._associate(rows["team"], rows["uniform_number"], located, variance)
+        self._update(tracks, rows["team"], located, variance, seen_velocity, velocity_variance)
+
+    def _associate(self, team, number, located, variance):
+        """
+        The track of every player seen, those without a number taken for the
+        nearest track they could be, greedily, or a new anonymous one.
+        """
+        tracks = np.full(len(team), -1, np.int64)
+        numbered = (team != TEAM_UNKNOWN) & (number > 0) & (number <= TEAM_SIZE)
+        tracks[numbered] = slot(team[numbered], number[numbered])
+
+        active = self.active()
+
+        # anonymous tracks a numbered player turns out to be end
+        if numbered.any():
+            anonymous = ANONYMOUS_TRACKS[active[2 * TEAM_SIZE:]]
+            if len(anonymous):
+                cost = self._cost(team[numbered], located[numbered], variance[numbered],
+                                  anonymous)
+                ended = anonymous[(cost <= GATE).any(axis=0)]
+                self.confidence[ended] = 0
+                active[ended] = False
+
+        unnumbered = np.flatnonzero(~numbered)
+        if not len(unnumbered):
+            return tracks
+
+        # the others, with any track not seen numbered in this see
+        active[tracks[numbered]] = False
+        candidates = np.flatnonzero(active)
+        if len(candidates):
+            cost = self._cost(team[unnumbered], located[unnumbered], variance[unnumbered],
+                              candidates)
+            # only the pairs within the gate, cheapest first
+            cost = cost.ravel()
+            pairs = np.flatnonzero(cost <= GATE)
+            pairs = pairs[cost[pairs].argsort()].tolist()
+
+            n = len(candidates)
+            matched, taken = {}, set()
+            for k in pairs:
+                i, j = divmod(k, n)
+                if i not in matched and j not in taken:
+                    matched[i] = j
+                    taken.add(j)
+            if matched:
+                i, j = zip(*matched.items())
+                tracks[unnumbered[list(i)]] = candidates[list(j)]
+
+        # those left start anonymous tracks, instead of the least confident
+        # (more than there are are left out)
+        left = unnumbered[tracks[unnumbered] < 0][:MAX_ANONYMOUS]
+        if len(left):
+            new = ANONYMOUS_TRACKS[self.confidence[2 * TEAM_SIZE:].argsort()[:len(left)]]
+            tracks[left] = new
+            # whoever they followed is forgotten
+            self.confidence[new] = 0
+
+        return tracks
+
+    def _cost(self, team, located, variance, candidates):
+        """
+        Squared Mahalanobis distance of every player seen to every candidate
+        track, infinite for those on another team.
+        """
+        delta = located[:, np.newaxis, :] - self.position[candidates]
+        cost = (delta ** 2).sum(axis=2) / (variance[:, np.newaxis] +
+                                           self.position_var[candidates])
+
+        track_team = self.team[candidates]
+        team = team[:, np.newaxis]
+        cost[(team != track_team) & (team != TEAM_UNKNOWN) & (track_team != TEAM_UNKNOWN)] = np.inf
+
+        return cost
+
+    def _update(self, tracks, team, located, variance, seen_velocity, velocity_variance):
+        """
+        Kalman update of the tracks of the players seen, all at once.  Tracks
+        that weren't followed, or that the player seen is too far off of,
+        start over from it.
+        """
+        ok = tracks >= 0
+        if not ok.all():
+            tracks, team, located, variance = tracks[ok], team[ok], located[ok], variance[ok]
+            velocity_variance = velocity_variance[ok]
+            if seen_velocity is not None:
+                seen_velocity = seen_velocity[ok]
+
+        x, v = self.position[tracks], self.velocity[tracks]
+        pp, pv, vv = self.position_var[tracks], self.cov[tracks], self.velocity_var[tracks]
+
+        # the position
+        innovation = located - x
+        s = pp + variance
+        restart = ((self.confidence[tracks] < MIN_CONFIDENCE) |
+                   ((innovation ** 2).sum(axis=1) / s > GATE))
+
+        kp, kv = pp / s, pv / s
+        x = x + kp[:, np.newaxis] * innovation
+        v = v + kv[:, np.newaxis] * innovation
+        pp, pv, vv = pp - kp * pp, pv - kp * pv, vv - kv * pv
+
+        # then the velocity, where it was seen
+        if seen_velocity is not None:
+            has = ~np.isnan(seen_velocity[:, 0])
+            innovation = np.where(has[:, np.newaxis], seen_velocity - v, 0)
+            s = vv + velocity_variance
+            kp, kv = np.where(has, pv / s, 0), np.where(has, vv / s, 0)
+            x = x + kp[:, np.newaxis] * innovation
+            v = v + kv[:, np.newaxis] * innovation
+            pp, pv, vv = pp - kp * pv, pv - kv * pv, vv - kv * vv
+
+        # the tracks starting over, standing still unless their velocity
+        # was seen
+        if restart.any():
+            x[restart] = located[restart]
+            pp[restart] = variance[restart]
+            pv[restart] = 0
+            v[restart] = 0
+            vv[restart] = ServerParameters().player_speed_max ** 2
+            if seen_velocity is not None:
+                again = restart & has
+                v[again] = seen_velocity[again]
+                vv[again] = velocity_variance[again]
+
+        self.position[tracks], self.velocity[tracks] = x, v
+        self.position_var[tracks], self.cov[tracks], self.velocity_var[tracks] = pp, pv, vv
+
+        self.last_seen[tracks] = self.time
+        self.confidence[tracks] = 1
+
+        # anonymous tracks take the team they are seen on, if any; a new
+        # one forgets the team it had
+        anonymous = tracks >= 2 * TEAM_SIZE
+        self.team[tracks[anonymous & restart]] = TEAM_UNKNOWN
+        known = anonymous & (team != TEAM_UNKNOWN)
+        self.team[tracks[known]] = team[known]
+
+
+if __name__ == "__main__":
+    import random
+    import timeit
+
+    from smsoccer.world import game_object
+    from smsoccer.world.seenobjects import SeenObjects
+
+    # 22 players running about, seen as the server shows them by a player at
+    # the center turning its neck by 45 degrees every cycle: the uniform
+    # number only up to 20 m and the team up to 40 m.  how far off the
+    # tracks are, against the last numbered player seen, as players_persistent
+    # kept them, and how many players each knows about.
+    sp = ServerParameters()
+    random.seed(0)
+    np.random.seed(0)
+
+    UNUM_FAR, TEAM_FAR = 20.0, 40.0
+
+    def quantize(value, step):
+        return round(value / step) * step
+
+    positions = np.column_stack((np.random.uniform(-50, 50, 22), np.random.uniform(-32, 32, 22)))
+    velocities = np.zeros((22, 2))
+    targets = positions.copy()
+
+    tracker = PlayerTracker(sp.player_decay)
+    seen = SeenObjects()
+    persistent = {}
+    errors, persistent_errors, known, persistent_known = [], [], [], []
+    t_observe = 0.0
+
+    for time in xrange(1, 1001):
+        # every player runs to a target of its own, a new one now and then
+        for i in xrange(22):
+            if random.random() < 0.02:
+                targets[i] = random.uniform(-50, 50), random.uniform(-32, 32)
+            to = targets[i] - positions[i]
+            if np.hypot(*to) > 1:
+                velocities[i] += to / np.hypot(*to) * 0.6 * random.uniform(0, 1)
+        positions += velocities
+        velocities *= sp.player_decay
+
+        neck = (45 * time) % 360
+        players = []
+        for i in xrange(22):
+            x, y = positions[i]
+            d = math.hypot(x, y)
+            direction = (math.degrees(math.atan2(y, x)) - neck + 180) % 360 - 180
+            if abs(direction) > 45 or d < 1:
+                continue
+
+            ex, ey = x / d, y / d
+            vx, vy = velocities[i]
+            d_seen = quantize(math.exp(quantize(math.log(d), sp.quantize_step)), 0.1)
+            side = ("l" if i < 11 else "r") if d < TEAM_FAR else None
+            number = i % 11 + 1 if d < UNUM_FAR else None
+            players.append(game_object.Player(
+                d_seen, round(direction), quantize(vx * ex + vy * ey, 0.02 * d_seen),
+                quantize(math.degrees((vy * ex - vx * ey) / d), 0.1), None, None, side,
+                number, None, None))
+
+        seen.update_from_objects(None, [], players, "l")
+        seen.locate((0.0, 0.0), neck)
+
+        start = timeit.default_timer()
+        tracker.observe(time, seen, seen.located["players"], neck, (0.0, 0.0))
+        t_observe += timeit.default_timer() - start
+
+        for p, coords in zip(players, seen.located["players"]):
+            if p.uniform_number is not None:
+                persistent[(p.side, p.uniform_number)] = coords.copy()
+
+        # how far off every player known is
+        for i in xrange(22):
+            team, number = (TEAM_OURS, "l") if i < 11 else (TEAM_THEIRS, "r")
+            track = tracker.get(team, i % 11 + 1)
+            if track is not None:
+                errors.append(np.hypot(*(np.array(track[0]) - positions[i])))
+            last = persistent.get((number, i % 11 + 1))
+            if last is not None:
+                persistent_errors.append(np.hypot(*(last - positions[i])))
+        known.append(len(tracker.tracked()))
+        persistent_known.append(len(persistent))
+
+    print "tracked:            %.2f m off, %.1f players followed (%.1f anonymous)" % (
+        np.mean(errors), np.mean(known), np.mean(known) - len(errors) / 1000.0)
+    print "last numbered seen: %.2f m off, %.1f players known" % (
+        np.mean(persistent_errors), np.mean(persistent_known))
+    print "observing: %.1f us per see" % (t_observe / 1000 * 1e6)
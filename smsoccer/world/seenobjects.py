@@ -0,0 +1,285 @@
+import math
+
+import numpy as np
+
+from smsoccer.world import landmarks
+
+# capacity of the arrays.  a see message never holds more than the 55 flags,
+# 2 goals and 22 players on the field.
+MAX_FLAGS = 64
+MAX_PLAYERS = 32
+
+# the team a seen player belongs to
+TEAM_UNKNOWN = 0
+TEAM_OURS = 1
+TEAM_THEIRS = 2
+
+# a row per seen object.  missing values are NaN, unknown ids -1 and unknown
+# uniform numbers 0.
+PLAYER_DTYPE = np.dtype([("distance", np.float64),
+                         ("direction", np.float64),
+                         ("dist_change", np.float64),
+                         ("dir_change", np.float64),
+                         ("body_direction", np.float64),
+                         ("neck_direction", np.float64),
+                         ("team", np.int8),
+                         ("uniform_number", np.int8),
+                         ("goalie", np.bool_)])
+
+FLAG_DTYPE = np.dtype([("landmark_id", np.int32),
+                       ("x", np.float64),
+                       ("y", np.float64),
+                       ("distance", np.float64),
+                       ("direction", np.float64)])
+
+BALL_DTYPE = np.dtype([("distance", np.float64),
+                       ("direction", np.float64),
+                       ("dist_change", np.float64),
+                       ("dir_change", np.float64)])
+
+NAN = float("nan")
+
+# degrees to radians, times i
+_I_RAD = 1j * math.pi / 180
+
+
+def _number(x):
+    """
+    A value of a game object as stored in the arrays, NaN if it's None.
+    """
+    return NAN if x is None else x
+
+
+class SeenObjects(object):
+    """
+    The players, flags and ball of the last see message, as NumPy structured
+    arrays filled in place on each see, for queries on all of them at once:
+    players[:n_players], flags[:n_flags] and ball[:n_balls] (0 or 1 row).
+
+    The game objects of the world model (WorldModel.players and the like)
+    stay as they are, in the same order as the rows.
+
+    locate converts all of them to absolute coordinates at once, which stay
+    in 'located' until the next call.
+    """
+
+    def __init__(self):
+        self.players = np.zeros(MAX_PLAYERS, PLAYER_DTYPE)
+        self.flags = np.zeros(MAX_FLAGS, FLAG_DTYPE)
+        self.ball = np.zeros(1, BALL_DTYPE)
+
+        self.n_players = 0
+        self.n_flags = 0
+        self.n_balls = 0
+
+        # whether they came from a 'see_global' message, where distance and
+        # direction hold the absolute x and y coordinates instead, and
+        # dist_change and dir_change the velocity
+        self.is_global = False
+
+        # absolute coordinates of what was seen, by kind, as read only (n, 2)
+        # arrays, and the rows of all of them as python lists (players, then
+        # flags, then the ball).  None until located.
+        self.located = None
+        self.located_rows = None
+
+    def seen(self, kind):
+        """
+        The rows of what was seen, a view.
+        :param kind: "players", "flags" or "ball".
+        """
+        if kind == "players":
+            return self.players[:self.n_players]
+        if kind == "flags":
+            return self.flags[:self.n_flags]
+        return self.ball[:self.n_balls]
+
+    def update_from_frame(self, frame):
+        """
+        Copies a VisualFrame of the see decoder, array by array.
+        """
+        self.is_global = frame.is_global
+
+        n = self.n_players = min(frame.n_players, MAX_PLAYERS)
+        p = self.players
+        p["distance"][:n] = frame.player_distance[:n]
+        p["direction"][:n] = frame.player_direction[:n]
+        p["dist_change"][:n] = frame.player_dist_change[:n]
+        p["dir_change"][:n] = frame.player_dir_change[:n]
+        p["body_direction"][:n] = frame.player_body_dir[:n]
+        p["neck_direction"][:n] = frame.player_neck_dir[:n]
+        p["team"][:n] = frame.player_team[:n]
+        p["uniform_number"][:n] = frame.player_number[:n]
+        p["goalie"][:n] = frame.player_goalie[:n]
+
+        n = self.n_flags = min(frame.n_flags, MAX_FLAGS)
+        f = self.flags
+        ids = frame.flag_index[:n]
+        f["landmark_id"][:n] = ids
+        f["x"][:n] = landmarks.REGISTRY.coords[ids, 0]
+        f["y"][:n] = landmarks.REGISTRY.coords[ids, 1]
+        f["distance"][:n] = frame.flag_distance[:n]
+        f["direction"][:n] = frame.flag_direction[:n]
+
+        # flags without an id have no position
+        unknown = ids < 0
+        if unknown.any():
+            f["x"][:n][unknown] = f["y"][:n][unknown] = NAN
+
+        self.n_balls = 1 if frame.has_ball else 0
+        self.ball[0] = (frame.ball_distance, frame.ball_direction,
+                        frame.ball_dist_change, frame.ball_dir_change)
+
+    def update_from_objects(self, ball, flags, players, side):
+        """
+        Fills the arrays from the game objects of a see message, as
+        WorldModel.process_new_info gets them.
+        :param side: our side, to tell our players from theirs.
+        """
+        self.is_global = False
+
+        players = players[:MAX_PLAYERS]
+        self.n_players = len(players)
+        for i, p in enumerate(players):
+            if p.side is None:
+                team = TEAM_UNKNOWN
+            else:
+                team = TEAM_OURS if p.side == side else TEAM_THEIRS
+
+            self.players[i] = (_number(p.distance), _number(p.direction),
+                               _number(p.dist_change), _number(p.dir_change),
+                               _number(p.body_direction), _number(p.neck_direction),
+                               team, p.uniform_number or 0, False)
+
+        flags = flags[:MAX_FLAGS]
+        self.n_flags = len(flags)
+        for i, f in enumerate(flags):
+            if f.landmark_id is None:
+                self.flags[i] = (-1, NAN, NAN, _number(f.distance), _number(f.direction))
+            else:
+                x, y = landmarks.REGISTRY.position(f.landmark_id)
+                self.flags[i] = (f.landmark_id, x, y, _number(f.distance), _number(f.direction))
+
+        self.n_balls = 0 if ball is None else 1
+        if ball is not None:
+            self.ball[0] = (_number(ball.distance), _number(ball.direction),
+                            _number(ball.dist_change), _number(ball.dir_change))
+
+    def absolute_coords(self, kind, position, neck_direction):
+        """
+        Where the seen objects are on the field, as an (n, 2) array, seen
+        from the given position and absolute neck direction.  NaN for those
+        seen without a distance.
+        :param kind: "players", "flags" or "ball".
+        """
+        rows = self.seen(kind)
+
+        # as complex numbers, turning is a product
+        z = rows["distance"] * np.exp((rows["direction"] + neck_direction) * _I_RAD)
+        z += complex(position[0], position[1])
+        return z.view(float).reshape(-1, 2)
+
+    def locate(self, position, neck_direction):
+        """
+        Converts the players, flags and ball seen to absolute coordinates, all
+        in a single pass, into located and located_rows.  Those without a
+        distance get NaN.  Those of a see_global message already are, and are
+        taken as they are, whatever the position.
+        :param position: where we are, None if we don't know, which empties
+        located.
+        :param neck_direction: our absolute neck direction.
+        """
+        if position is None and not self.is_global:
+            self.located = self.located_rows = None
+            return
+
+        p, f, b = self.seen("players"), self.seen("flags"), self.seen("ball")
+        distance = np.concatenate((p["distance"], f["distance"], b["distance"]))
+        direction = np.concatenate((p["direction"], f["direction"], b["direction"]))
+
+        if self.is_global:
+            coords = np.column_stack((distance, direction))
+        else:
+            z = distance * np.exp((direction + neck_direction) * _I_RAD)
+            z += complex(position[0], position[1])
+            coords = z.view(float).reshape(-1, 2)
+        coords.flags.writeable = False
+
+        i, j = self.n_players, self.n_players + self.n_flags
+        self.located = {"players": coords[:i], "flags": coords[i:j], "ball": coords[j:]}
+        self.located_rows = coords.tolist()
+
+
+if __name__ == "__main__":
+    import timeit
+
+    from smsoccer.world import game_object
+    from smsoccer.world.world_model import WorldModel
+
+    # the teammate nearest to a point, among those seen: with a python loop
+    # over the game objects, as the players did it, and with the arrays
+    wm = WorldModel(None, filter_robot_loc=False)
+    wm.side = WorldModel.SIDE_L
+
+    np.random.seed(0)
+    players = []
+    for i in range(22):
+        side = WorldModel.SIDE_L if i % 2 else WorldModel.SIDE_R
+        players.append(game_object.Player(np.random.uniform(1, 50), np.random.uniform(-45, 45),
+                                          0, 0, None, "team", side, i // 2 + 1, 0, 0))
+    wm.process_new_info(None, [], [], players, [], 0)
+    wm.abs_coords, wm.abs_neck_dir = (-10.0, 5.0), 30.0
+    point = (20.0, -10.0)
+
+    def with_objects():
+        distances = []
+        for p in wm.players:
+            if p.side != wm.side:
+                continue
+            x, y = wm.get_object_absolute_coords(p)
+            distances.append((math.hypot(x - point[0], y - point[1]), p))
+        return min(distances)[1]
+
+    def with_arrays():
+        coords = wm.get_seen_absolute_coords("players", team=True)
+        d = np.hypot(coords[:, 0] - point[0], coords[:, 1] - point[1])
+        d[np.isnan(d)] = np.inf
+        return wm.players[d.argmin()]
+
+    # for every opponent, the teammate nearest to it
+    def marking_objects():
+        ours = [(p, wm.get_object_absolute_coords(p)) for p in wm.players if p.side == wm.side]
+        theirs = [(p, wm.get_object_absolute_coords(p)) for p in wm.players if p.side != wm.side]
+        return [min((math.hypot(c[0] - o[0], c[1] - o[1]), p) for p, c in ours)[1]
+                for q, o in theirs]
+
+    def marking_arrays():
+        coords = wm.get_seen_absolute_coords("players")
+        team = wm.seen.seen("players")["team"]
+        ours, theirs = np.flatnonzero(team == TEAM_OURS), np.flatnonzero(team == TEAM_THEIRS)
+        d = coords[theirs, np.newaxis, :] - coords[ours]
+        nearest = ours[np.hypot(d[..., 0], d[..., 1]).argmin(axis=1)]
+        return [wm.players[i] for i in nearest]
+
+    # the absolute coordinates of every player, one by one: computed at each
+    # call, as when given a reference, and converted once per see
+    def each_computed():
+        return [wm.get_object_absolute_coords(p, wm.abs_coords) for p in wm.players]
+
+    def each_converted():
+        return [wm.get_object_absolute_coords(p) for p in wm.players]
+
+    assert np.allclose(each_computed(), each_converted())
+    assert with_objects() is with_arrays()
+    assert marking_objects() == marking_arrays()
+    for name, f in (("every player, computed", each_computed),
+                    ("every player, converted", each_converted),
+                    ("converting", lambda: wm.seen.locate(wm.abs_coords, wm.abs_neck_dir)),
+                    ("nearest teammate, objects", with_objects),
+                    ("nearest teammate, arrays", with_arrays),
+                    ("marking, objects", marking_objects),
+                    ("marking, arrays", marking_arrays),
+                    ("filling the arrays", lambda: wm.seen.update_from_objects(None, [], players,
+                                                                               wm.side))):
+        t = timeit.timeit(f, number=10000) / 10000
+        print "%-26s %d players: %6.1f us" % (name + ",", len(players), t * 1e6)
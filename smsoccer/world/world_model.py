@@ -1,10 +1,19 @@
 import math
 
-import game_object
+import numpy as np
+
 from smsoccer.localization.filter.particlefilter import ParticleFilter
-from smsoccer.localization.localization import triangulate_position, triangulate_direction
+from smsoccer.localization.localization import estimate_pose_from_nearest, estimate_pose_from_bearings
 from smsoccer.util.geometric import cut_angle
+from smsoccer.util.memo import GenerationCache
+from smsoccer.world.balltracker import BallTracker, seen_ball, MIN_POSITION_NOISE, \
+    MIN_VELOCITY_NOISE
 from smsoccer.world.parameters import ServerParameters
+from smsoccer.world.playertracker import PlayerTracker
+from smsoccer.world.seenobjects import SeenObjects, TEAM_OURS, TEAM_THEIRS
+
+# the position seen is dropped if its std, in meters, is larger than this
+MAX_POSE_STD = 5.0
 
 
 class WorldModel:
@@ -30,22 +39,44 @@ class WorldModel:
         self.filter_robot_loc = filter_robot_loc
         self.ah = action_handler
 
+        # results of the queries that opted in with per_generation, kept
+        # until what we know changes (see new_generation)
+        self.cache = GenerationCache()
+
         # these variables store all objects for any particular game step
         self.ball = None
         self.flags = []
         self.goals = []
         self.players = []
 
+        # where the ball is on the field and how it moves, kept while it's
+        # out of view
+        self.ball_tracker = BallTracker()
+
+        # the last seen state of every player whose uniform number was seen,
+        # as it was seen, None for those not seen yet.
         # dict of dicts, first level indexed with 'friends'/'foes', 2nd level with uniform number
         self.players_persistent = {
-            #expands 10 None parameters with * [None]*10
             # range: [1,2,...,11] (shirt numbers)
-            'friends': {num: game_object.Player(*[None] * 10) for num in range(1, 12)},
-            'foes': {num: game_object.Player(*[None] * 10) for num in range(1, 12)}
+            'friends': dict.fromkeys(range(1, 12)),
+            'foes': dict.fromkeys(range(1, 12))
         }
 
         self.lines = []
 
+        # where every player seen is on the field and how it moves, numbered
+        # or not, kept while out of view
+        self.player_tracker = PlayerTracker()
+
+        # the same seen players, flags and ball, in arrays, for queries on
+        # all of them at once
+        self.seen = SeenObjects()
+        # the pose they were converted to absolute coordinates from, None
+        # until they are, and the coordinates of the game objects asked for
+        # since, by id (the object, its coordinates)
+        self._located_pose = None
+        self._located_objects = {}
+
         # Received message
         self.prev_message = None
 
@@ -91,10 +122,18 @@ class WorldModel:
         # apparent absolute player coordinates and neck/body directions
         self.abs_coords = None
         self.abs_neck_dir = None
+        # covariance of abs_coords and abs_neck_dir, see estimate_pose
+        self.abs_pose_cov = None
         self.abs_body_dir = None
 
         # Simulation time
         self.sim_time = None
+        # simulation time of the last sense_body message
+        self.sense_body_time = None
+        # number of think messages received, only sent in synch mode
+        self.think_count = 0
+        # compression level of the server's messages, as agreed by the server
+        self.compression = 0
         # self.old_abs_coords = (0, 0)
         # self.old_direction = 0
 
@@ -106,8 +145,9 @@ class WorldModel:
         self.team_message_queue = []
 
         if self.filter_robot_loc:
-            # Particle filter for robot localization
-            self.pf = ParticleFilter()
+            # Particle filter for robot localization, with as many particles
+            # as the uncertainty calls for (see pf.n and pf.update_time)
+            self.pf = ParticleFilter(adaptive=True)
 
 
     def process_new_info(self, ball, flags, goals, players, lines, sim_time):
@@ -122,49 +162,219 @@ class WorldModel:
         self.goals = goals
         self.players = players
         self.lines = lines
+        self.seen.update_from_objects(ball, flags, players, self.side)
 
         # updates available info in currently seen players
         for player in self.players:
-            team = 'friends' if player.side and player.side == self.side else 'foes'
+            self._update_persistent_player(player)
+
+        # ##################### Location #########
+        # everything seen with a direction
+        points, field_lines = ParticleFilter.observations(
+            [f for f in flags if f.flag_id is not None and f.direction is not None],
+            [g for g in goals if g.goal_id is not None and g.direction is not None],
+            [l for l in lines if l.line_id is not None and l.direction is not None])
+
+        self._localize(points, field_lines)
+        self._located_pose = None
+        self._locate_seen()
+
+        self.sim_time = sim_time
+        self._track_ball()
+        self._track_players()
+        self.new_generation()
+
+    def process_new_frame(self, frame):
+        """
+        Same as process_new_info, but takes the VisualFrame filled by the see
+        decoder.  Game objects are only built for what is actually used: the
+        seen flags, goals, lines and players are lazy views on the frame.
+
+        A see_global frame (the coach's, or a player's after '(eye on)')
+        holds absolute coordinates instead of distances and directions:
+        they are taken as they are, and there is nothing to localize.
+        """
+        # update basic information
+        self.ball = frame.ball()
+        self.flags = frame.flags
+        self.goals = frame.goals
+        self.lines = frame.lines
+        self.players = frame.players
+        self.seen.update_from_frame(frame)
+
+        # only players with a known uniform number are kept
+        for i in frame.player_number[:frame.n_players].nonzero()[0]:
+            self._update_persistent_player(frame.players[i])
+
+        if not frame.is_global:
+            self._localize(frame.landmarks(), frame.field_lines())
+        self._located_pose = None
+        self._locate_seen()
 
-            number = player.uniform_number if player.uniform_number else None
+        self.sim_time = frame.sim_time
+        self._track_ball()
+        self._track_players()
+        self.new_generation()
+
+    def process_new_body(self):
+        """
+        Update any internal variables based on new sense_body information.
+        A sense_body message starts every cycle, so this also makes the
+        particles move for the cycle that went by.
+        """
+        if self.filter_robot_loc:
+            self.pf.move_particles(self.server_parameters.player_decay)
+
+            if self.speed_amount is not None:
+                self.pf.sense_velocity(self.speed_amount, self.speed_direction,
+                                       self.neck_direction or 0)
+
+        if self.sense_body_time is not None:
+            self.ball_tracker.predict_to(self.sense_body_time)
+            self.player_tracker.predict_to(self.sense_body_time)
+
+        self.new_generation()
+
+    def new_generation(self):
+        """
+        Tells the world model that what it knows changed, so the results
+        cached by per_generation are out of date.  Called on every see and
+        sense_body message and referee call.
+        """
+        self.cache.bump()
+
+    def _update_persistent_player(self, player):
+        """
+        Updates available info of a currently seen player.
+        """
+        team = 'friends' if player.side and player.side == self.side else 'foes'
+
+        number = player.uniform_number if player.uniform_number else None
+
+        #discards if i don't know who this player is
+        if team is None or number is None:
+            return
+
+        #updates persistent player with available information
+        self.players_persistent[team][number] = player
+
+    def _locate_seen(self):
+        """
+        Converts everything seen to absolute coordinates at once (see
+        SeenObjects.locate), unless it already was from the current pose.
+        """
+        pose = (self.abs_coords, self.abs_neck_dir)
+        if pose != self._located_pose:
+            self._located_pose = pose
+            self._located_objects = {}
+            self.seen.locate(self.abs_coords, self.abs_neck_dir or 0)
+
+    def _seen_row(self, obj):
+        """
+        The row of a game object of the last see message in
+        seen.located_rows, None if it isn't one.
+        """
+        seen = self.seen
+        if obj is self.ball:
+            return seen.n_players + seen.n_flags if seen.n_balls else None
 
-            #discards if i don't know who this player is
-            if team is None or number is None:
+        for offset, objects, n in ((0, self.players, seen.n_players),
+                                   (seen.n_players, self.flags, seen.n_flags)):
+            try:
+                i = objects.index(obj)
+            except ValueError:
                 continue
+            return offset + i if i < n else None
 
-            #updates persistent player with available information
-            self.players_persistent[team][number] = player
-            #print 'player updated!'
+        return None
 
+    def _track_ball(self):
+        """
+        Gives the ball seen to the ball tracker, if we know where we are and
+        it came with a distance.
+        """
+        ball = self.ball
+        if self.seen.is_global and ball is not None and ball.distance is not None:
+            # where it is and how it moves, on the field, as the server has
+            # them
+            velocity = None
+            if ball.dist_change is not None and ball.dir_change is not None:
+                velocity = (ball.dist_change, ball.dir_change)
+            self.ball_tracker.observe(self.sim_time, (ball.distance, ball.direction),
+                                      MIN_POSITION_NOISE ** 2, velocity,
+                                      MIN_VELOCITY_NOISE ** 2)
+            return
 
-        # ##################### Location #########
-        # Take only good flags
-        gflags = [f for f in flags if
-                  f.distance is not None and f.direction is not None and f.flag_id is not None]
+        if ball is None or ball.distance is None or self.abs_coords is None:
+            self.ball_tracker.predict_to(self.sim_time)
+            return
+
+        self.ball_tracker.observe(self.sim_time, *seen_ball(ball, self.abs_coords,
+                                                            self.abs_neck_dir,
+                                                            self._own_velocity(),
+                                                            self.abs_pose_cov))
+
+    def _track_players(self):
+        """
+        Gives the players seen to the player tracker, if we know where we
+        are, or they were seen in field coordinates.
+        """
+        if (self.abs_coords is None and not self.seen.is_global) or not self.seen.n_players:
+            self.player_tracker.predict_to(self.sim_time)
+            return
+
+        self.player_tracker.observe(self.sim_time, self.seen, self.seen.located["players"],
+                                    self.abs_neck_dir, self._own_velocity(),
+                                    self.abs_pose_cov)
+
+    def _own_velocity(self):
+        """
+        Our velocity on the field, (vx, vy), None if unknown.  What moves is
+        seen relative to it.
+        """
+        if self.speed_amount is None or self.abs_neck_dir is None:
+            return None
 
-        # organize the flags to take the nearest
-        gflags.sort(key=lambda f1: f1.distance)
+        rad = math.radians(self.abs_neck_dir + self.speed_direction)
+        return self.speed_amount * math.cos(rad), self.speed_amount * math.sin(rad)
+
+    def kept_objects(self):
+        """
+        The game objects kept past the see message they came from: the last
+        seen state of every player, see players_persistent.  An ObjectPool
+        must not recycle them.
+        """
+        kept = set(self.players_persistent['friends'].values() +
+                   self.players_persistent['foes'].values())
+        kept.discard(None)
+        return kept
 
-        if len(gflags) > 0 and self.filter_robot_loc:
-            # neck dir
-            self.pf.update_based_on_flags(gflags)
+    def _localize(self, points, lines):
+        """
+        Estimates our absolute position and directions.
+        :param points, lines: every seen flag, goal and line, as taken by
+        ParticleFilter.update.
+        """
+        if (len(points) > 0 or len(lines) > 0) and self.filter_robot_loc:
+            # seen directions are relative to the neck
+            self.pf.update(points, lines, neck_direction=self.neck_direction or 0)
 
-        # Use 2 flags to localize.
-        if len(gflags) < 2:
+        # the flags and goals seen with a distance, the two nearest or all of
+        # them, trusted only if they pin the position down well enough.  in
+        # low view quality nothing comes with a distance, and only their
+        # directions are left.
+        pose = estimate_pose_from_nearest(points)
+        if pose is None:
+            pose = estimate_pose_from_bearings(points)
+        if pose is None or pose[3][0][0] + pose[3][1][1] > MAX_POSE_STD ** 2:
             # Error in triangulation
             self.abs_coords = None
             self.abs_neck_dir = None
-            # print "Not enough flags for localization"
+            self.abs_pose_cov = None
         else:
-            self.abs_coords = triangulate_position(gflags)
-
-            if self.abs_coords is not None:
-                # set the neck and body absolute directions based on flag directions
-                self.abs_neck_dir = triangulate_direction(self.abs_coords, gflags)
-                self.abs_neck_dir = cut_angle(self.abs_neck_dir)
-            else:
-                self.abs_neck_dir = None
+            x, y, neck_dir, self.abs_pose_cov = pose
+            self.abs_coords = (x, y)
+            self.abs_neck_dir = cut_angle(neck_dir)
 
         # set body dir only if we got a neck dir, else reset it
         if self.abs_neck_dir is not None and self.neck_direction is not None:
@@ -178,8 +388,6 @@ class WorldModel:
         # # Velocity in x and y
         # self.vx, self.vy = x2 - x1, y2 - y1
 
-        self.sim_time = sim_time
-
     def is_ball_in_defense(self):
         """
         Returns whether the ball is on the defensive field
@@ -190,11 +398,8 @@ class WorldModel:
             return True
 
         #returns True if ball.x is less than zero
-        else:
-            if self.get_object_absolute_coords(self.ball) is None:
-                return True
-            else:
-                return self.get_object_absolute_coords(self.ball)[0] < 0
+        coords = self.get_object_absolute_coords(self.ball)
+        return coords is None or coords[0] < 0
 
     def is_kick_in(self):
         """
@@ -332,21 +537,68 @@ class WorldModel:
         agent's current position.  Returns None if the coordinates can't be
         calculated.
         """
-        if reference is None:
-            reference = self.abs_coords
-
         # we can't calculate this without a distance to the object
         if obj.distance is None:
             return None
 
-        # get the components of the vector to the object
-        dx = obj.distance * math.cos(math.radians(obj.direction))
-        dy = obj.distance * math.sin(math.radians(obj.direction))
-        # print dx, dy
+        if reference is None:
+            # what was seen last was converted all at once, from where we
+            # are
+            if (self.abs_coords, self.abs_neck_dir) != self._located_pose:
+                self._locate_seen()
+
+            located = self._located_objects.get(id(obj))
+            if located is not None and located[0] is obj:
+                return located[1]
+
+            if self.seen.located_rows is None:
+                return None
+
+            row = self._seen_row(obj)
+            if row is not None:
+                coords = tuple(self.seen.located_rows[row])
+                self._located_objects[id(obj)] = (obj, coords)
+                return coords
+
+            # anything else is taken from where we are, if we know
+            reference = self.abs_coords
+            if reference is None:
+                return None
+
+        # get the components of the vector to the object.  it was seen
+        # relative to our neck.
+        direction = math.radians(obj.direction + (self.abs_neck_dir or 0))
+        dx = obj.distance * math.cos(direction)
+        dy = obj.distance * math.sin(direction)
 
         # return the point the object is at relative to our current position
         return reference[0] + dx, reference[1] + dy
 
+    def get_seen_absolute_coords(self, kind, team=None):
+        """
+        The absolute coordinates of all the seen players, flags or the ball
+        at once, as an (n, 2) array in the order of self.players, self.flags
+        or the ball, NaN for those seen without a distance.  None if we don't
+        know where we are.  They are converted once per see message, and
+        the array is read only.
+        :param kind: "players", "flags" or "ball".
+        :param team: for players, True to give those not in our team NaN,
+        False for those not in theirs.
+        """
+        self._locate_seen()
+        if self.seen.located is None:
+            return None
+
+        # converted once per see, read only
+        coords = self.seen.located[kind]
+
+        if team is not None:
+            teams = self.seen.seen("players")["team"]
+            coords = coords.copy()
+            coords[teams != (TEAM_OURS if team else TEAM_THEIRS)] = np.nan
+
+        return coords
+
     def get_stamina_max(self):
         """
         Returns the maximum amount of stamina a player can have.
@@ -0,0 +1,23 @@
+import os
+
+import pytest
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "data")
+
+
+def read_messages():
+    """
+    The server messages of data/server_messages.txt, one per line.
+    """
+    with open(os.path.join(DATA_DIR, "server_messages.txt")) as f:
+        return [line.rstrip("\n") for line in f if line.strip()]
+
+
+@pytest.fixture
+def server_messages():
+    return read_messages()
+
+
+@pytest.fixture
+def see_messages():
+    return [m for m in read_messages() if m.startswith("(see ")]
@@ -0,0 +1,80 @@
+from smsoccer.communication.actioncommunicator import ActionCommunicator
+from smsoccer.players.abstractagent import AbstractAgent
+from smsoccer.players.scheduler import CycleScheduler
+from smsoccer.world.world_model import WorldModel
+
+
+class Socket(object):
+    """
+    Keeps what would be sent to the server.
+    """
+
+    def __init__(self):
+        self.sent = []
+        self.compression_pending = False
+
+    def send(self, text):
+        self.sent.append(text)
+
+
+def test_commands_go_in_one_packet():
+    sock = Socket()
+    ah = ActionCommunicator(sock)
+    ah.turn_neck(10)
+    ah.dash(50)
+    ah.turn(30)
+    ah.say("hi")
+    ah.send_commands()
+
+    # the last primary command only, after the others
+    assert sock.sent == ["(turn_neck 10.000)(say hi)(turn 30.000)"]
+    assert (ah.cycle_packets, ah.cycle_bytes) == (1, len(sock.sent[0]) + 1)
+
+    # nothing to send, nothing sent
+    ah.send_commands()
+    assert len(sock.sent) == 1
+
+
+def test_a_cycle_counts_all_that_is_sent():
+    ah = ActionCommunicator(Socket())
+    ah.compression(6)
+    ah.dash(50)
+    ah.send_commands()
+    ah.turn(10)
+    ah.send_commands()
+    ah.done()
+    assert ah.cycle_packets == 4
+    assert ah.cycle_bytes == sum(len(t) + 1 for t in ah.sock.sent)
+
+    ah.new_cycle()
+    assert (ah.cycle_bytes, ah.cycle_packets) == (0, 0)
+    ah.dash(50)
+    ah.send_commands()
+    assert (ah.cycle_packets, ah.packets_sent) == (1, 5)
+    assert ah.bytes_sent == sum(len(t) + 1 for t in ah.sock.sent)
+
+
+class Agent(AbstractAgent):
+    def act_in_new_cycle(self):
+        if self.local_time % 2:
+            self.wm.ah.dash(50)
+
+
+def test_the_agent_starts_counting_every_cycle():
+    agent = Agent()
+    agent.wm = WorldModel(ActionCommunicator(Socket()))
+    agent.scheduler = CycleScheduler()
+    ah = agent.wm.ah
+
+    # synch mode: the commands, then done, in the same cycle
+    agent.scheduler.on_message("think")
+    agent.think_step()
+    assert ah.sock.sent == ["(dash 50.000)", "(done)"]
+    assert ah.cycle_packets == 2
+
+    # done alone
+    agent.scheduler.on_message("think")
+    agent.think_step()
+    assert ah.sock.sent[2:] == ["(done)"]
+    assert (ah.cycle_packets, ah.cycle_bytes) == (1, len("(done)") + 1)
+    assert ah.packets_sent == 3
@@ -0,0 +1,98 @@
+import math
+
+import pytest
+
+from smsoccer.world.balltracker import BallTracker, seen_ball, GATE
+from smsoccer.world.game_object import Ball
+
+
+def test_seen_ball():
+    # 10 m to the left of a player at (1, 1) looking along x
+    position, variance, velocity, velocity_variance = seen_ball(
+        Ball(10.0, 90.0, None, None, None), (1.0, 1.0), 0.0, (0.0, 0.0))
+    assert position == pytest.approx((1.0, 11.0))
+    assert variance > 0
+    assert velocity is None and velocity_variance is None
+
+    # the neck turned, and the ball moving away at 1 m/cycle, relative to
+    # a player moving along x
+    position, variance, velocity, velocity_variance = seen_ball(
+        Ball(10.0, 45.0, 1.0, 0.0, None), (0.0, 0.0), 45.0, (0.5, 0.0))
+    assert position == pytest.approx((0.0, 10.0))
+    assert velocity == pytest.approx((0.5, 1.0))
+    assert velocity_variance > 0
+
+    # sideways: dir_change in degrees per cycle
+    velocity = seen_ball(Ball(10.0, 0.0, 0.0, math.degrees(0.1), None),
+                         (0.0, 0.0), 0.0, (0.0, 0.0))[2]
+    assert velocity == pytest.approx((0.0, 1.0))
+
+
+def test_our_uncertainty_adds_up():
+    ball = Ball(10.0, 0.0, None, None, None)
+    alone = seen_ball(ball, (0.0, 0.0), 0.0)[1]
+    cov = ((0.5, 0.0, 0.0), (0.0, 0.5, 0.0), (0.0, 0.0, 4.0))
+    assert seen_ball(ball, (0.0, 0.0), 0.0, pose_cov=cov)[1] > alone + 0.5
+
+
+def test_moves_as_the_server_does():
+    tracker = BallTracker(decay=0.5, rand=0.0)
+    assert tracker.predict(3) is None
+    assert tracker.trajectory(3) == []
+    assert tracker.stop_position() is None
+
+    tracker.observe(10, (0.0, 0.0), 0.01, (4.0, -2.0), 0.01)
+    assert tracker.position == (0.0, 0.0)
+
+    trajectory = tracker.trajectory(3)
+    assert len(trajectory) == 3
+    for position, expected in zip(trajectory, [(4.0, -2.0), (6.0, -3.0), (7.0, -3.5)]):
+        assert position == pytest.approx(expected)
+    position, velocity = tracker.predict(3)
+    assert position == pytest.approx((7.0, -3.5))
+    assert velocity == pytest.approx((0.5, -0.25))
+    assert tracker.stop_position() == pytest.approx((8.0, -4.0))
+
+    tracker.predict_to(13)
+    assert tracker.position == pytest.approx((7.0, -3.5))
+    assert tracker.velocity == pytest.approx((0.5, -0.25))
+    assert tracker.position_var > 0.01
+
+    # never backwards
+    tracker.predict_to(12)
+    assert tracker.time == 13
+
+
+def test_follows_a_rolling_ball():
+    tracker = BallTracker(decay=0.94, rand=0.0)
+    x, vx = 0.0, 2.0
+    for time in range(20):
+        # the position only, a little off each time
+        tracker.observe(time, (x + (0.1 if time % 2 else -0.1), 0.0), 0.01)
+        x, vx = x + vx, vx * 0.94
+
+    tracker.predict_to(20)
+    assert tracker.position[0] == pytest.approx(x, abs=0.1)
+    assert tracker.velocity[0] == pytest.approx(vx, abs=0.05)
+    assert tracker.position_var < 0.01
+
+
+def test_starts_over_when_kicked():
+    tracker = BallTracker(decay=0.94, rand=0.0)
+    for time in range(5):
+        tracker.observe(time, (0.0, 0.0), 0.01)
+
+    # the innovation is way past the gate
+    assert 10.0 ** 2 / (tracker.position_var + 0.01) > GATE
+    tracker.observe(5, (10.0, 0.0), 0.01)
+    assert tracker.position == (10.0, 0.0)
+    assert tracker.position_var == 0.01
+
+
+def test_cycles_unseen():
+    tracker = BallTracker()
+    assert tracker.cycles_unseen(5) is None
+
+    tracker.observe(5, (0.0, 0.0), 0.01)
+    tracker.predict_to(8)
+    assert tracker.cycles_unseen(8) == 3
@@ -0,0 +1,98 @@
+import numpy as np
+
+from smsoccer.localization.filter.batchfilter import BatchParticleFilter, SharedParticleFilter
+from smsoccer.localization.filter.particlefilter import ParticleFilter
+
+# flags and goals (x, y, distance, direction), the last one too far to have
+# a distance, and lines (coordinate, vertical, distance, direction)
+POINTS = np.array([(52.5, 0.0, 40.0, 10.0), (52.5, 20.0, 45.0, 30.0), (0.0, 34.0, 38.0, -40.0),
+                   (-52.5, 0.0, np.nan, 170.0)])
+LINES = np.array([(52.5, True, 41.0, 5.0)])
+
+
+def seen(j):
+    """
+    What the j-th agent sees: a different number of points for each, none
+    for some.
+    """
+    return POINTS[:j % (len(POINTS) + 1)], LINES if j % 2 else None
+
+
+def lone_and_shared(k):
+    lone = [ParticleFilter() for j in range(k)]
+    batch = BatchParticleFilter()
+    shared = [batch.add() for j in range(k)]
+    for pf, sh in zip(lone, shared):
+        sh.particles[:] = pf.particles
+    return lone, shared, batch
+
+
+def test_batched_weights_are_those_of_lone_filters():
+    lone, shared, batch = lone_and_shared(7)
+    for j, (pf, sh) in enumerate(zip(lone, shared)):
+        pf.update(*seen(j), ess_threshold=0)
+        sh.update(*seen(j), ess_threshold=0)
+    batch.step()
+
+    for pf, sh in zip(lone, shared):
+        assert np.allclose(pf.weights, sh.weights, rtol=1e-9, atol=1e-15)
+        assert np.allclose(pf.e_position, sh.e_position)
+
+
+def test_only_the_pending_filters_step():
+    lone, shared, batch = lone_and_shared(5)
+    before = batch.particles.copy()
+    for j in (1, 3, 4):
+        lone[j].update(*seen(j), ess_threshold=0)
+        shared[j].update(*seen(j), ess_threshold=0)
+    batch.step()
+
+    for j in (0, 2):
+        assert np.array_equal(batch.particles[j], before[j])
+        assert np.allclose(shared[j].weights, 1.0 / batch.n)
+    for j in (1, 3, 4):
+        assert np.allclose(lone[j].weights, shared[j].weights, rtol=1e-9, atol=1e-15)
+
+
+def test_a_single_agent_runs_as_a_lone_filter():
+    runs = []
+    for make in (ParticleFilter, lambda: BatchParticleFilter().add()):
+        np.random.seed(0)
+        pf = make()
+        pf.start_position((40.0, 0.0, 0.0))
+        for i in range(20):
+            pf.move_particles()
+            pf.sense_velocity(0.3, 0)
+            pf.update(POINTS, LINES)
+        if isinstance(pf, SharedParticleFilter):
+            pf.batch.step()
+        runs.append(pf)
+
+    assert np.array_equal(runs[0].particles, runs[1].particles)
+
+
+def test_estimates_stay_views_when_the_batch_grows():
+    batch = BatchParticleFilter()
+    first = batch.add()
+    first.start_position((10.0, -5.0, 30.0))
+    for j in range(8):
+        batch.add()
+
+    first.update(POINTS, LINES)
+    batch.step()
+
+    assert np.shares_memory(first.particles, batch.particles)
+    assert np.shares_memory(first.e_position, batch.estimates)
+    assert np.array_equal(first.e_position, batch.estimates[0])
+    assert np.allclose(first.e_position, np.dot(first.weights, first.particles))
+
+
+def test_a_batch_starts_from_a_lone_filter():
+    pf = ParticleFilter()
+    pf.start_position((-20.0, 15.0, 90.0))
+    batch = BatchParticleFilter()
+    shared = batch.add(pf)
+
+    # all the particles are at the same place, so the resampling can't move
+    assert np.allclose(shared.e_position, pf.e_position)
+    assert np.shares_memory(shared.abs_coords, batch.estimates)
@@ -0,0 +1,88 @@
+import pytest
+
+from smsoccer.communication.seedecoder import SeeDecoder
+from smsoccer.world import game_object
+from smsoccer.world.world_model import WorldModel
+
+SEE = '(see %d ((f c) 10 0) ((b) 5 0) ((p "them" 4) 20 10))'
+
+
+def test_game_objects_have_slots():
+    ball = game_object.Ball(1.0, 2.0, None, None, None)
+    assert not hasattr(ball, "__dict__")
+    with pytest.raises(AttributeError):
+        ball.color = "white"
+
+
+def test_pool_reuses_recycled_objects():
+    pool = game_object.ObjectPool()
+    first = pool.new(game_object.Ball, 1.0, 2.0, None, None, None)
+    kept = pool.new(game_object.Flag, 3.0, 4.0, "f c")
+    assert (pool.allocated, pool.reused) == (2, 0)
+
+    # objects aren't reused before they are recycled
+    assert pool.new(game_object.Ball, 5.0, 6.0, None, None, None) is not first
+    pool.recycle(keep={kept})
+
+    ball = pool.new(game_object.Ball, 7.0, 8.0, 0.5, None, None)
+    assert ball in pool.taken
+    assert (ball.distance, ball.direction, ball.dist_change) == (7.0, 8.0, 0.5)
+    assert pool.new(game_object.Ball, 0, 0, None, None, None) is not ball
+    assert (pool.allocated, pool.reused) == (3, 2)
+
+    # the kept flag isn't handed out while kept
+    other = pool.new(game_object.Flag, 1.0, 0.0, "f c t")
+    assert other is not kept
+    assert (kept.distance, kept.flag_id) == (3.0, "f c")
+    assert kept in pool.taken
+
+    pool.recycle(keep={kept})
+    assert pool.new(game_object.Flag, 1.0, 0.0, "f c t") is other
+
+    # but it is once let go of
+    pool.recycle()
+    flags = [pool.new(game_object.Flag, 1.0, 0.0, "f c t") for i in range(2)]
+    assert kept in flags
+    assert pool.allocated == 4
+
+
+def test_allocate_makes_new_objects():
+    ball = game_object.allocate(game_object.Ball, 1.0, 2.0, None, None, None)
+    assert isinstance(ball, game_object.Ball) and ball.distance == 1.0
+
+
+def test_pooled_decoder_keeps_what_the_world_model_keeps():
+    wm = WorldModel(None, filter_robot_loc=False)
+    wm.team_name = "us"
+    wm.side = WorldModel.SIDE_L
+    decoder = SeeDecoder(pooled=True)
+
+    seen = []
+    for t in range(4):
+        frame = decoder.decode(SEE % t, wm)
+        wm.process_new_frame(frame)
+        seen.append((frame.ball(), list(frame.players)))
+
+    # the game objects of two messages ago are reused, as long as the world
+    # model doesn't keep them
+    assert seen[2][0] is seen[0][0]
+    assert seen[2][1][0] is seen[0][1][0]
+    assert seen[3][1][0] in wm.kept_objects()
+
+    # what it kept isn't reused, until it lets go of it
+    wm.players_persistent['foes'][4] = kept = seen[2][1][0]
+    for t in 4, 5:
+        assert all(p is not kept for p in decoder.decode(SEE % t, wm).players)
+    assert (kept.distance, kept.direction, kept.uniform_number) == (20.0, 10.0, 4)
+
+    wm.players_persistent['foes'][4] = None
+    frame = decoder.decode('(see 6 ((p "them" 4) 20 10) ((p "them" 5) 30 0))', wm)
+    assert any(p is kept for p in frame.players)
+
+
+def test_players_not_seen_yet_are_none():
+    wm = WorldModel(None, filter_robot_loc=False)
+    assert wm.players_persistent['friends'] == dict.fromkeys(range(1, 12))
+    assert wm.players_persistent['foes'] == dict.fromkeys(range(1, 12))
+    assert wm.kept_objects() == set()
+
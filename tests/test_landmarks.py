@@ -0,0 +1,37 @@
+import math
+
+import pytest
+
+from smsoccer.world import game_object
+from smsoccer.world.landmarks import REGISTRY, LandmarkRegistry, FLAG_IDS, flag_id, goal_id
+
+
+def test_positions():
+    for flag in FLAG_IDS:
+        assert REGISTRY.position(flag_id(flag)) == game_object.Flag.FLAG_COORDS[flag]
+    assert REGISTRY.position(goal_id("r")) == game_object.Goal.GOAL_COORDS["r"]
+
+
+@pytest.mark.parametrize("a, b", [("tl10", "prc"), ("c", "gr"), ("glt", "glb"), ("c", "c")])
+def test_pairs(a, b):
+    (ax, ay), (bx, by) = game_object.Flag.FLAG_COORDS[a], game_object.Flag.FLAG_COORDS[b]
+    length = math.hypot(bx - ax, by - ay)
+
+    r_length, unit = REGISTRY.pair(flag_id(a), flag_id(b))
+    assert r_length == pytest.approx(length)
+    if length:
+        assert unit == pytest.approx(((bx - ax) / length, (by - ay) / length))
+    else:
+        assert unit == (0.0, 0.0)
+
+
+def test_goal_width_moves_the_goal_posts():
+    registry = LandmarkRegistry()
+    width = registry.goal_width
+    try:
+        registry.set_goal_width(20.0)
+        assert game_object.Flag.FLAG_COORDS["grb"] == (52.5, 10.0)
+        assert registry.position(flag_id("grt"))[1] == -10.0
+        assert registry.pair(flag_id("grt"), flag_id("grb"))[0] == pytest.approx(20.0)
+    finally:
+        registry.set_goal_width(width)
@@ -0,0 +1,128 @@
+import math
+
+import numpy as np
+import pytest
+
+from smsoccer.localization.localization import estimate_pose, estimate_pose_from_bearings, \
+    estimate_pose_from_nearest, NEAREST_MAX_STD
+from smsoccer.world.game_object import Flag
+
+POSES = [(1.0, 2.0, 0.0), (-30.0, 12.5, 135.0), (40.0, -20.0, -60.0), (-10.0, -25.0, 179.0)]
+
+
+def seen_landmarks(x, y, view, width=90, quantize=False):
+    """
+    Rows (x, y, distance, direction) of the flags seen from the given pose,
+    exact or quantized as the server does.
+    """
+    rows = []
+    for flag_id, (fx, fy) in sorted(Flag.FLAG_COORDS.items()):
+        direction = (math.degrees(math.atan2(fy - y, fx - x)) - view + 180) % 360 - 180
+        if abs(direction) < width / 2.0:
+            d = math.hypot(fx - x, fy - y)
+            if quantize:
+                d = round(math.exp(round(math.log(d) / 0.01) * 0.01), 1)
+                direction = round(direction)
+            rows.append((fx, fy, d, direction))
+    return np.array(rows)
+
+
+def angle_off(a, b):
+    return abs((a - b + 180) % 360 - 180)
+
+
+@pytest.mark.parametrize("pose", POSES)
+def test_exact_landmarks_give_the_pose(pose):
+    x, y, direction, cov = estimate_pose(seen_landmarks(*pose))
+    assert (x, y) == pytest.approx(pose[:2], abs=1e-6)
+    assert angle_off(direction, pose[2]) < 1e-6
+
+
+@pytest.mark.parametrize("pose", POSES)
+def test_quantized_landmarks(pose):
+    landmarks = seen_landmarks(*pose, quantize=True)
+    x, y, direction, cov = estimate_pose(landmarks)
+    assert math.hypot(x - pose[0], y - pose[1]) < 0.5
+    assert angle_off(direction, pose[2]) < 1
+
+    # a covariance as nested tuples, symmetric with a positive diagonal
+    assert isinstance(cov, tuple) and all(isinstance(row, tuple) for row in cov)
+    cov = np.array(cov)
+    assert cov.shape == (3, 3)
+    assert np.allclose(cov, cov.T)
+    assert (np.diag(cov) > 0).all()
+
+
+def test_landmarks_without_a_distance_are_left_out():
+    pose = POSES[1]
+    landmarks = seen_landmarks(*pose, quantize=True)
+    expected = estimate_pose(landmarks)
+
+    unknown = landmarks[:3].copy()
+    unknown[:, :2] += 20
+    unknown[:, 2] = np.nan
+    pose_nan = estimate_pose(np.vstack((unknown, landmarks)))
+
+    assert pose_nan[:3] == pytest.approx(expected[:3])
+    assert np.allclose(pose_nan[3], expected[3])
+
+
+def test_too_few_landmarks():
+    landmarks = seen_landmarks(*POSES[0])
+    assert estimate_pose(landmarks[:0]) is None
+    assert estimate_pose(landmarks[:1]) is None
+    assert estimate_pose(landmarks[:2]) is not None
+
+    # two landmarks, but one distance only
+    two = landmarks[:2].copy()
+    two[0, 2] = np.nan
+    assert estimate_pose(two) is None
+
+
+@pytest.mark.parametrize("pose", POSES)
+def test_nearest_landmarks(pose):
+    landmarks = seen_landmarks(*pose, quantize=True)
+    x, y, direction, cov = estimate_pose_from_nearest(landmarks)
+    assert math.hypot(x - pose[0], y - pose[1]) < 3 * NEAREST_MAX_STD
+    assert angle_off(direction, pose[2]) < 2
+    assert cov[0][0] + cov[1][1] <= NEAREST_MAX_STD ** 2
+
+    # exact, two are enough
+    x, y, direction, cov = estimate_pose_from_nearest(seen_landmarks(*pose))
+    assert (x, y) == pytest.approx(pose[:2], abs=1e-6)
+    assert angle_off(direction, pose[2]) < 1e-6
+
+
+def test_nearest_two_are_estimate_pose_of_two():
+    landmarks = seen_landmarks(*POSES[2], quantize=True)
+    nearest = landmarks[np.argsort(landmarks[:, 2])[:2]]
+    pose = estimate_pose_from_nearest(landmarks, max_std=np.inf)
+    expected = estimate_pose(nearest)
+    assert pose[:3] == pytest.approx(expected[:3])
+    assert np.allclose(pose[3], expected[3])
+
+
+def test_all_landmarks_when_the_nearest_are_not_enough():
+    landmarks = seen_landmarks(*POSES[1], quantize=True)
+    assert estimate_pose_from_nearest(landmarks, max_std=0) == estimate_pose(landmarks)
+
+    # the nearest without a distance are left out
+    unknown = landmarks[:3].copy()
+    unknown[:, 2] = np.nan
+    with_nan = np.vstack((unknown, landmarks))
+    pose = estimate_pose_from_nearest(with_nan, max_std=np.inf)
+    assert pose == estimate_pose_from_nearest(landmarks, max_std=np.inf)
+    assert estimate_pose_from_nearest(with_nan[1:4]) is None
+    assert estimate_pose_from_nearest(landmarks[:1]) is None
+
+
+@pytest.mark.parametrize("pose", POSES)
+def test_bearings_alone(pose):
+    landmarks = seen_landmarks(*pose, quantize=True)
+    landmarks[:, 2] = np.nan
+    x, y, direction, cov = estimate_pose_from_bearings(landmarks, iterations=2)
+    assert math.hypot(x - pose[0], y - pose[1]) < 2
+    assert angle_off(direction, pose[2]) < 2
+    assert isinstance(cov, tuple)
+
+    assert estimate_pose_from_bearings(landmarks[:2]) is None
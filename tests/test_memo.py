@@ -0,0 +1,86 @@
+from smsoccer.communication.seedecoder import SeeDecoder
+from smsoccer.util.memo import GenerationCache, per_generation
+from smsoccer.world.world_model import WorldModel
+
+
+class Model(object):
+    def __init__(self):
+        self.cache = GenerationCache()
+        self.calls = 0
+
+    @per_generation
+    def double(self, x):
+        self.calls += 1
+        return 2 * x
+
+
+class Agent(object):
+    def __init__(self, wm):
+        self.wm = wm
+
+    @per_generation
+    def triple(self, x):
+        self.wm.calls += 1
+        return 3 * x
+
+
+def test_computed_once_per_generation():
+    model = Model()
+    assert model.double(2) == 4
+    assert model.double(2) == 4
+    assert model.double(3) == 6
+    assert model.calls == 2
+
+    model.cache.bump()
+    assert model.double(2) == 4
+    assert model.calls == 3
+    assert model.cache.generation == 1
+
+    assert model.cache.stats == {"double": [1, 3]}
+    assert model.cache.hit_rate() == 0.25
+    assert model.cache.report().startswith("double")
+
+
+def test_agents_share_the_cache_of_their_world_model():
+    model = Model()
+    agent = Agent(model)
+    assert agent.triple(1) == 3
+    assert agent.triple(1) == 3
+    assert model.calls == 1
+    assert model.cache.stats == {"triple": [1, 1]}
+
+
+def test_calls_that_cant_be_cached():
+    model = Model()
+    model.double([1])
+    model.double([1])
+    model.double(x=1)
+    model.double(x=1)
+    assert model.calls == 4
+    assert model.cache.stats == {}
+    assert model.cache.hit_rate() == 0.0
+
+    model.double.uncached(model, 1)
+    model.double(1)
+    assert model.calls == 6
+
+
+def test_methods_are_cached_apart():
+    model = Model()
+    agent = Agent(model)
+    agent.triple(1)
+    model.double(1)
+    assert model.calls == 2
+
+
+def test_what_the_agent_sees_starts_a_generation():
+    wm = WorldModel(None)
+    wm.side = WorldModel.SIDE_L
+    wm.calls = 0
+    agent = Agent(wm)
+
+    agent.triple(1)
+    agent.triple(1)
+    wm.process_new_frame(SeeDecoder().decode("(see 0 ((g r) 52.5 0))", wm))
+    agent.triple(1)
+    assert wm.calls == 2
@@ -0,0 +1,41 @@
+import pytest
+
+from smsoccer.communication.messageparser import parse, parse_reference
+
+from conftest import read_messages
+
+
+def parse_or_error(parser, text):
+    try:
+        return parser(text)
+    except ValueError as e:
+        return ValueError, str(e)
+
+
+@pytest.mark.parametrize("message", read_messages())
+def test_parse_matches_reference(message):
+    assert parse_or_error(parse, message) == parse_or_error(parse_reference, message)
+
+
+@pytest.mark.parametrize("message", read_messages())
+def test_parse_takes_buffers(message):
+    # as Socket.recv_buffer hands them out
+    data = bytearray(message + "\0" * 16)
+    assert parse_or_error(parse, buffer(data, 0, len(message))) == \
+        parse_or_error(parse_reference, message)
+
+
+def test_parse_converts_values():
+    assert parse("(see 12 ((f c) 1.5 -30) (x -.5 3. 007))") == \
+        ["see", 12, [["f", "c"], 1.5, -30], ["x", -0.5, "3.", 7]]
+
+
+def test_parse_keeps_parenthesis_in_strings():
+    assert parse('(hear 12 -45 opp "a (b) c")') == ["hear", 12, -45, "opp", "a", "(b)", "c"]
+    assert parse('(a ")(" b)') == parse_reference('(a ")(" b)')
+
+
+def test_unmatched_parenthesis():
+    for parser in (parse, parse_reference):
+        with pytest.raises(ValueError):
+            parser("(see 0 ((f c) 1 2)")
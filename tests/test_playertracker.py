@@ -0,0 +1,92 @@
+import math
+
+import pytest
+
+from smsoccer.world import game_object
+from smsoccer.world.playertracker import PlayerTracker, slot, N_TRACKS, TEAM_SIZE, \
+    ANONYMOUS_TRACKS
+from smsoccer.world.seenobjects import SeenObjects, TEAM_OURS, TEAM_THEIRS
+
+
+def player(x, y, side=None, number=None):
+    """
+    A player at (x, y) as seen from the center looking along x, standing
+    still.
+    """
+    return game_object.Player(math.hypot(x, y), math.degrees(math.atan2(y, x)), 0.0, 0.0,
+                              None, None, side, number, None, None)
+
+
+def see(tracker, time, *players):
+    seen = SeenObjects()
+    seen.update_from_objects(None, [], list(players), "l")
+    seen.locate((0.0, 0.0), 0.0)
+    tracker.observe(time, seen, seen.located["players"], 0.0, (0.0, 0.0))
+
+
+def test_slot():
+    assert slot(TEAM_OURS, 1) == 0
+    assert slot(TEAM_THEIRS, 11) == 2 * TEAM_SIZE - 1
+    assert ANONYMOUS_TRACKS[-1] == N_TRACKS - 1
+
+
+def test_numbered_players():
+    tracker = PlayerTracker()
+    assert tracker.get(TEAM_OURS, 3) is None
+
+    see(tracker, 1, player(10.0, 5.0, "l", 3), player(-20.0, 0.0, "r", 7))
+
+    position, velocity, last_seen, confidence = tracker.get(TEAM_OURS, 3)
+    assert position == pytest.approx((10.0, 5.0))
+    assert velocity == pytest.approx((0.0, 0.0))
+    assert (last_seen, confidence) == (1, 1.0)
+    assert tracker.get(TEAM_THEIRS, 7)[0] == pytest.approx((-20.0, 0.0))
+
+    assert list(tracker.tracked()) == [slot(TEAM_OURS, 3), slot(TEAM_THEIRS, 7)]
+    assert list(tracker.tracked(TEAM_THEIRS)) == [slot(TEAM_THEIRS, 7)]
+
+
+def test_players_without_a_number_are_matched_to_tracks():
+    tracker = PlayerTracker()
+    see(tracker, 1, player(10.0, 5.0, "l", 3))
+
+    # the same player, farther: no number nor team anymore
+    see(tracker, 2, player(10.2, 5.0))
+    assert tracker.get(TEAM_OURS, 3)[2] == 2
+    assert list(tracker.tracked()) == [slot(TEAM_OURS, 3)]
+
+    # someone else entirely
+    see(tracker, 3, player(-30.0, 10.0))
+    tracked = tracker.tracked()
+    assert len(tracked) == 2 and tracked[1] in ANONYMOUS_TRACKS
+    assert tracker.position[tracked[1]] == pytest.approx((-30.0, 10.0))
+
+    # who turns out to be one of theirs, which ends the anonymous track
+    see(tracker, 4, player(-30.0, 10.0, "r", 9))
+    assert list(tracker.tracked()) == [slot(TEAM_OURS, 3), slot(TEAM_THEIRS, 9)]
+
+
+def test_unseen_tracks_fade_out():
+    tracker = PlayerTracker(decay=0.5)
+    see(tracker, 1, player(10.0, 0.0, "l", 2))
+    tracker.velocity[slot(TEAM_OURS, 2)] = (1.0, 0.0)
+
+    assert tracker.predict(2)[slot(TEAM_OURS, 2)] == pytest.approx((11.5, 0.0))
+
+    tracker.predict_to(3)
+    position, velocity, last_seen, confidence = tracker.get(TEAM_OURS, 2)
+    assert position == pytest.approx((11.5, 0.0))
+    assert velocity == pytest.approx((0.25, 0.0))
+    assert last_seen == 1 and confidence < 1
+
+    tracker.predict_to(100)
+    assert tracker.get(TEAM_OURS, 2) is None
+    assert not len(tracker.tracked())
+
+
+def test_players_out_of_reach_are_left_out():
+    tracker = PlayerTracker()
+    # a player seen without a distance can't be placed
+    far = game_object.Player(None, 30.0, None, None, None, None, "r", None, None, None)
+    see(tracker, 1, far)
+    assert not len(tracker.tracked())
@@ -0,0 +1,107 @@
+import numpy as np
+import pytest
+
+from smsoccer.localization.filter import resampling
+from smsoccer.localization.filter.particlefilter import ParticleFilter, MIN_PARTICLES
+
+
+@pytest.fixture
+def weights():
+    np.random.seed(0)
+    w = np.random.exponential(size=50) ** 3
+    return w / w.sum()
+
+
+def test_effective_sample_size():
+    assert resampling.effective_sample_size(np.ones(10) / 10) == pytest.approx(10)
+    assert resampling.effective_sample_size(np.eye(10)[3]) == pytest.approx(1)
+
+    assert not resampling.needs_resampling(np.ones(10) / 10)
+    assert resampling.needs_resampling(np.eye(10)[3])
+
+
+@pytest.mark.parametrize("scheme, slack", [(resampling.systematic, 1),
+                                           (resampling.stratified, 2),
+                                           (resampling.residual, None)])
+@pytest.mark.parametrize("n", [None, 20, 200])
+def test_copies_follow_the_weights(weights, scheme, slack, n):
+    ids = scheme(weights, n)
+    n = n or len(weights)
+    assert len(ids) == n
+    assert ids.min() >= 0 and ids.max() < len(weights)
+
+    counts = np.bincount(ids, minlength=len(weights))
+    if slack is None:
+        # residual: every particle gets at least its whole share
+        assert (counts >= np.floor(n * weights)).all()
+    else:
+        assert (abs(counts - n * weights) < slack).all()
+
+
+def test_zero_weights_are_never_drawn(weights):
+    weights[::2] = 0
+    weights /= weights.sum()
+    for scheme in resampling.systematic, resampling.stratified, resampling.residual:
+        assert (scheme(weights) % 2 == 1).all()
+
+
+@pytest.mark.parametrize("scheme", [resampling.systematic, resampling.stratified])
+def test_rows_are_resampled_each_on_its_own(weights, scheme):
+    rows = np.array([weights, weights[::-1], np.eye(50)[7]])
+    ids = scheme(rows, 30)
+    assert ids.shape == (3, 30)
+    assert ids.min() >= 0 and ids.max() < 50
+
+    for row, row_ids in zip(rows, ids):
+        counts = np.bincount(row_ids, minlength=50)
+        assert (abs(counts - 30 * row) < 2).all()
+    assert (ids[2] == 7).all()
+
+
+def test_kld_bound_grows_with_the_bins():
+    assert resampling.kld_bound(0) == 1
+    assert resampling.kld_bound(1) == 1
+
+    bounds = resampling.kld_bound(np.arange(2, 100))
+    assert (np.diff(bounds) > 0).all()
+
+    # stricter epsilon, more particles
+    assert resampling.kld_bound(10, epsilon=0.05) > resampling.kld_bound(10)
+
+
+def test_kld_size():
+    # a single bin: only the minimum
+    assert resampling.kld_size(np.zeros(500, dtype=int), min_size=20) == 20
+
+    # every particle in a bin of its own: past the minimum, the bound is
+    # never met
+    assert resampling.kld_size(np.arange(500), min_size=20) == 500
+
+    # a few bins: the first prefix that meets the bound for them
+    np.random.seed(0)
+    bins = np.random.randint(10, size=1000)
+    size = resampling.kld_size(bins, min_size=20)
+    assert size == int(np.ceil(resampling.kld_bound(10)))
+
+
+def test_adaptive_filter_shrinks_when_certain():
+    np.random.seed(0)
+    pf = ParticleFilter(500, adaptive=True)
+    pf.start_position([0.0, 0.0, 0.0])
+    pf.particles[:, :2] += np.random.randn(pf.n, 2) * 0.1
+
+    # a flag 10 m ahead
+    pf.update(np.array([[10.0, 0.0, 10.0, 0.0]]), ess_threshold=1.0)
+
+    assert MIN_PARTICLES <= pf.n < 500
+    assert np.allclose(pf.weights, 1.0 / pf.n)
+
+
+def test_fixed_filter_keeps_its_size():
+    np.random.seed(0)
+    pf = ParticleFilter(300)
+    pf.start_position([0.0, 0.0, 0.0])
+    pf.particles[:, :2] += np.random.randn(pf.n, 2) * 0.1
+
+    pf.update(np.array([[10.0, 0.0, 10.0, 0.0]]), ess_threshold=1.0)
+    assert pf.n == 300
@@ -0,0 +1,93 @@
+import threading
+import time
+
+from smsoccer.players.scheduler import CycleScheduler, SENSE_BODY, THINK
+
+
+def test_acts_once_per_cycle():
+    s = CycleScheduler()
+    assert s.poll() == (False, False)
+
+    s.on_message(SENSE_BODY, 1)
+    assert s.poll() == (True, True)
+
+    s.on_message("see", 1)
+    s.on_message("hear", 1)
+    assert s.poll() == (True, False)
+
+    s.on_message("see", 2)
+    assert s.poll() == (True, True)
+    s.on_message(SENSE_BODY, 2)
+    assert s.poll() == (True, False)
+
+
+def test_acts_on_every_sense_body_with_the_clock_stopped():
+    s = CycleScheduler()
+    for i in range(5):
+        s.on_message(SENSE_BODY, 0)
+        s.on_message("see", 0)
+        assert s.poll() == (True, True)
+
+    # an older time changes nothing
+    s.on_message(SENSE_BODY, -1)
+    assert s.poll() == (True, False)
+
+
+def test_waits_for_the_see_until_the_deadline():
+    s = CycleScheduler(deadline=0.05)
+    s.on_message(SENSE_BODY, 1)
+    assert s.poll() == (True, False)
+    assert s.next_wakeup() is not None
+
+    s.on_message("see", 1)
+    assert s.poll() == (True, True)
+    assert s.next_wakeup() is None
+
+    # no see this cycle
+    s.on_message(SENSE_BODY, 2)
+    assert s.poll() == (True, False)
+    time.sleep(max(0, s.next_wakeup() - time.time()) + 0.01)
+    assert s.poll() == (False, True)
+
+
+def test_synch_mode_acts_once_per_think():
+    s = CycleScheduler()
+    s.on_message(SENSE_BODY, 0)
+    s.poll()
+
+    s.on_message(THINK)
+    assert s.synch
+    assert s.poll() == (True, True)
+
+    # sensor messages alone don't start a cycle anymore
+    s.on_message(SENSE_BODY, 1)
+    s.on_message("see", 1)
+    assert s.poll() == (True, False)
+
+    s.on_message(THINK)
+    s.on_message(THINK)
+    assert s.poll() == (True, True)
+    assert s.poll() == (False, False)
+
+
+def test_wait_wakes_up_on_messages_and_stop():
+    s = CycleScheduler()
+    results = []
+
+    def think_loop():
+        while s.running:
+            results.append(s.wait())
+
+    thread = threading.Thread(target=think_loop)
+    thread.start()
+
+    s.on_message(SENSE_BODY, 1)
+    for i in range(100):
+        if results:
+            break
+        time.sleep(0.01)
+    s.stop()
+    thread.join(1)
+
+    assert not thread.is_alive()
+    assert results[0] == (True, True)
@@ -0,0 +1,95 @@
+import math
+
+import numpy as np
+import pytest
+
+from smsoccer.communication.messageparser import parse
+from smsoccer.communication.seedecoder import SeeDecoder
+from smsoccer.communication.worldparser import parse_message_see
+from smsoccer.world.world_model import WorldModel
+
+from conftest import read_messages
+
+SEE_MESSAGES = [m for m in read_messages() if m.startswith("(see ")]
+
+
+def describe(obj):
+    """
+    The type and every attribute of a game object, NaN free.
+    """
+    if obj is None:
+        return None
+
+    values = []
+    for cls in type(obj).__mro__:
+        for name in getattr(cls, "__slots__", ()):
+            value = getattr(obj, name, None)
+            if isinstance(value, float) and math.isnan(value):
+                value = None
+            values.append((name, value))
+
+    return type(obj).__name__, sorted(values)
+
+
+@pytest.fixture
+def wm():
+    wm = WorldModel(None, filter_robot_loc=False)
+    wm.team_name = "default"
+    wm.side = WorldModel.SIDE_L
+    return wm
+
+
+@pytest.mark.parametrize("message", SEE_MESSAGES)
+def test_decoder_matches_parse_message_see(wm, message):
+    ball, flags, goals, players, lines, sim_time = parse_message_see(parse(message), wm)
+    frame = SeeDecoder().decode(message, wm)
+
+    assert frame.sim_time == sim_time
+    assert not frame.is_global
+    assert describe(frame.ball()) == describe(ball)
+    for seen, expected in ((frame.flags, flags), (frame.goals, goals),
+                           (frame.players, players), (frame.lines, lines)):
+        assert [describe(o) for o in seen] == [describe(o) for o in expected]
+
+
+def test_decoder_reuses_its_frames(wm):
+    decoder = SeeDecoder()
+    first = decoder.decode(SEE_MESSAGES[0], wm)
+    second = decoder.decode(SEE_MESSAGES[1], wm)
+    third = decoder.decode(SEE_MESSAGES[2], wm)
+
+    # the previous frame stays valid while the next one is filled
+    assert first is not second
+    assert third is first
+    assert second.sim_time != third.sim_time
+
+
+def test_landmarks(wm):
+    frame = SeeDecoder().decode(
+        "(see 5 ((f c) 10 20) ((f l t) 30) ((f x y) 1 2) ((g r) 52.5 0) ((l b) 3 -45))", wm)
+
+    # flags and goals with a known id and direction, unknown distances NaN
+    landmarks = frame.landmarks()
+    assert landmarks.shape == (3, 4)
+    np.testing.assert_equal(landmarks[0], [0, 0, 10, 20])
+    np.testing.assert_equal(landmarks[1, 2:], [np.nan, 30])
+    np.testing.assert_equal(landmarks[2], [52.5, 0, 52.5, 0])
+
+    assert frame.field_lines().shape == (1, 4)
+
+
+def test_see_global(wm):
+    frame = SeeDecoder().decode(
+        '(see_global 7 ((g r) 52.5 0) ((b) 1.5 -2 0.3 0.1) ((p "default" 1) -50 0 0 0 0 0))', wm)
+
+    assert frame.is_global
+    assert frame.sim_time == 7
+    ball = frame.ball()
+    assert (ball.distance, ball.direction, ball.dist_change, ball.dir_change) == \
+        (1.5, -2, 0.3, 0.1)
+    assert frame.players[0].uniform_number == 1
+
+
+def test_not_a_see_message(wm):
+    with pytest.raises(ValueError):
+        SeeDecoder().decode("(hear 0 referee kick_off_l)", wm)
@@ -0,0 +1,70 @@
+import numpy as np
+
+from smsoccer.communication.seedecoder import SeeDecoder
+from smsoccer.world.game_object import Flag
+from smsoccer.world.seenobjects import TEAM_OURS, TEAM_THEIRS
+from smsoccer.world.world_model import WorldModel
+
+
+def new_world_model():
+    wm = WorldModel(None)
+    wm.team_name = "us"
+    wm.side = WorldModel.SIDE_L
+    return wm
+
+
+def test_see_global_is_taken_as_is():
+    wm = new_world_model()
+    decoder = SeeDecoder()
+    particles = wm.pf.particles.copy()
+
+    for t in range(3):
+        wm.process_new_frame(decoder.decode(
+            '(see_global %d ((g r) 52.5 0) ((b) %.1f 2 1.5 -0.5) ((p "us" 1) -10 0 0 0 0 0) '
+            '((p "them" 2 goalie) 40 5 -0.3 0.1 10 0))' % (t, 1.5 * t), wm))
+
+    # nothing to localize from
+    assert wm.abs_coords is None
+    np.testing.assert_array_equal(wm.pf.particles, particles)
+
+    # coordinates and velocities on the field, as sent
+    assert wm.ball_tracker.position == (3.0, 2.0)
+    assert wm.ball_tracker.velocity == (1.5, -0.5)
+    assert wm.get_object_absolute_coords(wm.ball) == (3.0, 2.0)
+    np.testing.assert_allclose(wm.seen.located["players"], [[-10, 0], [40, 5]])
+
+    assert wm.player_tracker.get(TEAM_OURS, 1)[0] == (-10.0, 0.0)
+    position, velocity, last_seen, confidence = wm.player_tracker.get(TEAM_THEIRS, 2)
+    np.testing.assert_allclose(position, (40, 5), atol=0.5)
+    np.testing.assert_allclose(velocity, (-0.3, 0.1), atol=0.05)
+    assert last_seen == 2
+
+
+def test_see_is_localized():
+    wm = new_world_model()
+    wm.neck_direction = 0
+    wm.process_new_frame(SeeDecoder().decode(
+        "(see 0 ((f c) 10 0) ((f c t) 35.4 -74) ((f c b) 35.4 74) ((g r) 62.5 0) ((b) 5 0))", wm))
+
+    # standing at (-10, 0), looking at the center of the field
+    np.testing.assert_allclose(wm.abs_coords, (-10, 0), atol=0.3)
+    assert abs(wm.abs_neck_dir) < 2
+    np.testing.assert_allclose(wm.get_object_absolute_coords(wm.ball), (-5, 0), atol=0.3)
+
+
+def test_objects_of_older_sees_without_a_position():
+    wm = new_world_model()
+    decoder = SeeDecoder()
+    wm.process_new_frame(decoder.decode(
+        '(see_global 0 ((g r) 52.5 0) ((b) 0 0) ((p "them" 4) 40 5 0 0 0 0))', wm))
+    wm.process_new_frame(decoder.decode('(see_global 1 ((g r) 52.5 0) ((b) 1 0))', wm))
+
+    # no longer seen, and we don't know where we are
+    foe = wm.players_persistent['foes'][4]
+    assert foe is not None and foe not in wm.players
+    assert wm.abs_coords is None
+    assert wm.get_object_absolute_coords(foe) is None
+    assert wm.get_object_absolute_coords(Flag(10.0, 0.0, "c")) is None
+
+    # what is seen now still is
+    assert wm.get_object_absolute_coords(wm.ball) == (1.0, 0.0)